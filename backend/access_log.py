@@ -0,0 +1,195 @@
+"""
+Non-blocking, sampled access log.
+
+The instrumentation middleware hands one small dict per request to
+``AccessLog.log``, which only appends it to a bounded in-memory queue. A
+background thread serializes queued records to compact JSON lines and writes
+them in batches, so neither JSON encoding nor file I/O runs on the event loop.
+When the queue is full new records are dropped and counted rather than
+blocking requests.
+
+Successful requests are sampled (``ACCESS_LOG_SAMPLE_RATE``); errors and slow
+requests are always logged. Only allowlisted request headers are recorded.
+"""
+
+import json
+import logging
+import os
+import random
+import sys
+import threading
+from collections import deque
+from datetime import datetime, timezone
+from typing import Iterable, Optional
+
+from prometheus_client import Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+ACCESS_LOG_DROPPED = Counter(
+    'access_log_dropped_total',
+    'Access log records dropped because the queue was full or a write failed'
+)
+
+ACCESS_LOG_WRITTEN = Counter(
+    'access_log_written_total',
+    'Access log records written'
+)
+
+ACCESS_LOG_QUEUE_DEPTH = Gauge(
+    'access_log_queue_depth',
+    'Access log records waiting to be written'
+)
+
+# Request headers worth keeping; everything else (cookies, Authorization, ...) is never logged
+DEFAULT_HEADER_ALLOWLIST = ('user-agent', 'referer', 'content-type', 'content-length', 'x-forwarded-for')
+
+
+class AccessLog:
+    """Bounded queue plus a background writer thread emitting JSON lines."""
+
+    def __init__(
+        self,
+        path: str = 'logs/access.log',
+        sample_rate: float = 1.0,
+        slow_threshold: float = 1.0,
+        error_status: int = 500,
+        headers: Iterable[str] = DEFAULT_HEADER_ALLOWLIST,
+        max_queue: int = 10000,
+        batch_size: int = 500,
+        flush_interval: float = 0.5,
+    ):
+        """
+        Args:
+            path: File to append to, or "-" for stdout
+            sample_rate: Fraction of successful, fast requests to log (0..1)
+            slow_threshold: Requests slower than this many seconds are always logged
+            error_status: Responses with at least this status are always logged
+            headers: Request header names to include (case-insensitive)
+            max_queue: Records held before new ones are dropped
+            batch_size: Records written per batch
+            flush_interval: Seconds the writer waits before flushing a partial batch
+        """
+        self.path = path
+        self.sample_rate = sample_rate
+        self.slow_threshold = slow_threshold
+        self.error_status = error_status
+        self.headers = frozenset(h.lower().encode('latin-1') for h in headers)
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: deque = deque()
+        self._wakeup = threading.Event()
+        self._stopping = False
+        self._thread: Optional[threading.Thread] = None
+        self.dropped = 0
+        self.written = 0
+
+    def should_log(self, status_code: int, duration: float) -> bool:
+        """Errors and slow requests always; everything else at ``sample_rate``."""
+        if status_code >= self.error_status or duration >= self.slow_threshold:
+            return True
+        return self.sample_rate >= 1.0 or random.random() < self.sample_rate
+
+    def request_headers(self, scope) -> dict:
+        """Allowlisted request headers from an ASGI scope."""
+        return {
+            key.decode('latin-1'): value.decode('latin-1')
+            for key, value in scope.get('headers', ())
+            if key in self.headers
+        }
+
+    def log(self, record: dict) -> bool:
+        """Queue a record for writing. Never blocks; returns False if it was dropped."""
+        if self._thread is None:
+            self.start()
+        if len(self._queue) >= self.max_queue:
+            self.dropped += 1
+            ACCESS_LOG_DROPPED.inc()
+            return False
+        self._queue.append(record)
+        if len(self._queue) >= self.batch_size:
+            self._wakeup.set()
+        return True
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name='access-log-writer', daemon=True)
+            self._thread.start()
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Stop the writer after flushing whatever is queued."""
+        if self._thread is not None:
+            self._stopping = True
+            self._wakeup.set()
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self) -> None:
+        stream = sys.stdout if self.path == '-' else None
+        try:
+            if stream is None:
+                os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+                stream = open(self.path, 'a', encoding='utf-8', buffering=1 << 16)
+            while True:
+                self._wakeup.wait(self.flush_interval)
+                self._wakeup.clear()
+                self._flush(stream)
+                if self._stopping:
+                    self._flush(stream)
+                    return
+        finally:
+            if stream is not None and stream is not sys.stdout:
+                stream.close()
+
+    def _flush(self, stream) -> None:
+        while self._queue:
+            lines = []
+            while self._queue and len(lines) < self.batch_size:
+                lines.append(json.dumps(self._queue.popleft(), separators=(',', ':'), default=str))
+            try:
+                stream.write('\n'.join(lines) + '\n')
+                stream.flush()
+            except Exception as e:
+                # Never let logging take the writer thread down; the batch is lost
+                logger.warning(f"Access log write failed, dropped {len(lines)} records: {e}")
+                self.dropped += len(lines)
+                ACCESS_LOG_DROPPED.inc(len(lines))
+                continue
+            self.written += len(lines)
+            ACCESS_LOG_WRITTEN.inc(len(lines))
+
+    @staticmethod
+    def timestamp() -> str:
+        return datetime.now(timezone.utc).isoformat(timespec='milliseconds')
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._queue)
+
+    @property
+    def status(self) -> dict:
+        return {
+            'queue_depth': self.queue_depth,
+            'dropped': self.dropped,
+            'written': self.written,
+            'sample_rate': self.sample_rate,
+        }
+
+
+def _from_env() -> AccessLog:
+    headers = os.environ.get('ACCESS_LOG_HEADERS')
+    return AccessLog(
+        path=os.environ.get('ACCESS_LOG_PATH', 'logs/access.log'),
+        sample_rate=float(os.environ.get('ACCESS_LOG_SAMPLE_RATE', '1.0')),
+        slow_threshold=float(os.environ.get('ACCESS_LOG_SLOW_SECONDS', '1.0')),
+        error_status=int(os.environ.get('ACCESS_LOG_ERROR_STATUS', '500')),
+        headers=[h.strip() for h in headers.split(',') if h.strip()] if headers is not None else DEFAULT_HEADER_ALLOWLIST,
+        max_queue=int(os.environ.get('ACCESS_LOG_MAX_QUEUE', '10000')),
+    )
+
+
+# Shared access log for this worker
+access_log = _from_env()
+ACCESS_LOG_QUEUE_DEPTH.set_function(lambda: access_log.queue_depth)
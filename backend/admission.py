@@ -0,0 +1,293 @@
+"""
+Admission control and load shedding.
+
+Every request is put in a route class before it reaches the app:
+
+  * ``critical``: incident submissions and the active-typhoon feed, which
+    the public depends on during a typhoon
+  * ``normal``: everything not listed elsewhere
+  * ``low``: dashboard analytics and AI chat, shed first
+
+Each class has its own concurrency limit and a bounded FIFO queue. A request
+that finds its class at the limit waits in the queue for up to ``max_wait``
+seconds. It is rejected with 503 and ``Retry-After`` when the queue is full,
+when the wait runs out, or when event-loop lag (see loop_monitor) exceeds
+the class's ``shed_lag``. Lower classes have smaller limits and lower lag
+thresholds, so they are shed well before critical traffic notices anything.
+
+The default limits are shares of the worker's MongoDB pool
+(``main_pool_settings()['maxPoolSize']``, see ``POOL_SHARES``), so together
+they never admit more requests than the pool has connections. When
+overriding a class with ``ADMISSION_<CLASS>_CONCURRENCY``, keep the sum
+within maxPoolSize; anything above it waits in the driver's pool queue
+instead of being shed here.
+
+Health probes and /metrics bypass admission entirely.
+"""
+
+import asyncio
+import json
+import os
+import time
+from collections import deque
+from typing import Dict, Optional, Tuple
+
+from prometheus_client import Counter, Gauge, Histogram
+
+from database import main_pool_settings
+from loop_monitor import loop_monitor
+
+ADMISSION_ADMITTED = Counter(
+    'admission_admitted_total',
+    'Requests admitted by admission control',
+    ['route_class', 'queued'],
+)
+
+ADMISSION_REJECTED = Counter(
+    'admission_rejected_total',
+    'Requests shed with 503 by admission control',
+    ['route_class', 'reason'],
+)
+
+ADMISSION_QUEUE_WAIT = Histogram(
+    'admission_queue_wait_seconds',
+    'Time admitted requests spent queued',
+    ['route_class'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+
+ADMISSION_QUEUED = Gauge(
+    'admission_queued',
+    'Requests currently waiting for admission',
+    ['route_class'],
+)
+
+ADMISSION_IN_FLIGHT = Gauge(
+    'admission_in_flight',
+    'Admitted requests currently being processed',
+    ['route_class'],
+)
+
+# Paths that are never queued or shed
+EXEMPT_PATHS = frozenset({'/livez', '/readyz', '/metrics', '/api/health'})
+
+# (method or None for any, path, match whole path or prefix, route class); first match wins
+ROUTE_CLASS_RULES: Tuple[Tuple[Optional[str], str, bool, str], ...] = (
+    ('POST', '/api/incidents', False, 'critical'),
+    ('GET', '/api/typhoons/active', False, 'critical'),
+    (None, '/api/analytics/', True, 'low'),
+    (None, '/api/ai-chat', False, 'low'),
+)
+
+# Share of the worker's MongoDB pool each class may occupy at once
+POOL_SHARES: Dict[str, float] = {'critical': 0.6, 'normal': 0.3, 'low': 0.1}
+
+
+class Overloaded(Exception):
+    """Raised by ``RouteClass.acquire`` when a request is shed."""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class RouteClass:
+    """Concurrency limit and wait queue for one class of routes."""
+
+    def __init__(
+        self,
+        name: str,
+        max_concurrency: int,
+        max_queue: int,
+        max_wait: float,
+        shed_lag: Optional[float] = None,
+        retry_after: int = 1,
+    ):
+        """
+        Args:
+            name: Label used in metrics
+            max_concurrency: Requests of this class processed at once
+            max_queue: Requests allowed to wait for a slot
+            max_wait: Seconds a request may wait before it is shed
+            shed_lag: Event-loop lag (seconds) above which new requests are
+                shed immediately; None never sheds on lag
+            retry_after: Seconds sent in the Retry-After header
+        """
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.shed_lag = shed_lag
+        self.retry_after = retry_after
+        self.in_flight = 0
+        self._waiters: deque = deque()
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self) -> None:
+        """Wait for a slot; raises Overloaded if the request should be shed."""
+        if self.shed_lag is not None and loop_monitor.last_lag > self.shed_lag:
+            self._reject('loop_lag')
+        if self.in_flight < self.max_concurrency and not self._waiters:
+            self._admit()
+            return
+        if len(self._waiters) >= self.max_queue:
+            self._reject('queue_full')
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        ADMISSION_QUEUED.labels(route_class=self.name).inc()
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(waiter, self.max_wait)
+        except asyncio.TimeoutError:
+            self._reject('queue_timeout')
+        except asyncio.CancelledError:
+            # The slot may have been handed over just as the client went away
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+        finally:
+            ADMISSION_QUEUED.labels(route_class=self.name).dec()
+            if not waiter.done() or waiter.cancelled():
+                try:
+                    self._waiters.remove(waiter)
+                except ValueError:
+                    pass
+        ADMISSION_QUEUE_WAIT.labels(route_class=self.name).observe(time.perf_counter() - started)
+        # release() already counted the slot as ours when it woke us
+        ADMISSION_ADMITTED.labels(route_class=self.name, queued='true').inc()
+
+    def release(self) -> None:
+        """Free a slot, handing it straight to the oldest waiter if there is one."""
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+        ADMISSION_IN_FLIGHT.labels(route_class=self.name).dec()
+
+    def _admit(self) -> None:
+        self.in_flight += 1
+        ADMISSION_IN_FLIGHT.labels(route_class=self.name).inc()
+        ADMISSION_ADMITTED.labels(route_class=self.name, queued='false').inc()
+
+    def _reject(self, reason: str) -> None:
+        ADMISSION_REJECTED.labels(route_class=self.name, reason=reason).inc()
+        raise Overloaded(reason)
+
+    @property
+    def status(self) -> dict:
+        return {
+            'in_flight': self.in_flight,
+            'queued': self.queued,
+            'max_concurrency': self.max_concurrency,
+            'max_queue': self.max_queue,
+            'max_wait_seconds': self.max_wait,
+            'shed_lag_seconds': self.shed_lag,
+        }
+
+
+class AdmissionController:
+    """Maps requests to route classes."""
+
+    def __init__(self, classes: Dict[str, RouteClass], rules=ROUTE_CLASS_RULES, enabled: bool = True):
+        self.classes = classes
+        self.rules = rules
+        self.enabled = enabled
+
+    def classify(self, method: str, path: str) -> Optional[RouteClass]:
+        """Route class of a request, or None if it bypasses admission."""
+        if not self.enabled or path in EXEMPT_PATHS:
+            return None
+        for rule_method, rule_path, prefix, name in self.rules:
+            if rule_method is not None and rule_method != method:
+                continue
+            if path.startswith(rule_path) if prefix else path.rstrip('/') == rule_path:
+                return self.classes[name]
+        return self.classes['normal']
+
+    @property
+    def status(self) -> dict:
+        return {
+            'enabled': self.enabled,
+            'classes': {name: route_class.status for name, route_class in self.classes.items()},
+        }
+
+
+class AdmissionControlMiddleware:
+    """Pure ASGI middleware that queues or sheds requests per route class."""
+
+    def __init__(self, app, controller: Optional[AdmissionController] = None):
+        self.app = app
+        self.controller = controller or admission
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        route_class = self.controller.classify(scope['method'], scope['path'])
+        if route_class is None:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            await route_class.acquire()
+        except Overloaded as e:
+            await _send_overloaded(send, route_class, e.reason)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            route_class.release()
+
+
+async def _send_overloaded(send, route_class: RouteClass, reason: str) -> None:
+    body = json.dumps({"detail": "Server is overloaded, please retry shortly", "reason": reason}).encode()
+    await send({
+        'type': 'http.response.start',
+        'status': 503,
+        'headers': [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode()),
+            (b'retry-after', str(route_class.retry_after).encode()),
+        ],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+def _route_class_from_env(name: str, concurrency: int, queue: int, wait: float, lag: Optional[float], retry_after: int) -> RouteClass:
+    prefix = f'ADMISSION_{name.upper()}_'
+    lag_setting = os.environ.get(prefix + 'SHED_LAG_MS')
+    return RouteClass(
+        name,
+        max_concurrency=int(os.environ.get(prefix + 'CONCURRENCY', str(concurrency))),
+        max_queue=int(os.environ.get(prefix + 'QUEUE', str(queue))),
+        max_wait=float(os.environ.get(prefix + 'MAX_WAIT', str(wait))),
+        shed_lag=float(lag_setting) / 1000 if lag_setting else lag,
+        retry_after=retry_after,
+    )
+
+
+def default_concurrency(pool_size: int) -> Dict[str, int]:
+    """Per-class concurrency limits that together fit in ``pool_size`` connections."""
+    return {name: max(1, int(pool_size * share)) for name, share in POOL_SHARES.items()}
+
+
+def _from_env() -> AdmissionController:
+    concurrency = default_concurrency(main_pool_settings()['maxPoolSize'])
+    return AdmissionController(
+        {
+            'critical': _route_class_from_env('critical', concurrency['critical'], 256, 10.0, None, 1),
+            'normal': _route_class_from_env('normal', concurrency['normal'], 64, 3.0, 0.5, 2),
+            'low': _route_class_from_env('low', concurrency['low'], 8, 1.0, 0.2, 10),
+        },
+        enabled=os.environ.get('ADMISSION_CONTROL', 'true').lower() != 'false',
+    )
+
+
+# Shared controller for this worker
+admission = _from_env()
@@ -6,8 +6,10 @@ import uuid
 import os
 from collections import defaultdict
 
-# Import shared database connection
-from database import db
+from pymongo.errors import ExecutionTimeout
+
+# Import shared database connection (event writes) and the read-only analytics connection
+from database import analytics_db, db
 
 # Import auth
 from auth import get_current_user
@@ -15,8 +17,22 @@ from auth import get_current_user
 # Import caching
 from cache import cached, short_cache, medium_cache
 
+from timestamps import as_datetime, time_range
+
 router = APIRouter(prefix="/api/analytics", tags=["analytics"])
 
+# Per-query limits on the analytics connection: a heavy refresh is cut off by
+# the server instead of holding a connection (and secondary capacity) open
+ANALYTICS_MAX_TIME_MS = int(os.environ.get("ANALYTICS_MAX_TIME_MS", "5000"))
+ANALYTICS_EXPORT_MAX_TIME_MS = int(os.environ.get("ANALYTICS_EXPORT_MAX_TIME_MS", "30000"))
+
+# Dashboard reads: fail fast, never spill to disk
+DASHBOARD_QUERY = {"max_time_ms": ANALYTICS_MAX_TIME_MS, "allow_disk_use": False}
+# Admin export: may run longer and spill large result sorts to disk
+EXPORT_QUERY = {"max_time_ms": ANALYTICS_EXPORT_MAX_TIME_MS, "allow_disk_use": True}
+# count_documents / estimated_document_count / distinct
+COUNT_QUERY = {"maxTimeMS": ANALYTICS_MAX_TIME_MS}
+
 
 # Models
 class AnalyticsEvent(BaseModel):
@@ -38,6 +54,21 @@ def get_date_range(days: int = 7):
     return start_date, end_date
 
 
+def day_of(value) -> Optional[str]:
+    """YYYY-MM-DD (UTC) of a stored timestamp in either format"""
+    moment = as_datetime(value)
+    return moment.date().isoformat() if moment else None
+
+
+def query_timeout() -> HTTPException:
+    """503 for an analytics query that hit its maxTimeMS"""
+    return HTTPException(
+        status_code=503,
+        detail="Analytics query timed out; try a shorter date range",
+        headers={"Retry-After": "30"},
+    )
+
+
 async def track_event(event_type: str, event_data: dict = None, user_id: str = None):
     """Track an analytics event"""
     event = {
@@ -45,7 +76,7 @@ async def track_event(event_type: str, event_data: dict = None, user_id: str = N
         "event_type": event_type,
         "event_data": event_data or {},
         "user_id": user_id,
-        "timestamp": datetime.now(timezone.utc).isoformat()
+        "timestamp": datetime.now(timezone.utc)
     }
     await db.analytics_events.insert_one(event)
 
@@ -77,17 +108,23 @@ async def get_dashboard_analytics(
         end_iso = end_date.isoformat()
         
         # Use aggregation pipeline for better performance
-        incidents = await db.incidents.find({
-            "created_at": {"$gte": start_iso, "$lte": end_iso}
-        }, {"_id": 0, "status": 1, "incidentType": 1, "created_at": 1, "location": 1}).to_list(10000)
+        incidents = await analytics_db.incident_reports.find(
+            time_range("created_at", start_date, end_date),
+            {"_id": 0, "status": 1, "incidentType": 1, "created_at": 1, "location": 1},
+            **DASHBOARD_QUERY
+        ).to_list(10000)
         
-        users = await db.users.find({
-            "created_at": {"$gte": start_iso, "$lte": end_iso}
-        }, {"_id": 0, "created_at": 1}).to_list(10000)
+        users = await analytics_db.users.find(
+            time_range("created_at", start_date, end_date),
+            {"_id": 0, "created_at": 1},
+            **DASHBOARD_QUERY
+        ).to_list(10000)
         
-        events = await db.analytics_events.find({
-            "timestamp": {"$gte": start_iso, "$lte": end_iso}
-        }, {"_id": 0, "event_type": 1, "timestamp": 1}).to_list(10000)
+        events = await analytics_db.analytics_events.find(
+            time_range("timestamp", start_date, end_date),
+            {"_id": 0, "event_type": 1, "timestamp": 1},
+            **DASHBOARD_QUERY
+        ).to_list(10000)
         
         # Calculate metrics
         total_incidents = len(incidents)
@@ -103,8 +140,9 @@ async def get_dashboard_analytics(
         for inc in incidents:
             incident_status[inc.get("status", "submitted")] += 1
             incident_types[inc.get("incidentType", "other")] += 1
-            date = inc.get("created_at", "")[:10]
-            daily_incidents[date] += 1
+            date = day_of(inc.get("created_at"))
+            if date:
+                daily_incidents[date] += 1
             location = inc.get("location")
             if location and location.get("lat") and location.get("lon"):
                 geographic_data["total_geotagged"] += 1
@@ -116,8 +154,9 @@ async def get_dashboard_analytics(
         for event in events:
             event_types[event.get("event_type", "unknown")] += 1
             if event.get("event_type") == "page_view":
-                date = event.get("timestamp", "")[:10]
-                daily_users[date] += 1
+                date = day_of(event.get("timestamp"))
+                if date:
+                    daily_users[date] += 1
         
         return {
             "overview": {
@@ -144,6 +183,8 @@ async def get_dashboard_analytics(
                 "total_incidents": total_incidents
             }
         }
+    except ExecutionTimeout:
+        raise query_timeout()
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch analytics: {str(e)}")
 
@@ -159,9 +200,11 @@ async def get_incident_analytics(
         start_iso = start_date.isoformat()
         end_iso = end_date.isoformat()
         
-        incidents = await db.incidents.find({
-            "created_at": {"$gte": start_iso, "$lte": end_iso}
-        }, {"_id": 0, "incidentType": 1, "status": 1, "created_at": 1}).to_list(10000)
+        incidents = await analytics_db.incident_reports.find(
+            time_range("created_at", start_date, end_date),
+            {"_id": 0, "incidentType": 1, "status": 1, "created_at": 1},
+            **DASHBOARD_QUERY
+        ).to_list(10000)
         
         by_type = defaultdict(int)
         by_status = defaultdict(int)
@@ -170,13 +213,9 @@ async def get_incident_analytics(
         for inc in incidents:
             by_type[inc.get("incidentType", "other")] += 1
             by_status[inc.get("status", "submitted")] += 1
-            timestamp = inc.get("created_at", "")
-            if timestamp:
-                try:
-                    hour = datetime.fromisoformat(timestamp).hour
-                    by_hour[hour] += 1
-                except:
-                    pass
+            created_at = as_datetime(inc.get("created_at"))
+            if created_at:
+                by_hour[created_at.hour] += 1
         
         return {
             "total": len(incidents),
@@ -185,6 +224,8 @@ async def get_incident_analytics(
             "by_hour": dict(sorted(by_hour.items())),
             "date_range": {"start": start_iso, "end": end_iso}
         }
+    except ExecutionTimeout:
+        raise query_timeout()
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch incident analytics: {str(e)}")
 
@@ -200,18 +241,23 @@ async def get_user_analytics(
         start_iso = start_date.isoformat()
         end_iso = end_date.isoformat()
         
-        users = await db.users.find({
-            "created_at": {"$gte": start_iso, "$lte": end_iso}
-        }, {"_id": 0, "created_at": 1}).to_list(10000)
+        users = await analytics_db.users.find(
+            time_range("created_at", start_date, end_date),
+            {"_id": 0, "created_at": 1},
+            **DASHBOARD_QUERY
+        ).to_list(10000)
         
-        events = await db.analytics_events.find({
-            "timestamp": {"$gte": start_iso, "$lte": end_iso}
-        }, {"_id": 0, "user_id": 1, "event_type": 1}).to_list(10000)
+        events = await analytics_db.analytics_events.find(
+            time_range("timestamp", start_date, end_date),
+            {"_id": 0, "user_id": 1, "event_type": 1},
+            **DASHBOARD_QUERY
+        ).to_list(10000)
         
         daily_registrations = defaultdict(int)
         for user in users:
-            date = user.get("created_at", "")[:10]
-            daily_registrations[date] += 1
+            date = day_of(user.get("created_at"))
+            if date:
+                daily_registrations[date] += 1
         
         active_users = set()
         event_breakdown = defaultdict(int)
@@ -228,6 +274,8 @@ async def get_user_analytics(
             "event_breakdown": dict(event_breakdown),
             "date_range": {"start": start_iso, "end": end_iso}
         }
+    except ExecutionTimeout:
+        raise query_timeout()
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch user analytics: {str(e)}")
 
@@ -236,13 +284,14 @@ async def get_user_analytics(
 async def get_system_analytics(current_user: dict = Depends(get_current_user)):
     """Get system performance metrics"""
     try:
-        db_stats = await db.command("dbStats")
+        db_stats = await analytics_db.command("dbStats")
         
         # Parallel count queries for better performance
-        incidents_count = await db.incidents.count_documents({})
-        users_count = await db.users.count_documents({})
-        events_count = await db.analytics_events.count_documents({})
-        subscriptions_count = await db.push_subscriptions.count_documents({"active": True})
+        # Whole-collection totals come from collection metadata instead of a count scan
+        incidents_count = await analytics_db.incident_reports.estimated_document_count(**COUNT_QUERY)
+        users_count = await analytics_db.users.estimated_document_count(**COUNT_QUERY)
+        events_count = await analytics_db.analytics_events.estimated_document_count(**COUNT_QUERY)
+        subscriptions_count = await analytics_db.push_subscriptions.count_documents({"active": True}, **COUNT_QUERY)
         
         storage_size = db_stats.get("dataSize", 0) / (1024 * 1024)
         
@@ -259,6 +308,8 @@ async def get_system_analytics(current_user: dict = Depends(get_current_user)):
             },
             "timestamp": datetime.now(timezone.utc).isoformat()
         }
+    except ExecutionTimeout:
+        raise query_timeout()
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch system analytics: {str(e)}")
 
@@ -278,13 +329,17 @@ async def export_analytics(
         start_iso = start_date.isoformat()
         end_iso = end_date.isoformat()
         
-        incidents = await db.incidents.find({
-            "created_at": {"$gte": start_iso, "$lte": end_iso}
-        }, {"_id": 0}).to_list(10000)
+        incidents = await analytics_db.incident_reports.find(
+            time_range("created_at", start_date, end_date),
+            {"_id": 0},
+            **EXPORT_QUERY
+        ).to_list(10000)
         
-        events = await db.analytics_events.find({
-            "timestamp": {"$gte": start_iso, "$lte": end_iso}
-        }, {"_id": 0}).to_list(10000)
+        events = await analytics_db.analytics_events.find(
+            time_range("timestamp", start_date, end_date),
+            {"_id": 0},
+            **EXPORT_QUERY
+        ).to_list(10000)
         
         return {
             "export_date": datetime.now(timezone.utc).isoformat(),
@@ -296,6 +351,8 @@ async def export_analytics(
                 "total_events": len(events)
             }
         }
+    except ExecutionTimeout:
+        raise query_timeout()
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to export analytics: {str(e)}")
 
@@ -304,21 +361,21 @@ async def export_analytics(
 async def get_realtime_metrics(current_user: dict = Depends(get_current_user)):
     """Get real-time system metrics"""
     try:
-        one_hour_ago = (datetime.now(timezone.utc) - timedelta(hours=1)).isoformat()
-        five_min_ago = (datetime.now(timezone.utc) - timedelta(minutes=5)).isoformat()
+        one_hour_ago = datetime.now(timezone.utc) - timedelta(hours=1)
+        five_min_ago = datetime.now(timezone.utc) - timedelta(minutes=5)
         
-        recent_incidents = await db.incidents.count_documents({
-            "created_at": {"$gte": one_hour_ago}
-        })
+        recent_incidents = await analytics_db.incident_reports.count_documents(
+            time_range("created_at", one_hour_ago), **COUNT_QUERY
+        )
         
-        recent_events = await db.analytics_events.count_documents({
-            "timestamp": {"$gte": one_hour_ago}
-        })
+        recent_events = await analytics_db.analytics_events.count_documents(
+            time_range("timestamp", one_hour_ago), **COUNT_QUERY
+        )
         
-        active_users = len(await db.analytics_events.distinct("user_id", {
-            "timestamp": {"$gte": five_min_ago},
+        active_users = len(await analytics_db.analytics_events.distinct("user_id", {
+            **time_range("timestamp", five_min_ago),
             "user_id": {"$ne": None}
-        }))
+        }, **COUNT_QUERY))
         
         return {
             "timestamp": datetime.now(timezone.utc).isoformat(),
@@ -330,6 +387,8 @@ async def get_realtime_metrics(current_user: dict = Depends(get_current_user)):
                 "active_users": active_users
             }
         }
+    except ExecutionTimeout:
+        raise query_timeout()
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch realtime metrics: {str(e)}")
 
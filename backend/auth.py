@@ -1,7 +1,7 @@
-from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi import APIRouter, HTTPException, Depends, Request, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from pydantic import BaseModel, Field, ConfigDict
-from typing import List, Optional, Dict, Any
+from pydantic import BaseModel, Field, ConfigDict, TypeAdapter
+from typing import List, Optional, Dict, Any, Union
 from datetime import datetime, timezone, timedelta
 import jwt
 import bcrypt
@@ -16,7 +16,11 @@ from concurrent.futures import ThreadPoolExecutor
 from database import db
 
 # Import caching
-from cache import cached, short_cache, medium_cache, invalidate_cache
+from cache import cached, short_cache, medium_cache, invalidate_cache_async
+from response_cache import EncodedResponse, encode_response
+from tracing import span, traced
+from cache_warmup import register_warmer
+from pagination import InvalidCursor, decode_cursor, keyset_page
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -101,6 +105,10 @@ class IncidentReportUpdate(BaseModel):
     priority: Optional[str] = None
     notes: Optional[str] = None
 
+class IncidentReportPage(BaseModel):
+    items: List[IncidentReport]
+    next_cursor: Optional[str] = None
+
 
 # Async bcrypt operations (non-blocking)
 async def hash_password_async(password: str) -> str:
@@ -136,6 +144,7 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+@traced("auth.get_current_user")
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -143,7 +152,8 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
+        with span("auth.jwt_decode"):
+            payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
         if username is None:
             raise credentials_exception
@@ -156,6 +166,15 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
         raise credentials_exception
     return user
 
+# Helper function to check if user is admin
+async def require_admin(current_user: dict = Depends(get_current_user)):
+    if current_user.get("role") != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin privileges required"
+        )
+    return current_user
+
 # Authentication Router
 auth_router = APIRouter()
 
@@ -174,7 +193,7 @@ async def register_user(user: UserCreate):
         "email": user.email,
         "hashed_password": hashed_password,
         "role": user.role,
-        "created_at": datetime.now(timezone.utc).isoformat()
+        "created_at": datetime.now(timezone.utc)
     }
     
     await db.users.insert_one(user_dict)
@@ -224,12 +243,77 @@ async def get_current_user_info(current_user: dict = Depends(get_current_user)):
 # Incident Reports Router
 incident_router = APIRouter()
 
+
+# Incident lists are cached as pre-encoded responses (see response_cache)
+_INCIDENT_LIST_ADAPTER = TypeAdapter(List[IncidentReport])
+_INCIDENT_ADAPTER = TypeAdapter(IncidentReport)
+_INCIDENT_PAGE_ADAPTER = TypeAdapter(IncidentReportPage)
+
+
+def _incident_filter(status: Optional[str], priority: Optional[str]) -> dict:
+    query = {}
+    if status:
+        query["status"] = status
+    if priority:
+        query["priority"] = priority
+    return query
+
+
+@cached(cache=short_cache, prefix="incidents", refresh_after=15)
+async def _load_incident_reports(
+    skip: int,
+    limit: int,
+    status: Optional[str],
+    priority: Optional[str],
+) -> EncodedResponse:
+    # Use projection to fetch only needed fields
+    reports = await db.incident_reports.find(
+        _incident_filter(status, priority),
+        {"_id": 0}
+    ).skip(skip).limit(limit).to_list(limit)
+
+    return encode_response(reports, _INCIDENT_LIST_ADAPTER)
+
+
+@cached(cache=short_cache, prefix="incident_pages", tags=lambda *args: ["incidents"], refresh_after=15)
+async def _load_incident_page(
+    cursor: str,
+    limit: int,
+    status: Optional[str],
+    priority: Optional[str],
+) -> EncodedResponse:
+    reports, next_cursor = await keyset_page(
+        db.incident_reports, _incident_filter(status, priority), limit, cursor
+    )
+    return encode_response({"items": reports, "next_cursor": next_cursor}, _INCIDENT_PAGE_ADAPTER)
+
+
+@cached(
+    cache=short_cache,
+    prefix="incident_detail",
+    tags=lambda report_id: [f"incident:{report_id}"],
+    refresh_after=15,
+    # Offline clients keep polling deleted IDs; remember the 404 briefly
+    negative_ttl=15,
+)
+async def _load_incident_report(report_id: str) -> Optional[EncodedResponse]:
+    report = await db.incident_reports.find_one({"id": report_id}, {"_id": 0})
+    if not report:
+        return None
+
+    return encode_response(report, _INCIDENT_ADAPTER)
+
+
+# First page of the unfiltered list, as requested by the dashboard
+register_warmer("incidents", lambda: _load_incident_reports(0, 100, None, None))
+
+
 @incident_router.post("/", response_model=IncidentReport)
 async def create_incident_report(report: IncidentReportCreate):
     """Create a new incident report"""
     report_dict = report.model_dump()
     report_dict["id"] = str(uuid.uuid4())
-    report_dict["created_at"] = datetime.now(timezone.utc).isoformat()
+    report_dict["created_at"] = datetime.now(timezone.utc)
     
     result = await db.incident_reports.insert_one(report_dict)
     created_report = await db.incident_reports.find_one(
@@ -237,51 +321,45 @@ async def create_incident_report(report: IncidentReportCreate):
         {"_id": 0}
     )
     
-    if isinstance(created_report['created_at'], str):
-        created_report['created_at'] = datetime.fromisoformat(created_report['created_at'])
-    
     # Invalidate incidents cache
-    invalidate_cache("incidents")
+    await invalidate_cache_async("incidents")
     
     return created_report
 
-@incident_router.get("/", response_model=List[IncidentReport])
+@incident_router.get("/", response_model=Union[List[IncidentReport], IncidentReportPage])
 async def get_incident_reports(
+    request: Request,
     skip: int = 0,
     limit: int = 100,
     status: Optional[str] = None,
     priority: Optional[str] = None,
+    cursor: Optional[str] = None,
 ):
-    """Get all incident reports with optional filtering"""
-    query = {}
-    if status:
-        query["status"] = status
-    if priority:
-        query["priority"] = priority
-    
-    # Use projection to fetch only needed fields
-    reports = await db.incident_reports.find(
-        query, 
-        {"_id": 0}
-    ).skip(skip).limit(limit).to_list(limit)
-    
-    for report in reports:
-        if isinstance(report.get('created_at'), str):
-            report['created_at'] = datetime.fromisoformat(report['created_at'])
-    
-    return reports
+    """
+    Get incident reports with optional filtering (cached, refreshed in the background).
+
+    Without ``cursor`` this is the plain skip/limit list. With ``cursor`` (empty
+    for the first page) it returns ``{"items", "next_cursor"}``, newest first;
+    pass ``next_cursor`` back to get the following page at the same cost
+    however deep it is.
+    """
+    if cursor is None:
+        return (await _load_incident_reports(skip, limit, status, priority)).to_response(request)
+    if cursor:
+        try:
+            decode_cursor(cursor)
+        except InvalidCursor as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    return (await _load_incident_page(cursor, max(limit, 1), status, priority)).to_response(request)
 
 @incident_router.get("/{report_id}", response_model=IncidentReport)
-async def get_incident_report(report_id: str):
-    """Get a specific incident report by ID"""
-    report = await db.incident_reports.find_one({"id": report_id}, {"_id": 0})
-    if not report:
+async def get_incident_report(report_id: str, request: Request):
+    """Get a specific incident report by ID (cached, including not-found results)"""
+    report = await _load_incident_report(report_id)
+    if report is None:
         raise HTTPException(status_code=404, detail="Report not found")
     
-    if isinstance(report['created_at'], str):
-        report['created_at'] = datetime.fromisoformat(report['created_at'])
-    
-    return report
+    return report.to_response(request)
 
 @incident_router.put("/{report_id}", response_model=IncidentReport)
 async def update_incident_report(
@@ -293,7 +371,7 @@ async def update_incident_report(
     if not update_data:
         raise HTTPException(status_code=400, detail="No valid fields to update")
     
-    update_data["updated_at"] = datetime.now(timezone.utc).isoformat()
+    update_data["updated_at"] = datetime.now(timezone.utc)
     
     result = await db.incident_reports.update_one(
         {"id": report_id},
@@ -305,13 +383,9 @@ async def update_incident_report(
     
     updated_report = await db.incident_reports.find_one({"id": report_id}, {"_id": 0})
     
-    if isinstance(updated_report['created_at'], str):
-        updated_report['created_at'] = datetime.fromisoformat(updated_report['created_at'])
-    if "updated_at" in updated_report and isinstance(updated_report['updated_at'], str):
-        updated_report['updated_at'] = datetime.fromisoformat(updated_report['updated_at'])
-    
     # Invalidate cache
-    invalidate_cache("incidents")
+    await invalidate_cache_async("incidents")
+    await invalidate_cache_async(f"incident:{report_id}")
     
     return updated_report
 
@@ -323,7 +397,8 @@ async def delete_incident_report(report_id: str):
         raise HTTPException(status_code=404, detail="Report not found")
     
     # Invalidate cache
-    invalidate_cache("incidents")
+    await invalidate_cache_async("incidents")
+    await invalidate_cache_async(f"incident:{report_id}")
     
     return {"message": "Report deleted successfully"}
 
@@ -335,10 +410,6 @@ async def get_user_reports(user_id: str):
         {"_id": 0}
     ).to_list(1000)
     
-    for report in reports:
-        if isinstance(report['created_at'], str):
-            report['created_at'] = datetime.fromisoformat(report['created_at'])
-    
     return reports
 
 # Include routers in main app
@@ -1,37 +1,340 @@
 """
 In-memory caching utilities for API responses.
 Provides TTL-based caching to reduce database queries.
+
+Every entry is indexed by its key prefix plus any extra tags (e.g. a typhoon id),
+so invalidation only touches the keys that are actually affected.
+
+The ``cached`` decorator can optionally serve stale values while a single
+background task refreshes them (stale-while-revalidate), and coalesces
+concurrent misses on the same key into one load (single-flight).
+
+An optional shared L2 backend (see cache_backends) sits behind every cache:
+reads check L1 then L2, writes and invalidations go to both. L2 payloads are
+JSON (EncodedResponse variants base64-encoded), never pickles, so whoever can
+write to the shared store can at worst poison a cached response, not run code
+in the workers. Cached values must therefore be JSON-compatible or an
+EncodedResponse; for anything else the L2 write fails (logged, counted in
+``l2_errors``) and the value stays in L1 only.
+
+Besides an entry count, each cache can have a ``max_bytes`` budget; entries
+are weighed by their estimated size and evicted LRU/TTL-first under it.
+
+Loaders that return None (not found) can be negatively cached for a short
+``negative_ttl`` so polling of deleted IDs doesn't reach MongoDB each time.
+
+Every cache keeps per-prefix counters (hits, misses, stale hits, evictions,
+expirations, coalesced waiters) and a loader latency histogram; they are
+summarized in ``stats`` and exported to Prometheus by logging_config.
 """
 
 import asyncio
+import bisect
+import logging
+import os
+import sys
+import time
+from collections import OrderedDict
 from functools import wraps
-from typing import Any, Callable, Optional
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Set, Tuple, TypeVar
 from cachetools import TTLCache
 from datetime import datetime
 import hashlib
+import base64
 import json
 
+from cache_backends import CacheBackend
+from response_cache import EncodedResponse
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Upper bound for the exponential backoff after failed background refreshes
+MAX_REFRESH_BACKOFF = 300.0
+
+# Tags whose last invalidation each cache remembers for in-flight loads and L2 reads
+MAX_TAG_MARKS = 10000
+_NO_MARK = (0, 0.0)
+
+# Every L2 write is also tagged with this, so one cache can be cleared in L2
+# without touching the keys of other caches sharing the backend
+_ALL_KEYS_TAG = "__all__"
+
+
+class _NotFound:
+    """Marker stored in place of a loader's None result by negative caching."""
+
+    __slots__ = ()
+
+    def __repr__(self) -> str:
+        return "NOT_FOUND"
+
+
+NOT_FOUND = _NotFound()
+
+# Upper bounds (seconds) of the loader latency histogram buckets
+LOAD_TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _b64(data: Optional[bytes]) -> Optional[str]:
+    return base64.b64encode(data).decode("ascii") if data is not None else None
+
+
+def _unb64(data: Optional[str]) -> Optional[bytes]:
+    return base64.b64decode(data) if data is not None else None
+
+
+def l2_dumps(value: Any, stored_wall: float, tags: Iterable[str]) -> bytes:
+    """Serialize an L2 entry as JSON; raises TypeError for values JSON can't hold."""
+    if isinstance(value, EncodedResponse):
+        payload = {"type": "encoded", "value": [_b64(value.body), _b64(value.gzip), _b64(value.br)]}
+    else:
+        payload = {"type": "json", "value": value}
+    payload.update(stored_at=stored_wall, tags=list(tags))
+    return json.dumps(payload, separators=(",", ":")).encode()
+
+
+def l2_loads(raw: bytes) -> Tuple[Any, float, tuple]:
+    """``(value, stored wall time, tags)`` of an L2 entry written by ``l2_dumps``."""
+    payload = json.loads(raw)
+    if payload["type"] == "encoded":
+        body, gzip_body, br_body = (_unb64(part) for part in payload["value"])
+        value = EncodedResponse.from_variants(body, gzip_body, br_body)
+    elif payload["type"] == "json":
+        value = payload["value"]
+    else:
+        raise ValueError(f"unknown L2 payload type {payload['type']!r}")
+    return value, float(payload["stored_at"]), tuple(payload["tags"])
+
+
+def estimate_size(value: Any) -> int:
+    """
+    Estimate the memory held by a cached value, in bytes.
+
+    Objects exposing an integer ``size`` (e.g. response_cache.EncodedResponse)
+    report their own size; anything else is walked through dicts, lists,
+    tuples and sets, summing ``sys.getsizeof`` of each distinct object.
+    """
+    own_size = getattr(value, "size", None)
+    if isinstance(own_size, int):
+        return own_size + sys.getsizeof(value)
+
+    total = 0
+    seen = set()
+    stack = [value]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        total += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+    return total
+
+
+class _Entry:
+    """A cached value plus the bookkeeping needed for stale-while-revalidate."""
+
+    __slots__ = ("value", "stored_at", "size", "failures", "retry_at")
+
+    def __init__(self, value: Any, stored_at: float, size: int = 0):
+        self.value = value
+        self.stored_at = stored_at
+        self.size = size
+        self.failures = 0
+        self.retry_at = 0.0
+
+
+def _entry_size(entry: _Entry) -> int:
+    return entry.size
+
+
+def _key_prefix(key: str) -> str:
+    """Prefix of a key built by ``_make_key`` (or a ``prefix:id`` style key)."""
+    return key.rpartition(":")[0]
+
+
+class PrefixStats:
+    """Counters and loader latency histogram for one key prefix of a cache."""
+
+    __slots__ = (
+        "hits", "misses", "stale_hits", "negative_hits", "l2_hits", "evictions", "expirations",
+        "coalesced", "load_buckets", "load_count", "load_sum",
+    )
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+        self.negative_hits = 0
+        self.l2_hits = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.coalesced = 0
+        # Non-cumulative counts per LOAD_TIME_BUCKETS bound, plus one for +Inf
+        self.load_buckets = [0] * (len(LOAD_TIME_BUCKETS) + 1)
+        self.load_count = 0
+        self.load_sum = 0.0
+
+    def observe_load(self, seconds: float) -> None:
+        self.load_buckets[bisect.bisect_left(LOAD_TIME_BUCKETS, seconds)] += 1
+        self.load_count += 1
+        self.load_sum += seconds
+
+    @property
+    def hit_ratio(self) -> Optional[float]:
+        served = self.hits + self.stale_hits + self.negative_hits
+        lookups = served + self.misses
+        return round(served / lookups, 4) if lookups else None
+
+    def as_dict(self) -> dict:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'stale_hits': self.stale_hits,
+            'negative_hits': self.negative_hits,
+            'l2_hits': self.l2_hits,
+            'hit_ratio': self.hit_ratio,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'coalesced': self.coalesced,
+            'loads': self.load_count,
+            'avg_load_ms': round(self.load_sum / self.load_count * 1000, 2) if self.load_count else None,
+        }
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key into a single in-flight load.
+
+    The load runs in its own task so a cancelled caller (e.g. a client that
+    disconnected) doesn't cancel it for everyone else. The key is released as
+    soon as the load finishes, so the table only ever holds in-flight keys.
+    Exceptions are delivered to every waiter and nothing is remembered.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.coalesced = 0
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._inflight
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        """Run ``fn`` for ``key``, or wait for the call already in flight."""
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.get_running_loop().create_task(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._release(key, t))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _release(self, key: str, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Mark the exception as retrieved in case every waiter was cancelled
+        if not task.cancelled():
+            task.exception()
+
+
+class _IndexedTTLCache(TTLCache):
+    """
+    TTLCache that reports expired and evicted keys so the tag index stays in
+    sync. ``maxsize`` is a byte budget: entries are weighed by their size.
+    """
+
+    def __init__(self, maxsize: float, ttl: int, on_remove: Callable[[str, str], None], **kwargs):
+        super().__init__(maxsize=maxsize, ttl=ttl, getsizeof=_entry_size, **kwargs)
+        self._on_remove = on_remove
+        self.evictions = 0
+        self.evicted_bytes = 0
+
+    def expire(self, time=None):
+        expired = super().expire(time)
+        for key, _ in expired:
+            self._on_remove(key, "expirations")
+        return expired
+
+    def popitem(self):
+        key, value = super().popitem()
+        self.evictions += 1
+        self.evicted_bytes += value.size
+        self._on_remove(key, "evictions")
+        return key, value
+
 
 class APICache:
     """Thread-safe in-memory cache with TTL support."""
-    
-    def __init__(self, maxsize: int = 1000, ttl: int = 300):
+
+    def __init__(
+        self,
+        maxsize: int = 1000,
+        ttl: int = 300,
+        timer: Callable[[], float] = time.monotonic,
+        name: str = "cache",
+        backend: Optional[CacheBackend] = None,
+        max_bytes: Optional[int] = None,
+    ):
         """
         Initialize cache.
-        
+
         Args:
             maxsize: Maximum number of items in cache
             ttl: Time-to-live in seconds (default 5 minutes)
+            timer: Clock used for TTL expiry (injectable for tests)
+            name: Namespace for this cache's keys in the shared L2 backend
+            backend: Optional shared L2 backend
+            max_bytes: Memory budget for cached values (estimated); None means unbounded
         """
-        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
-        self._locks = {}
-    
-    def _get_lock(self, key: str) -> asyncio.Lock:
-        """Get or create a lock for a cache key."""
-        if key not in self._locks:
-            self._locks[key] = asyncio.Lock()
-        return self._locks[key]
-    
+        self.name = name
+        self._backend = backend
+        self._timer = timer
+        self._maxsize = maxsize
+        self._max_bytes = max_bytes
+        self._cache = _IndexedTTLCache(
+            maxsize=max_bytes if max_bytes is not None else float("inf"),
+            ttl=ttl,
+            on_remove=self._on_remove,
+            timer=timer,
+        )
+        self._flights = SingleFlight()
+        # tag -> live keys, and key -> its tags (for O(1) cleanup on removal)
+        self._tags: Dict[str, Set[str]] = {}
+        self._key_tags: Dict[str, Tuple[str, ...]] = {}
+        # Invalidation marks, so an in-flight load doesn't write back data that one of
+        # its own tags invalidated meanwhile, and an L2 entry stored before a local
+        # invalidation isn't pulled back into L1: a counter bumped on every
+        # invalidation, the (counter, wall clock) of each tag's last invalidation
+        # (oldest first, bounded), the newest mark pruned from that map, and the
+        # mark of the last clear()
+        self._invalidations = 0
+        self._tag_marks: "OrderedDict[str, Tuple[int, float]]" = OrderedDict()
+        self._pruned_mark: Tuple[int, float] = (0, 0.0)
+        self._cleared_mark: Tuple[int, float] = (0, 0.0)
+        # In-flight background refreshes, removed as soon as they finish
+        self._refreshing: Dict[str, asyncio.Task] = {}
+        self._stale_hits = 0
+        self._refreshes = 0
+        self._refresh_failures = 0
+        self._l2_hits = 0
+        self._l2_errors = 0
+        self._rejected = 0
+        self._prefix_stats: Dict[str, PrefixStats] = {}
+
+    def set_backend(self, backend: Optional[CacheBackend]) -> None:
+        """Attach (or detach with None) the shared L2 backend."""
+        self._backend = backend
+
     def _make_key(self, prefix: str, *args, **kwargs) -> str:
         """Create a cache key from prefix and arguments."""
         key_data = {
@@ -40,103 +343,469 @@ class APICache:
             'kwargs': kwargs
         }
         key_str = json.dumps(key_data, sort_keys=True, default=str)
-        return hashlib.md5(key_str.encode()).hexdigest()
-    
+        return f"{prefix}:{hashlib.md5(key_str.encode()).hexdigest()}"
+
+    def _index(self, key: str, tags: Iterable[str]) -> None:
+        """Record the tags of a key, replacing any previous ones."""
+        self._unindex(key)
+        tags = tuple(dict.fromkeys(tags))
+        if not tags:
+            return
+        self._key_tags[key] = tags
+        for tag in tags:
+            self._tags.setdefault(tag, set()).add(key)
+
+    def prefix_stats(self, prefix: str) -> PrefixStats:
+        """Counters for one key prefix, created on first use."""
+        stats = self._prefix_stats.get(prefix)
+        if stats is None:
+            stats = self._prefix_stats[prefix] = PrefixStats()
+        return stats
+
+    @property
+    def metrics(self) -> Dict[str, PrefixStats]:
+        """Per-prefix counters, keyed by prefix (read by the Prometheus collector)."""
+        return self._prefix_stats
+
+    def _record(self, key: str, counter: str) -> None:
+        stats = self.prefix_stats(_key_prefix(key))
+        setattr(stats, counter, getattr(stats, counter) + 1)
+
+    def _on_remove(self, key: str, reason: str) -> None:
+        """Called by the underlying TTLCache when it expires or evicts a key."""
+        self._record(key, reason)
+        self._unindex(key)
+
+    def _unindex(self, key: str) -> None:
+        """Drop a key from the tag index (called on delete, expiry and eviction)."""
+        for tag in self._key_tags.pop(key, ()):
+            keys = self._tags.get(tag)
+            if keys is None:
+                continue
+            keys.discard(key)
+            if not keys:
+                del self._tags[tag]
+
     def get(self, key: str) -> Optional[Any]:
         """Get value from cache."""
-        return self._cache.get(key)
-    
-    def set(self, key: str, value: Any) -> None:
-        """Set value in cache."""
-        self._cache[key] = value
-    
+        entry = self._cache.get(key)
+        self._record(key, "hits" if entry is not None else "misses")
+        return entry.value if entry is not None else None
+
+    def get_entry(self, key: str, max_age: Optional[float] = None) -> Optional[_Entry]:
+        """
+        Get the raw entry for a key, ignoring it if older than ``max_age`` seconds
+        (defaults to the TTL, which also covers entries whose age was inherited from L2).
+        """
+        entry = self._cache.get(key)
+        if max_age is None:
+            max_age = self._cache.ttl
+        if entry is None or self.age(entry) >= max_age:
+            return None
+        return entry
+
+    def age(self, entry: _Entry) -> float:
+        """Seconds since an entry was stored."""
+        return self._timer() - entry.stored_at
+
+    def set(self, key: str, value: Any, tags: Iterable[str] = ()) -> None:
+        """Set value in cache, indexed under the given tags."""
+        self._store(key, value, tags)
+
+    def _store(self, key: str, value: Any, tags: Iterable[str], age: float = 0.0) -> None:
+        entry = _Entry(value, self._timer() - age, estimate_size(value))
+        if self._max_bytes is not None and entry.size > self._max_bytes:
+            # Never let one huge value flush the whole cache
+            self._rejected += 1
+            self.delete(key)
+            return
+        if key not in self._cache:
+            while len(self._cache) >= self._maxsize:
+                self._cache.popitem()
+        self._cache[key] = entry
+        self._index(key, tags)
+
+    def _l2_key(self, key: str) -> str:
+        return f"{self.name}:{key}"
+
+    async def _l2_get(self, key: str, max_age: Optional[float] = None) -> Optional[Tuple[Any, float, tuple]]:
+        """Read a key from L2. Returns ``(value, age, tags)``; L2 errors count as misses."""
+        if self._backend is None:
+            return None
+        try:
+            raw = await self._backend.get(self._l2_key(key))
+            if raw is None:
+                return None
+            value, stored_wall, tags = l2_loads(raw)
+        except Exception as e:
+            self._l2_errors += 1
+            logger.warning(f"L2 cache read failed for {self.name}: {e}")
+            return None
+        if self.invalidated_after(tags, stored_wall):
+            # Stored before this worker saw one of its tags invalidated, e.g. a change
+            # event that arrived before the writer cleared L2
+            return None
+        age = max(time.time() - stored_wall, 0.0)
+        if age >= (max_age if max_age is not None else self._cache.ttl):
+            return None
+        self._l2_hits += 1
+        self._record(key, "l2_hits")
+        return value, age, tags
+
+    async def _l2_set(self, key: str, value: Any, tags: Tuple[str, ...]) -> None:
+        """Write a key to L2 with the cache TTL. Failures are logged, never raised."""
+        if self._backend is None:
+            return
+        try:
+            raw = l2_dumps(value, time.time(), tags)
+            await self._backend.set(
+                self._l2_key(key),
+                raw,
+                ttl=self._cache.ttl,
+                tags=[self._l2_key(tag) for tag in (*tags, _ALL_KEYS_TAG)],
+            )
+        except Exception as e:
+            self._l2_errors += 1
+            logger.warning(f"L2 cache write failed for {self.name}: {e}")
+
+    async def _l2_invalidate_tag(self, tag: str) -> None:
+        if self._backend is None:
+            return
+        try:
+            await self._backend.invalidate_tag(self._l2_key(tag))
+        except Exception as e:
+            self._l2_errors += 1
+            logger.warning(f"L2 cache invalidation failed for {self.name}: {e}")
+
     def delete(self, key: str) -> None:
         """Delete value from cache."""
         self._cache.pop(key, None)
-    
+        self._unindex(key)
+
+    def invalidation_mark(self) -> int:
+        """Current invalidation counter; pass it to ``invalidated_since`` after a load."""
+        return self._invalidations
+
+    def invalidated_since(self, tags: Iterable[str], mark: int) -> bool:
+        """Whether any of ``tags`` (or the whole cache) was invalidated after ``mark``."""
+        if self._cleared_mark[0] > mark or self._pruned_mark[0] > mark:
+            return True
+        return any(self._tag_marks.get(tag, _NO_MARK)[0] > mark for tag in tags)
+
+    def invalidated_after(self, tags: Iterable[str], wall: float) -> bool:
+        """Whether any of ``tags`` (or the whole cache) was invalidated here after wall-clock ``wall``."""
+        # A tie counts as invalidated: discarding an L2 entry only costs one reload
+        if self._cleared_mark[1] >= wall or self._pruned_mark[1] >= wall:
+            return True
+        return any(self._tag_marks.get(tag, _NO_MARK)[1] >= wall for tag in tags)
+
+    def _next_mark(self) -> Tuple[int, float]:
+        self._invalidations += 1
+        return self._invalidations, time.time()
+
+    def _mark_invalidated(self, tag: str) -> None:
+        self._tag_marks.pop(tag, None)
+        self._tag_marks[tag] = self._next_mark()
+        while len(self._tag_marks) > MAX_TAG_MARKS:
+            # Forgetting a mark is conservative: loads and L2 entries from before it are discarded
+            _, mark = self._tag_marks.popitem(last=False)
+            self._pruned_mark = mark
+
     def clear(self) -> None:
         """Clear all cache entries."""
+        self._cleared_mark = self._next_mark()
         self._cache.clear()
-    
-    def invalidate_prefix(self, prefix: str) -> None:
+        self._tags.clear()
+        self._key_tags.clear()
+
+    def invalidate_tag(self, tag: str) -> int:
+        """Invalidate all cache entries carrying a tag. Returns the number of keys removed."""
+        self._mark_invalidated(tag)
+        keys = self._tags.pop(tag, None)
+        if not keys:
+            return 0
+        for key in keys:
+            self._cache.pop(key, None)
+            self._unindex(key)
+        return len(keys)
+
+    def invalidate_prefix(self, prefix: str) -> int:
         """Invalidate all cache entries with a given prefix."""
-        keys_to_delete = [k for k in self._cache.keys() if k.startswith(prefix)]
-        for key in keys_to_delete:
-            self.delete(key)
-    
+        return self.invalidate_tag(prefix)
+
+    async def invalidate_tag_async(self, tag: str) -> int:
+        """Invalidate a tag in L1 and in the shared L2 backend."""
+        removed = self.invalidate_tag(tag)
+        await self._l2_invalidate_tag(tag)
+        return removed
+
+    async def clear_async(self) -> None:
+        """Clear L1 and every key this cache stored in L2."""
+        self.clear()
+        if self._backend is None:
+            return
+        try:
+            await self._backend.invalidate_tag(self._l2_key(_ALL_KEYS_TAG))
+        except Exception as e:
+            self._l2_errors += 1
+            logger.warning(f"L2 cache clear failed for {self.name}: {e}")
+
+    def _schedule_refresh(
+        self,
+        key: str,
+        entry: _Entry,
+        loader: Callable[[], Awaitable[Any]],
+        error_backoff: float,
+    ) -> None:
+        """Start a background refresh for a stale key unless one is running or backing off."""
+        if key in self._refreshing or self._timer() < entry.retry_at:
+            return
+        task = asyncio.get_running_loop().create_task(self._refresh(entry, loader, error_backoff))
+        self._refreshing[key] = task
+        task.add_done_callback(lambda _: self._refreshing.pop(key, None))
+
+    async def _refresh(self, entry: _Entry, loader: Callable[[], Awaitable[Any]], error_backoff: float) -> None:
+        try:
+            await loader()
+            self._refreshes += 1
+        except Exception as e:
+            # Keep serving the stale value and retry with exponential backoff
+            self._refresh_failures += 1
+            entry.failures += 1
+            delay = min(error_backoff * 2 ** (entry.failures - 1), MAX_REFRESH_BACKOFF)
+            entry.retry_at = self._timer() + delay
+            logger.warning(f"Background cache refresh failed (retry in {delay:.0f}s): {e}")
+
     @property
     def stats(self) -> dict:
         """Get cache statistics."""
+        self._cache.expire()
+        prefixes = {prefix: stats.as_dict() for prefix, stats in sorted(self._prefix_stats.items())}
+        hits = sum(stats['hits'] + stats['stale_hits'] + stats['negative_hits'] for stats in prefixes.values())
+        lookups = hits + sum(stats['misses'] for stats in prefixes.values())
         return {
             'size': len(self._cache),
-            'maxsize': self._cache.maxsize,
+            'maxsize': self._maxsize,
+            'bytes': self._cache.currsize,
+            'max_bytes': self._max_bytes,
+            'evictions': self._cache.evictions,
+            'evicted_bytes': self._cache.evicted_bytes,
+            'rejected': self._rejected,
             'ttl': self._cache.ttl,
+            'tags': len(self._tags),
+            'stale_hits': self._stale_hits,
+            'refreshes': self._refreshes,
+            'refresh_failures': self._refresh_failures,
+            'refreshing': len(self._refreshing),
+            'in_flight': len(self._flights),
+            'coalesced': self._flights.coalesced,
+            'l2': self._backend.name if self._backend is not None else None,
+            'l2_hits': self._l2_hits,
+            'l2_errors': self._l2_errors,
+            'hit_ratio': round(hits / lookups, 4) if lookups else None,
+            'negative_hits': sum(stats['negative_hits'] for stats in prefixes.values()),
+            'expirations': sum(stats['expirations'] for stats in prefixes.values()),
+            'prefixes': prefixes,
             'timestamp': datetime.utcnow().isoformat()
         }
 
 
-# Global cache instances with different TTLs
+def _max_bytes_from_env(name: str, default_mb: int) -> int:
+    return int(float(os.environ.get(f"CACHE_{name.upper()}_MAX_MB", default_mb)) * 1024 * 1024)
+
+
+# Global cache instances with different TTLs and per-worker memory budgets
+# (override with CACHE_SHORT_MAX_MB / CACHE_MEDIUM_MAX_MB / CACHE_LONG_MAX_MB)
 # Short-lived cache for frequently changing data (1 minute)
-short_cache = APICache(maxsize=500, ttl=60)
+short_cache = APICache(maxsize=500, ttl=60, name="short", max_bytes=_max_bytes_from_env("short", 64))
 
 # Medium-lived cache for moderately changing data (5 minutes)
-medium_cache = APICache(maxsize=1000, ttl=300)
+medium_cache = APICache(maxsize=1000, ttl=300, name="medium", max_bytes=_max_bytes_from_env("medium", 64))
 
 # Long-lived cache for rarely changing data (30 minutes)
-long_cache = APICache(maxsize=500, ttl=1800)
+long_cache = APICache(maxsize=500, ttl=1800, name="long", max_bytes=_max_bytes_from_env("long", 32))
+
+_ALL_CACHES = (short_cache, medium_cache, long_cache)
 
+# Keeps fire-and-forget L2 invalidations alive until they finish
+_background_tasks: Set[asyncio.Task] = set()
 
-def cached(cache: APICache = medium_cache, prefix: str = ""):
+
+def cached(
+    cache: APICache = medium_cache,
+    prefix: str = "",
+    tags: Optional[Callable[..., Iterable[str]]] = None,
+    refresh_after: Optional[float] = None,
+    max_stale: Optional[float] = None,
+    error_backoff: float = 5.0,
+    negative_ttl: Optional[float] = None,
+):
     """
     Decorator for caching async function results.
-    
+
     Args:
         cache: Cache instance to use
         prefix: Prefix for cache keys (defaults to function name)
-    
+        tags: Optional callable receiving the call arguments and returning
+            extra invalidation tags (e.g. ``lambda typhoon_id: [f"typhoon:{typhoon_id}"]``)
+        refresh_after: Enables stale-while-revalidate. Entries older than this many
+            seconds are still returned immediately, while one background task reloads them
+        max_stale: Hard cutoff in seconds; older entries are treated as misses
+            (defaults to the cache TTL)
+        error_backoff: Initial delay in seconds before retrying a failed background
+            refresh; doubles on each consecutive failure
+        negative_ttl: Cache a None result (not found) for this many seconds. Negative
+            entries carry the same tags as positive ones, so invalidating the
+            ID's tag (e.g. on update or delete) drops them; they are never written to L2
+
     Usage:
         @cached(cache=short_cache, prefix="incidents")
         async def get_incidents():
             ...
+
+        @cached(cache=short_cache, prefix="active_typhoons", refresh_after=20)
+        async def load_active_typhoons():
+            ...
     """
     def decorator(func: Callable):
+        key_prefix = prefix or func.__name__
+
+        async def load_and_store(
+            cache_key: str,
+            mark: int,
+            max_age: Optional[float],
+            args: tuple,
+            kwargs: dict,
+        ):
+            all_tags = (key_prefix, *(tags(*args, **kwargs) if tags else ()))
+
+            # Another worker may already have loaded it into the shared tier
+            remote = await cache._l2_get(cache_key, max_age=max_age)
+            if remote is not None:
+                value, age, remote_tags = remote
+                if not cache.invalidated_since(remote_tags, mark):
+                    cache._store(cache_key, value, remote_tags, age=age)
+                return value
+
+            started = time.perf_counter()
+            try:
+                result = await func(*args, **kwargs)
+            finally:
+                cache.prefix_stats(key_prefix).observe_load(time.perf_counter() - started)
+            # Skip the write if one of this key's tags was invalidated while we were loading
+            if cache.invalidated_since(all_tags, mark):
+                return result
+            if result is not None:
+                cache.set(cache_key, result, tags=all_tags)
+                await cache._l2_set(cache_key, result, all_tags)
+            elif negative_ttl is not None:
+                cache.set(cache_key, NOT_FOUND, tags=all_tags)
+            return result
+
         @wraps(func)
         async def wrapper(*args, **kwargs):
             # Create cache key
-            key_prefix = prefix or func.__name__
             cache_key = cache._make_key(key_prefix, *args, **kwargs)
-            
+
+            stats = cache.prefix_stats(key_prefix)
+
             # Try to get from cache
-            cached_value = cache.get(cache_key)
-            if cached_value is not None:
-                return cached_value
-            
-            # Call function and cache result
-            async with cache._get_lock(cache_key):
-                # Double-check after acquiring lock
-                cached_value = cache.get(cache_key)
-                if cached_value is not None:
-                    return cached_value
-                
-                result = await func(*args, **kwargs)
-                cache.set(cache_key, result)
-                return result
-        
+            entry = cache.get_entry(cache_key, max_age=max_stale)
+            if entry is not None and entry.value is NOT_FOUND:
+                if negative_ttl is not None and cache.age(entry) < negative_ttl:
+                    stats.negative_hits += 1
+                    return None
+                entry = None
+            if entry is not None:
+                if refresh_after is not None and cache.age(entry) >= refresh_after:
+                    cache._stale_hits += 1
+                    stats.stale_hits += 1
+                    mark = cache.invalidation_mark()
+                    cache._schedule_refresh(
+                        cache_key,
+                        entry,
+                        lambda: load_and_store(cache_key, mark, refresh_after, args, kwargs),
+                        error_backoff,
+                    )
+                else:
+                    stats.hits += 1
+                return entry.value
+
+            # Call function and cache result; concurrent misses share one load
+            stats.misses += 1
+            if cache_key in cache._flights:
+                stats.coalesced += 1
+            mark = cache.invalidation_mark()
+            return await cache._flights.do(
+                cache_key,
+                lambda: load_and_store(cache_key, mark, max_stale, args, kwargs),
+            )
+
         # Attach cache invalidation helper
-        wrapper.invalidate = lambda: cache.invalidate_prefix(prefix or func.__name__)
+        wrapper.invalidate = lambda: cache.invalidate_prefix(key_prefix)
         wrapper.cache = cache
-        
+
         return wrapper
     return decorator
 
 
-def invalidate_cache(prefix: str, cache: APICache = medium_cache):
-    """Invalidate cache entries by prefix."""
-    cache.invalidate_prefix(prefix)
+def invalidate_cache(prefix: str, cache: Optional[APICache] = None) -> int:
+    """
+    Invalidate cache entries by prefix or tag.
+
+    Without an explicit cache, every global cache is invalidated so callers
+    don't need to know which tier a reader was cached in. L1 is invalidated
+    immediately; the shared L2 is invalidated in the background, so prefer
+    ``invalidate_cache_async`` from async code.
+    """
+    caches = (cache,) if cache is not None else _ALL_CACHES
+    removed = sum(c.invalidate_tag(prefix) for c in caches)
+    remote = [c for c in caches if c._backend is not None]
+    if remote:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            logger.warning(f"No event loop; L2 cache not invalidated for {prefix!r}")
+        else:
+            task = asyncio.ensure_future(
+                asyncio.gather(*(c._l2_invalidate_tag(prefix) for c in remote)),
+                loop=loop,
+            )
+            _background_tasks.add(task)
+            task.add_done_callback(_background_tasks.discard)
+    return removed
+
+
+def invalidate_local(prefix: str) -> int:
+    """
+    Invalidate a prefix or tag in this worker's L1 caches only.
+
+    Used by the cross-worker invalidation bus: the writer invalidates the
+    shared L2, and L2 entries stored before this call are no longer pulled
+    back into L1 (see ``APICache.invalidated_after``).
+    """
+    return sum(c.invalidate_tag(prefix) for c in _ALL_CACHES)
+
+
+async def invalidate_cache_async(prefix: str, cache: Optional[APICache] = None) -> int:
+    """Invalidate cache entries by prefix or tag in L1 and the shared L2 backend."""
+    caches = (cache,) if cache is not None else _ALL_CACHES
+    removed = await asyncio.gather(*(c.invalidate_tag_async(prefix) for c in caches))
+    return sum(removed)
 
 
 def clear_all_caches():
-    """Clear all cache instances."""
-    short_cache.clear()
-    medium_cache.clear()
-    long_cache.clear()
+    """Clear all local (L1) cache instances. The shared L2 is left for other workers."""
+    for cache in _ALL_CACHES:
+        cache.clear()
+
+
+async def clear_all_caches_async():
+    """Clear all cache instances, including their keys in the shared L2 backend."""
+    await asyncio.gather(*(cache.clear_async() for cache in _ALL_CACHES))
+
+
+def set_l2_backend(backend: Optional[CacheBackend]) -> None:
+    """Attach a shared L2 backend to every global cache (None detaches it)."""
+    for cache in _ALL_CACHES:
+        cache.set_backend(backend)
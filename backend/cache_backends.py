@@ -0,0 +1,176 @@
+"""
+Second-tier (L2) cache backends shared between worker processes.
+
+APICache keeps a per-process L1 and can be given one of these backends so
+that N uvicorn workers share a single copy of hot results instead of each
+missing and querying MongoDB on its own. Values are opaque bytes; tags are
+tracked per backend so invalidation works across workers.
+"""
+
+import time
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+
+class CacheBackend:
+    """Interface for L2 cache backends. All methods are coroutines."""
+
+    name = "backend"
+
+    async def get(self, key: str) -> Optional[bytes]:
+        """Return the stored bytes for a key, or None on a miss."""
+        raise NotImplementedError
+
+    async def set(self, key: str, value: bytes, ttl: float, tags: Iterable[str] = ()) -> None:
+        """Store bytes for ``ttl`` seconds and index the key under ``tags``."""
+        raise NotImplementedError
+
+    async def delete(self, key: str) -> None:
+        """Remove a key."""
+        raise NotImplementedError
+
+    async def invalidate_tag(self, tag: str) -> int:
+        """Remove every key indexed under ``tag``. Returns the number of keys removed."""
+        raise NotImplementedError
+
+    async def clear(self) -> None:
+        """Remove everything stored by this backend."""
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        """Release connections."""
+
+
+class InMemoryBackend(CacheBackend):
+    """
+    In-process fake of a shared backend for tests.
+
+    Several APICache instances given the same InMemoryBackend behave like
+    workers sharing one Redis.
+    """
+
+    name = "memory"
+
+    def __init__(self, timer=time.monotonic):
+        self._timer = timer
+        self._data: Dict[str, Tuple[bytes, float]] = {}
+        self._tags: Dict[str, Set[str]] = {}
+
+    async def get(self, key: str) -> Optional[bytes]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        value, expires = item
+        if self._timer() >= expires:
+            del self._data[key]
+            return None
+        return value
+
+    async def set(self, key: str, value: bytes, ttl: float, tags: Iterable[str] = ()) -> None:
+        self._data[key] = (value, self._timer() + ttl)
+        for tag in tags:
+            self._tags.setdefault(tag, set()).add(key)
+
+    async def delete(self, key: str) -> None:
+        self._data.pop(key, None)
+
+    async def invalidate_tag(self, tag: str) -> int:
+        removed = 0
+        for key in self._tags.pop(tag, ()):
+            if self._data.pop(key, None) is not None:
+                removed += 1
+        return removed
+
+    async def clear(self) -> None:
+        self._data.clear()
+        self._tags.clear()
+
+
+# Stores a value and adds it to its tag sets. A tag set's expiry is only ever
+# extended, so it outlives every member and invalidation still reaches a key
+# written with a longer TTL than the latest one. Each write also samples a few
+# members of every tag set and drops the ones that have expired, which keeps
+# hot tag sets proportional to their live keys instead of growing forever.
+_SET_SCRIPT = """
+local ttl = tonumber(ARGV[2])
+redis.call('SET', KEYS[1], ARGV[1], 'PX', ttl)
+for i = 2, #KEYS do
+    redis.call('SADD', KEYS[i], KEYS[1])
+    if redis.call('PTTL', KEYS[i]) < ttl then
+        redis.call('PEXPIRE', KEYS[i], ttl)
+    end
+    for _, member in ipairs(redis.call('SRANDMEMBER', KEYS[i], 3)) do
+        if redis.call('EXISTS', member) == 0 then
+            redis.call('SREM', KEYS[i], member)
+        end
+    end
+end
+"""
+
+# Deletes every key in a tag set and the set itself atomically, so a key
+# tagged concurrently can't lose its membership between SMEMBERS and DEL.
+_INVALIDATE_TAG_SCRIPT = """
+local keys = redis.call('SMEMBERS', KEYS[1])
+for i = 1, #keys, 500 do
+    redis.call('DEL', unpack(keys, i, math.min(i + 499, #keys)))
+end
+redis.call('DEL', KEYS[1])
+return #keys
+"""
+
+
+class RedisBackend(CacheBackend):
+    """
+    Redis-protocol backend (works with Redis, Valkey, KeyDB, ...).
+
+    Keys are stored as ``{namespace}:k:{key}`` with a PX expiry; each tag is a
+    set ``{namespace}:t:{tag}`` whose expiry is pushed forward on every write,
+    so tag sets disappear once their newest member has expired and are pruned
+    of expired members while they are being written to.
+    """
+
+    name = "redis"
+
+    def __init__(self, url: str, namespace: str = "apicache", **kwargs):
+        # Optional dependency: only required when an L2 URL is configured
+        import redis.asyncio as redis
+
+        self._namespace = namespace
+        self._redis = redis.from_url(url, **kwargs)
+        self._set_script = self._redis.register_script(_SET_SCRIPT)
+        self._invalidate_script = self._redis.register_script(_INVALIDATE_TAG_SCRIPT)
+
+    def _key(self, key: str) -> str:
+        return f"{self._namespace}:k:{key}"
+
+    def _tag_key(self, tag: str) -> str:
+        return f"{self._namespace}:t:{tag}"
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self._redis.get(self._key(key))
+
+    async def set(self, key: str, value: bytes, ttl: float, tags: Iterable[str] = ()) -> None:
+        ttl_ms = max(int(ttl * 1000), 1)
+        await self._set_script(
+            keys=[self._key(key), *(self._tag_key(tag) for tag in tags)],
+            args=[value, ttl_ms],
+        )
+
+    async def delete(self, key: str) -> None:
+        await self._redis.delete(self._key(key))
+
+    async def invalidate_tag(self, tag: str) -> int:
+        return int(await self._invalidate_script(keys=[self._tag_key(tag)]))
+
+    async def clear(self) -> None:
+        # SCAN-based, so only meant for admin operations, not request paths
+        batch = []
+        async for key in self._redis.scan_iter(match=f"{self._namespace}:*", count=500):
+            batch.append(key)
+            if len(batch) >= 500:
+                await self._redis.delete(*batch)
+                batch = []
+        if batch:
+            await self._redis.delete(*batch)
+
+    async def close(self) -> None:
+        await self._redis.aclose()
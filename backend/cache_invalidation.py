@@ -0,0 +1,216 @@
+"""
+Cross-worker cache invalidation driven by MongoDB change streams.
+
+Route mutations only invalidate the L1 cache of the worker that handled the
+write (and the shared L2). Every worker runs one subscriber that watches the
+collections behind cached reads and evicts the matching tags from its own L1,
+so other workers stop serving stale data before the TTL runs out. L2 is left
+to the writer, so a write costs one L2 invalidation however many workers run.
+The event can reach a subscriber before the writer has cleared L2; the cache
+then refuses L2 entries stored before its local invalidation of one of their
+tags (see ``APICache.invalidated_after``), so L1 isn't refilled from them.
+
+The resume token is only kept in memory. A restarted worker starts with empty
+L1 caches and the writer clears L2 itself, so events missed while a worker was
+down leave nothing stale behind for it to evict.
+
+Change streams need a replica set (Atlas, or a local single-node replica
+set). On a standalone server the subscriber falls back to TTL-only mode.
+"""
+
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+from cache import clear_all_caches, invalidate_local
+
+logger = logging.getLogger(__name__)
+
+# Standalone server ("only supported on replica sets") or a user without the
+# changeStream privilege: neither goes away by retrying
+_CHANGE_STREAMS_UNSUPPORTED = {40573, 13}
+# The resume token fell off the oplog or the stream can't be resumed
+_RESUME_FAILED = {260, 280, 286}
+
+
+def _document_id(change: dict) -> Optional[str]:
+    return (change.get("fullDocument") or {}).get("id")
+
+
+def _typhoon_tags(change: dict) -> List[str]:
+    doc_id = _document_id(change)
+    # Deletes only carry the ObjectId, so fall back to every typhoon detail entry
+    return ["typhoons", "active_typhoons", f"typhoon:{doc_id}" if doc_id else "typhoon_detail"]
+
+
+def _incident_tags(change: dict) -> List[str]:
+    doc_id = _document_id(change)
+    return ["incidents", f"incident:{doc_id}" if doc_id else "incident_detail"]
+
+
+def _push_subscription_tags(change: dict) -> List[str]:
+    tags = ["push_subscriptions"]
+    user_id = (change.get("fullDocument") or {}).get("user_id")
+    if user_id:
+        tags.append(f"push_user:{user_id}")
+    return tags
+
+
+# Collection -> function mapping a change event to the cache tags it affects
+COLLECTION_TAGS: Dict[str, Callable[[dict], List[str]]] = {
+    "typhoons": _typhoon_tags,
+    "incident_reports": _incident_tags,
+    "push_subscriptions": _push_subscription_tags,
+}
+
+
+def tags_for_change(change: dict) -> List[str]:
+    """Map a change stream event to cache tags."""
+    if change.get("operationType") in ("drop", "rename", "dropDatabase", "invalidate"):
+        return []
+    mapper = COLLECTION_TAGS.get((change.get("ns") or {}).get("coll"))
+    return mapper(change) if mapper else []
+
+
+class CacheInvalidationSubscriber:
+    """Background task that turns change events into local cache evictions."""
+
+    def __init__(
+        self,
+        database,
+        collections: Optional[List[str]] = None,
+        invalidate: Callable[[str], Any] = invalidate_local,
+        flush: Callable[[], Any] = clear_all_caches,
+        retry_delay: float = 5.0,
+    ):
+        self._db = database
+        self._collections = collections or list(COLLECTION_TAGS)
+        self._invalidate = invalidate
+        self._flush = flush
+        self._retry_delay = retry_delay
+        self._task: Optional[asyncio.Task] = None
+        # Kept across reconnects so a network blip or election doesn't lose events
+        self._resume_token: Optional[dict] = None
+        # Set when events may have been missed; local caches are flushed on reconnect
+        self._gap = False
+        self.mode = "stopped"
+        self.events = 0
+        self.invalidations = 0
+        self.reconnects = 0
+        self.last_event_at: Optional[str] = None
+
+    def _pipeline(self) -> List[dict]:
+        return [
+            {"$match": {"ns.coll": {"$in": self._collections}}},
+            # Only the fields needed to derive tags; avoids shipping whole documents to every worker
+            {"$project": {
+                "operationType": 1,
+                "ns": 1,
+                "documentKey": 1,
+                "fullDocument.id": 1,
+                "fullDocument.user_id": 1,
+            }},
+        ]
+
+    def start(self) -> None:
+        if self._task is None:
+            self.mode = "starting"
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.mode = "stopped"
+
+    def handle_change(self, change: dict) -> None:
+        """Evict the cache tags affected by one change event."""
+        self.events += 1
+        self.last_event_at = datetime.now(timezone.utc).isoformat()
+        for tag in tags_for_change(change):
+            self.invalidations += self._invalidate(tag) or 0
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                async with self._db.watch(
+                    self._pipeline(),
+                    full_document="updateLookup",
+                    resume_after=self._resume_token,
+                ) as stream:
+                    if self._gap:
+                        # Events may have been missed while disconnected
+                        self._flush()
+                        self._gap = False
+                    self.mode = "change_streams"
+                    logger.info(f"Cache invalidation bus watching {', '.join(self._collections)}")
+                    async for change in stream:
+                        self.handle_change(change)
+                        self._resume_token = stream.resume_token
+                # The stream was invalidated (e.g. a watched collection was dropped)
+                self._resume_token = None
+                self._on_stream_error("change stream closed")
+            except asyncio.CancelledError:
+                raise
+            except OperationFailure as e:
+                if e.code in _CHANGE_STREAMS_UNSUPPORTED:
+                    self.mode = "ttl_only"
+                    logger.warning(f"Change streams unavailable, cache falls back to TTL-only invalidation: {e}")
+                    return
+                if e.code in _RESUME_FAILED:
+                    self._resume_token = None
+                self._on_stream_error(e)
+            except PyMongoError as e:
+                self._on_stream_error(e)
+            await asyncio.sleep(self._retry_delay)
+
+    def _on_stream_error(self, error: Any) -> None:
+        self._gap = True
+        self.reconnects += 1
+        self.mode = "reconnecting"
+        logger.warning(f"Cache invalidation stream error, reconnecting: {error}")
+
+    @property
+    def status(self) -> dict:
+        return {
+            "mode": self.mode,
+            "collections": self._collections,
+            "events": self.events,
+            "invalidations": self.invalidations,
+            "reconnects": self.reconnects,
+            "last_event_at": self.last_event_at,
+        }
+
+
+_subscriber: Optional[CacheInvalidationSubscriber] = None
+
+
+def start_invalidation_bus(database) -> CacheInvalidationSubscriber:
+    """Start the shared subscriber for this worker (idempotent)."""
+    global _subscriber
+    if _subscriber is None:
+        _subscriber = CacheInvalidationSubscriber(database)
+        _subscriber.start()
+    return _subscriber
+
+
+async def stop_invalidation_bus() -> None:
+    """Stop the subscriber for this worker."""
+    global _subscriber
+    if _subscriber is not None:
+        await _subscriber.stop()
+        _subscriber = None
+
+
+def invalidation_bus_status() -> dict:
+    """Status of this worker's subscriber, for /api/cache/stats."""
+    if _subscriber is None:
+        return {"mode": "stopped"}
+    return _subscriber.status
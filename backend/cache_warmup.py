@@ -0,0 +1,97 @@
+"""
+Startup warm-up for hot cached reads.
+
+Route modules register warmers (coroutine functions that call their cached
+loaders with the arguments clients use most). ``app_lifespan`` runs them all
+concurrently within a time budget before the worker reports ready, so the
+first wave of requests after a deploy hits a warm cache instead of MongoDB.
+"""
+
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+Warmer = Callable[[], Awaitable[object]]
+
+
+class CacheWarmup:
+    """Registry of warmers and the outcome of the last warm-up run."""
+
+    def __init__(self):
+        self._warmers: Dict[str, Warmer] = {}
+        self.state = "pending"
+        self.results: Dict[str, str] = {}
+        self.duration: Optional[float] = None
+        self.finished_at: Optional[str] = None
+
+    def register(self, name: str, warmer: Optional[Warmer] = None):
+        """
+        Register a warmer under ``name``; usable directly or as a decorator.
+
+        Usage:
+            register_warmer("active_typhoons", _load_active_typhoons)
+
+            @register_warmer("incidents")
+            async def warm_incidents():
+                await _load_incident_reports(0, 100, None, None)
+        """
+        def decorator(fn: Warmer) -> Warmer:
+            self._warmers[name] = fn
+            return fn
+
+        return decorator(warmer) if warmer is not None else decorator
+
+    @property
+    def ready(self) -> bool:
+        """True once warm-up has finished, whatever its outcome."""
+        return self.state in ("done", "partial")
+
+    async def run(self, budget: float = 10.0) -> dict:
+        """
+        Run every warmer concurrently, cancelling whatever is still running
+        after ``budget`` seconds. Failures are logged and never raised.
+        """
+        self.state = "running"
+        self.results = {}
+        started = time.perf_counter()
+
+        tasks = {
+            asyncio.ensure_future(warmer()): name
+            for name, warmer in self._warmers.items()
+        }
+        done, pending = await asyncio.wait(tasks, timeout=budget) if tasks else (set(), set())
+
+        for task in pending:
+            task.cancel()
+            self.results[tasks[task]] = "timeout"
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+        for task in done:
+            error = task.exception()
+            if error is not None:
+                logger.warning(f"Cache warmer {tasks[task]} failed: {error}")
+            self.results[tasks[task]] = "ok" if error is None else f"error: {error}"
+
+        self.duration = round(time.perf_counter() - started, 3)
+        self.finished_at = datetime.now(timezone.utc).isoformat()
+        self.state = "done" if all(result == "ok" for result in self.results.values()) else "partial"
+        logger.info(f"Cache warm-up {self.state} in {self.duration:.3f}s ({len(self.results)} warmers)")
+        return self.status
+
+    @property
+    def status(self) -> dict:
+        return {
+            "state": self.state,
+            "duration_seconds": self.duration,
+            "finished_at": self.finished_at,
+            "warmers": {name: self.results.get(name, self.state) for name in sorted(self._warmers)},
+        }
+
+
+# Shared registry for this worker
+warmup = CacheWarmup()
+register_warmer = warmup.register
@@ -3,10 +3,8 @@ Script to create test admin user
 Run this script to add admin credentials to the database
 """
 import asyncio
-from motor.motor_asyncio import AsyncIOMotorClient
 import bcrypt
 import uuid
-import os
 from datetime import datetime, timezone
 from dotenv import load_dotenv
 from pathlib import Path
@@ -14,16 +12,14 @@ from pathlib import Path
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-db_name = os.environ['DB_NAME']
+# Shared MongoDB client (see database.py)
+from database import close_client, get_database  # noqa: E402
 
 def hash_password(password: str) -> str:
     return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
 
 async def create_admin_user():
-    client = AsyncIOMotorClient(mongo_url)
-    db = client[db_name]
+    db = get_database()
     
     # Check if admin already exists
     existing_admin = await db.users.find_one({"username": "admin"})
@@ -40,7 +36,7 @@ async def create_admin_user():
         "email": "admin@emergency.com",
         "hashed_password": hash_password("admin123"),
         "role": "admin",
-        "created_at": datetime.now(timezone.utc).isoformat()
+        "created_at": datetime.now(timezone.utc)
     }
     
     await db.users.insert_one(admin_user)
@@ -61,7 +57,7 @@ async def create_admin_user():
             "email": "user@test.com",
             "hashed_password": hash_password("test123"),
             "role": "user",
-            "created_at": datetime.now(timezone.utc).isoformat()
+            "created_at": datetime.now(timezone.utc)
         }
         await db.users.insert_one(test_user)
         print("\n✅ Test user created successfully!")
@@ -69,7 +65,7 @@ async def create_admin_user():
         print(f"   Password: test123")
         print(f"   Role: user")
     
-    client.close()
+    await close_client()
 
 if __name__ == "__main__":
     print("Creating admin user...\n")
@@ -3,10 +3,8 @@ Script to create custom admin users
 Run this script to add custom admin credentials to MongoDB Atlas
 """
 import asyncio
-from motor.motor_asyncio import AsyncIOMotorClient
 import bcrypt
 import uuid
-import os
 from datetime import datetime, timezone
 from dotenv import load_dotenv
 from pathlib import Path
@@ -15,16 +13,14 @@ import sys
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-db_name = os.environ['DB_NAME']
+# Shared MongoDB client (see database.py)
+from database import DB_NAME as db_name, close_client, get_database  # noqa: E402
 
 def hash_password(password: str) -> str:
     return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
 
 async def create_custom_admin(username: str, password: str, email: str):
-    client = AsyncIOMotorClient(mongo_url)
-    db = client[db_name]
+    db = get_database()
     
     try:
         # Check if username already exists
@@ -42,7 +38,7 @@ async def create_custom_admin(username: str, password: str, email: str):
             "email": email,
             "hashed_password": hash_password(password),
             "role": "admin",
-            "created_at": datetime.now(timezone.utc).isoformat()
+            "created_at": datetime.now(timezone.utc)
         }
         
         await db.users.insert_one(admin_user)
@@ -60,12 +56,11 @@ async def create_custom_admin(username: str, password: str, email: str):
         print(f"❌ Error creating admin user: {e}")
         return False
     finally:
-        client.close()
+        await close_client()
 
 async def list_all_users():
     """List all users in the database"""
-    client = AsyncIOMotorClient(mongo_url)
-    db = client[db_name]
+    db = get_database()
     
     try:
         users = await db.users.find({}, {"username": 1, "email": 1, "role": 1, "_id": 0}).to_list(100)
@@ -83,7 +78,7 @@ async def list_all_users():
     except Exception as e:
         print(f"❌ Error listing users: {e}")
     finally:
-        client.close()
+        await close_client()
 
 def print_usage():
     print("\n📘 Usage:")
@@ -1,13 +1,30 @@
 """
 Centralized database connection module.
 Provides a single shared MongoDB client for all routes to prevent connection pool exhaustion.
+
+Every module (routes, startup index builds, admin scripts) gets its database
+through ``get_database``/``db`` here, so each worker process has exactly one
+client and one pool per server. Pool size comes from ``pool_settings``.
+
+The analytics endpoints read through a second, read-only client
+(``get_analytics_database``/``analytics_db``): secondary-preferred reads and a
+small pool of its own (``MONGO_ANALYTICS_POOL_SIZE``, default 4), so a burst of
+dashboard refreshes queues on that pool instead of taking connections, or
+primary capacity, from incident submission.
 """
 
+import math
 import os
+from datetime import timezone
+from typing import Optional
+
 from motor.motor_asyncio import AsyncIOMotorClient
 from dotenv import load_dotenv
 from pathlib import Path
 
+from db_monitoring import analytics_pool_listener, command_listener, event_listeners
+from tracing import command_listener as tracing_listener
+
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
@@ -15,9 +32,64 @@ load_dotenv(ROOT_DIR / '.env')
 MONGO_URL = os.environ['MONGO_URL']
 DB_NAME = os.environ['DB_NAME']
 
+# Connections pymongo keeps per server for monitoring, outside the pool
+MONITORING_CONNECTIONS = 2
+
+
+def analytics_pool_size() -> int:
+    """maxPoolSize of the analytics client (``MONGO_ANALYTICS_POOL_SIZE``)."""
+    return max(int(os.environ.get('MONGO_ANALYTICS_POOL_SIZE', '4')), 1)
+
+
+def analytics_reserved_connections() -> int:
+    """Connections per server one worker's analytics client can hold."""
+    return analytics_pool_size() + MONITORING_CONNECTIONS
+
+
+def pool_settings(
+    workers: Optional[int] = None,
+    target_concurrency: Optional[int] = None,
+    connection_budget: Optional[int] = None,
+    reserved: int = 0,
+) -> dict:
+    """
+    maxPoolSize/minPoolSize for one worker's client.
+
+    A worker needs about as many connections as MongoDB operations it runs at
+    once (``MONGO_TARGET_CONCURRENCY``, default 50). When the deployment has a
+    per-server connection limit to share (``MONGO_CONNECTION_BUDGET``, e.g. our
+    part of the Atlas tier limit), it is split across the ``WEB_CONCURRENCY``
+    worker processes after their monitoring connections, and the pool is capped
+    at that share, less ``reserved`` connections kept for the worker's other
+    clients. ``MONGO_MAX_POOL_SIZE`` overrides the computed size.
+    """
+    override = os.environ.get('MONGO_MAX_POOL_SIZE')
+    if override:
+        max_pool = int(override)
+    else:
+        workers = workers or int(os.environ.get('WEB_CONCURRENCY', '1'))
+        target_concurrency = target_concurrency or int(os.environ.get('MONGO_TARGET_CONCURRENCY', '50'))
+        if connection_budget is None and os.environ.get('MONGO_CONNECTION_BUDGET'):
+            connection_budget = int(os.environ['MONGO_CONNECTION_BUDGET'])
+        max_pool = target_concurrency
+        if connection_budget is not None:
+            share = math.floor(connection_budget / max(workers, 1)) - MONITORING_CONNECTIONS - reserved
+            max_pool = min(max_pool, share)
+    max_pool = max(max_pool, 1)
+    return {'maxPoolSize': max_pool, 'minPoolSize': min(10, max_pool // 5)}
+
+
+def main_pool_settings() -> dict:
+    """pool_settings of the shared client, leaving room for the analytics client."""
+    return pool_settings(reserved=analytics_reserved_connections())
+
+
 # Single shared client with optimized connection pool
 _client = None
 _db = None
+# Read-only client for analytics
+_analytics_client = None
+_analytics_db = None
 
 
 def get_client() -> AsyncIOMotorClient:
@@ -26,13 +98,18 @@ def get_client() -> AsyncIOMotorClient:
     if _client is None:
         _client = AsyncIOMotorClient(
             MONGO_URL,
-            maxPoolSize=50,  # Maximum connections in pool
-            minPoolSize=10,  # Minimum connections to maintain
+            **main_pool_settings(),  # maxPoolSize/minPoolSize per worker
             maxIdleTimeMS=30000,  # Close idle connections after 30s
             connectTimeoutMS=5000,  # Connection timeout
             serverSelectionTimeoutMS=5000,  # Server selection timeout
             retryWrites=True,
             retryReads=True,
+            # Dates come back as UTC-aware datetimes (see timestamps)
+            tz_aware=True,
+            tzinfo=timezone.utc,
+            # Command latency, slow-query log and pool metrics (see db_monitoring),
+            # plus per-command spans for sampled request traces (see tracing)
+            event_listeners=[*event_listeners(), tracing_listener],
         )
     return _client
 
@@ -45,15 +122,61 @@ def get_database():
     return _db
 
 
+def get_analytics_client() -> AsyncIOMotorClient:
+    """
+    Get the read-only analytics client.
+
+    Reads go to a secondary when one is available (``MONGO_ANALYTICS_READ_PREFERENCE``,
+    default secondaryPreferred), optionally bounded by
+    ``MONGO_ANALYTICS_MAX_STALENESS_SECONDS`` (at least 90). Its pool is small
+    and starts empty; per-query time limits are set by the callers.
+    """
+    global _analytics_client
+    if _analytics_client is None:
+        options = {}
+        max_staleness = os.environ.get('MONGO_ANALYTICS_MAX_STALENESS_SECONDS')
+        if max_staleness:
+            options['maxStalenessSeconds'] = int(max_staleness)
+        _analytics_client = AsyncIOMotorClient(
+            MONGO_URL,
+            maxPoolSize=analytics_pool_size(),
+            minPoolSize=0,
+            readPreference=os.environ.get('MONGO_ANALYTICS_READ_PREFERENCE', 'secondaryPreferred'),
+            appname='analytics',  # tells these connections apart in server logs and currentOp
+            maxIdleTimeMS=30000,
+            connectTimeoutMS=5000,
+            serverSelectionTimeoutMS=5000,
+            retryReads=True,
+            tz_aware=True,
+            tzinfo=timezone.utc,
+            event_listeners=[command_listener, analytics_pool_listener, tracing_listener],
+            **options,
+        )
+    return _analytics_client
+
+
+def get_analytics_database():
+    """Get the analytics (read-only) database instance."""
+    global _analytics_db
+    if _analytics_db is None:
+        _analytics_db = get_analytics_client()[DB_NAME]
+    return _analytics_db
+
+
 async def close_client():
-    """Close the MongoDB client connection."""
-    global _client, _db
+    """Close the MongoDB client connections."""
+    global _client, _db, _analytics_client, _analytics_db
     if _client is not None:
         _client.close()
         _client = None
         _db = None
+    if _analytics_client is not None:
+        _analytics_client.close()
+        _analytics_client = None
+        _analytics_db = None
 
 
 # Convenience exports
 db = get_database()
 client = get_client()
+analytics_db = get_analytics_database()
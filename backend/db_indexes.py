@@ -0,0 +1,355 @@
+"""
+Declarative MongoDB index spec for every collection the API queries.
+
+``INDEXES`` lists the indexes each collection should have. At startup
+``index_manager`` compares it with what exists (``list_indexes``) and builds
+the missing ones one at a time in a background task on the shared client, so
+the worker serves traffic while they build. Indexes whose definition differs
+from the spec, or that exist but are not in it, are reported but never
+dropped automatically.
+
+``QUERY_SHAPES`` records the filter/sort of each route's queries;
+``explain_report`` runs them through ``explain`` and flags any that would
+scan a whole collection (COLLSCAN). tests/test_db_indexes.py runs it against
+a real MongoDB when one is available, and always runs ``uncovered_shapes``,
+a static check that each shape can be served by a prefix of an index in
+``INDEXES``, so a new query without a matching index fails the test.
+"""
+
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+from pagination import after_cursor, encode_cursor
+from timestamps import time_range
+
+logger = logging.getLogger(__name__)
+
+INDEXES: Dict[str, List[IndexModel]] = {
+    'users': [
+        IndexModel([('username', ASCENDING)], unique=True, name='username_unique'),
+        # Analytics: new registrations in a date range
+        IndexModel([('created_at', ASCENDING)], name='created_at_index'),
+    ],
+    'incident_reports': [
+        IndexModel([('id', ASCENDING)], unique=True, name='incident_id_unique'),
+        IndexModel([('fullName', ASCENDING)], name='fullName_index'),
+        # Keyset pages (see pagination): equality filters first, then the (created_at, id) sort key.
+        # These supersede status_index, priority_index, created_at_index and status_priority_compound
+        IndexModel([('created_at', DESCENDING), ('id', DESCENDING)], name='created_at_id'),
+        IndexModel([('status', ASCENDING), ('created_at', DESCENDING), ('id', DESCENDING)],
+                   name='status_created_at_id'),
+        IndexModel([('priority', ASCENDING), ('created_at', DESCENDING), ('id', DESCENDING)],
+                   name='priority_created_at_id'),
+        IndexModel([('status', ASCENDING), ('priority', ASCENDING), ('created_at', DESCENDING), ('id', DESCENDING)],
+                   name='status_priority_created_at_id'),
+    ],
+    'typhoons': [
+        IndexModel([('id', ASCENDING)], unique=True, name='typhoon_id_unique'),
+        # Typhoon list (optionally filtered by status, skip/limit or keyset pages) and the
+        # active feed, newest first; supersede status_created_at and created_at_desc
+        IndexModel([('status', ASCENDING), ('created_at', DESCENDING), ('id', DESCENDING)],
+                   name='status_created_at_id'),
+        IndexModel([('created_at', DESCENDING), ('id', DESCENDING)], name='created_at_id_desc'),
+    ],
+    'analytics_events': [
+        IndexModel([('timestamp', ASCENDING)], name='timestamp_index'),
+    ],
+    'push_subscriptions': [
+        IndexModel([('endpoint', ASCENDING)], name='endpoint_index'),
+        IndexModel([('active', ASCENDING), ('user_id', ASCENDING)], name='active_user_id'),
+        # Send-notification filter on preferences.<notification_type>
+        IndexModel([('preferences.$**', ASCENDING)], name='preferences_wildcard'),
+    ],
+    'notification_logs': [
+        IndexModel([('timestamp', DESCENDING)], name='timestamp_desc'),
+    ],
+}
+
+# Options that make two indexes with the same key pattern behave differently
+_COMPARED_OPTIONS = ('unique', 'sparse', 'partialFilterExpression', 'expireAfterSeconds')
+
+_SAMPLE_RANGE = (datetime(2024, 1, 1, tzinfo=timezone.utc), datetime(2024, 2, 1, tzinfo=timezone.utc))
+_SAMPLE_CURSOR = encode_cursor({'created_at': _SAMPLE_RANGE[1], 'id': 'x'})
+_KEYSET_SORT = {'created_at': -1, 'id': -1}
+
+# Filter and sort of the queries routes run, for explain_report
+QUERY_SHAPES = (
+    {'route': 'GET /api/auth/me', 'collection': 'users', 'filter': {'username': 'u'}},
+    {'route': 'GET /api/analytics/users', 'collection': 'users',
+     'filter': time_range('created_at', *_SAMPLE_RANGE)},
+    {'route': 'GET /api/incidents/', 'collection': 'incident_reports', 'filter': {'status': 'submitted'}},
+    {'route': 'GET /api/incidents/', 'collection': 'incident_reports',
+     'filter': {'status': 'submitted', 'priority': 'high'}},
+    {'route': 'GET /api/incidents/{report_id}', 'collection': 'incident_reports', 'filter': {'id': 'r'}},
+    {'route': 'GET /api/incidents/user/{user_id}', 'collection': 'incident_reports', 'filter': {'fullName': 'u'}},
+    {'route': 'GET /api/typhoons/', 'collection': 'typhoons', 'filter': {}, 'sort': {'created_at': -1}},
+    {'route': 'GET /api/typhoons/', 'collection': 'typhoons',
+     'filter': {'status': 'archived'}, 'sort': {'created_at': -1}},
+    {'route': 'GET /api/typhoons/active', 'collection': 'typhoons',
+     'filter': {'status': 'active'}, 'sort': {'created_at': -1}},
+    {'route': 'GET /api/incidents/?cursor=', 'collection': 'incident_reports',
+     'filter': {'status': 'submitted', **after_cursor(_SAMPLE_CURSOR)}, 'sort': _KEYSET_SORT},
+    {'route': 'GET /api/incidents/?cursor=', 'collection': 'incident_reports',
+     'filter': {'status': 'submitted', 'priority': 'high', **after_cursor(_SAMPLE_CURSOR)}, 'sort': _KEYSET_SORT},
+    {'route': 'GET /api/incidents/?cursor=', 'collection': 'incident_reports',
+     'filter': {'priority': 'high', **after_cursor(_SAMPLE_CURSOR)}, 'sort': _KEYSET_SORT},
+    {'route': 'GET /api/typhoons/?cursor=', 'collection': 'typhoons',
+     'filter': after_cursor(_SAMPLE_CURSOR), 'sort': _KEYSET_SORT},
+    {'route': 'GET /api/typhoons/{typhoon_id}', 'collection': 'typhoons', 'filter': {'id': 't'}},
+    {'route': 'GET /api/analytics/dashboard', 'collection': 'analytics_events',
+     'filter': time_range('timestamp', *_SAMPLE_RANGE)},
+    {'route': 'GET /api/analytics/dashboard', 'collection': 'incident_reports',
+     'filter': time_range('created_at', *_SAMPLE_RANGE)},
+    {'route': 'GET /api/analytics/realtime', 'collection': 'incident_reports',
+     'filter': time_range('created_at', _SAMPLE_RANGE[0])},
+    {'route': 'POST /api/notifications/subscribe', 'collection': 'push_subscriptions',
+     'filter': {'endpoint': 'https://push.example/1'}},
+    {'route': 'GET /api/notifications/preferences/{user_id}', 'collection': 'push_subscriptions',
+     'filter': {'user_id': 'u', 'active': True}},
+    {'route': 'POST /api/notifications/send', 'collection': 'push_subscriptions',
+     'filter': {'active': True, 'preferences.typhoons': True}},
+    {'route': 'POST /api/notifications/send', 'collection': 'push_subscriptions',
+     'filter': {'active': True, 'preferences.typhoons': True, 'user_id': {'$in': ['u1', 'u2']}}},
+    {'route': 'GET /api/notifications/history', 'collection': 'notification_logs',
+     'filter': {}, 'sort': {'timestamp': -1}},
+)
+
+
+def _key_pattern(index: dict) -> tuple:
+    return tuple((field, direction) for field, direction in index['key'].items())
+
+
+def _options(index: dict) -> dict:
+    return {option: index[option] for option in _COMPARED_OPTIONS if option in index}
+
+
+async def diff_indexes(db, spec: Dict[str, List[IndexModel]] = INDEXES) -> dict:
+    """
+    Compare the spec with the indexes that exist.
+
+    Returns ``{"missing": {collection: [IndexModel]}, "conflicting": [...],
+    "unmanaged": [...]}``. An existing index with the spec's key pattern and
+    options counts as present even if its name differs.
+    """
+    missing: Dict[str, List[IndexModel]] = {}
+    conflicting, unmanaged = [], []
+    for collection, models in spec.items():
+        existing = [index async for index in db[collection].list_indexes()]
+        by_name = {index['name']: index for index in existing}
+        by_key = {_key_pattern(index): index for index in existing}
+        wanted_names = set()
+        for model in models:
+            wanted = model.document
+            wanted_names.add(wanted['name'])
+            current = by_name.get(wanted['name']) or by_key.get(_key_pattern(wanted))
+            if current is None:
+                missing.setdefault(collection, []).append(model)
+            elif _key_pattern(current) != _key_pattern(wanted) or _options(current) != _options(wanted):
+                conflicting.append({
+                    'collection': collection,
+                    'name': wanted['name'],
+                    'existing': {'key': dict(current['key']), **_options(current)},
+                    'wanted': {'key': dict(wanted['key']), **_options(wanted)},
+                })
+            else:
+                wanted_names.add(current['name'])
+        unmanaged.extend(
+            {'collection': collection, 'name': index['name'], 'key': dict(index['key'])}
+            for index in existing
+            if index['name'] != '_id_' and index['name'] not in wanted_names
+        )
+    return {'missing': missing, 'conflicting': conflicting, 'unmanaged': unmanaged}
+
+
+def plan_stages(plan) -> List[str]:
+    """Every stage name in an explain plan tree, outermost first."""
+    stages = []
+    if isinstance(plan, dict):
+        if 'stage' in plan:
+            stages.append(plan['stage'])
+        for key in ('queryPlan', 'inputStage', 'inputStages', 'shards'):
+            if key in plan:
+                stages.extend(plan_stages(plan[key]))
+    elif isinstance(plan, list):
+        for child in plan:
+            stages.extend(plan_stages(child))
+    return stages
+
+
+async def explain_report(db, shapes=QUERY_SHAPES) -> List[dict]:
+    """Winning plan of every query shape, with ``collscan`` set where no index is used."""
+    report = []
+    for shape in shapes:
+        find = {'find': shape['collection'], 'filter': shape['filter']}
+        if shape.get('sort'):
+            find['sort'] = shape['sort']
+        explained = await db.command('explain', find, verbosity='queryPlanner')
+        stages = plan_stages(explained['queryPlanner']['winningPlan'])
+        report.append({
+            'route': shape['route'],
+            'collection': shape['collection'],
+            'filter': shape['filter'],
+            'sort': shape.get('sort'),
+            'stages': stages,
+            'collscan': 'COLLSCAN' in stages,
+        })
+    return report
+
+
+def _filter_alternatives(query: dict) -> List[Tuple[FrozenSet[str], FrozenSet[str]]]:
+    """
+    ``(equality fields, other constrained fields)`` of each branch of a filter.
+
+    Top-level fields apply to every branch of a ``$or`` (MongoDB plans each
+    branch on its own index); ``$and`` parts are combined.
+    """
+    eq = frozenset(
+        field for field, condition in query.items()
+        if not field.startswith('$')
+        and not (isinstance(condition, dict) and any(op.startswith('$') for op in condition))
+    )
+    ranges = frozenset(field for field in query if not field.startswith('$')) - eq
+    alternatives = [(eq, ranges)]
+    for operator, parts in query.items():
+        if operator not in ('$or', '$and'):
+            continue
+        if operator == '$or':
+            branches = [alt for part in parts for alt in _filter_alternatives(part)]
+            alternatives = [(e | be, r | br) for e, r in alternatives for be, br in branches]
+        else:
+            for part in parts:
+                alternatives = [(e | pe, r | pr) for e, r in alternatives for pe, pr in _filter_alternatives(part)]
+    return alternatives
+
+
+def _key_matches(index_field: str, field: str) -> bool:
+    if index_field.endswith('.$**'):
+        return field.startswith(index_field[:-3])
+    return index_field == field
+
+
+def _index_serves(keys: List[Tuple[str, int]], eq: FrozenSet[str], ranges: FrozenSet[str], sort: dict) -> bool:
+    """Whether a prefix of ``keys`` bounds the filter branch and, if sorted, provides the order."""
+    fields = [field for field, _ in keys]
+    # Equality fields may come first in any order
+    prefix = 0
+    while prefix < len(keys) and any(_key_matches(fields[prefix], field) for field in eq):
+        prefix += 1
+    sort_keys = [(field, direction) for field, direction in sort.items() if field not in eq]
+    if not sort_keys:
+        if prefix:
+            return True
+        return bool(keys) and any(_key_matches(fields[0], field) for field in ranges)
+    # A sort is only index-provided after every equality field
+    if {field for field in eq if any(_key_matches(f, field) for f in fields[:prefix])} != eq:
+        return False
+    window = keys[prefix:prefix + len(sort_keys)]
+    if window != sort_keys and window != [(field, -direction) for field, direction in sort_keys]:
+        return False
+    # Range bounds on the sort fields or on the key right after them
+    return all(field in fields[prefix:prefix + len(sort_keys) + 1] for field in ranges)
+
+
+def uncovered_shapes(shapes=QUERY_SHAPES, spec: Dict[str, List[IndexModel]] = INDEXES) -> List[dict]:
+    """
+    Query shapes that no index prefix in ``spec`` serves, without a database.
+
+    A static counterpart of ``explain_report``: each ``$or`` branch needs an
+    index whose leading keys are its equality fields (or one of its range
+    fields), followed by the sort keys in either direction when sorted.
+    """
+    uncovered = []
+    for shape in shapes:
+        indexes = [list(model.document['key'].items()) for model in spec.get(shape['collection'], ())]
+        sort = shape.get('sort') or {}
+        if not all(
+            any(_index_serves(keys, eq, ranges, sort) for keys in indexes)
+            for eq, ranges in _filter_alternatives(shape['filter'])
+        ):
+            uncovered.append(shape)
+    return uncovered
+
+
+class IndexManager:
+    """Builds missing indexes in the background and keeps the outcome for diagnostics."""
+
+    def __init__(self, spec: Dict[str, List[IndexModel]] = INDEXES):
+        self.spec = spec
+        self.state = 'pending'
+        self.diff: Optional[dict] = None
+        self.built: List[str] = []
+        self.failed: Dict[str, str] = {}
+        self.finished_at: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self, db) -> None:
+        """Diff and build in a background task (startup does not wait for it)."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.sync(db))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def sync(self, db) -> None:
+        """Build every missing index, one at a time; failures are logged, not raised."""
+        self.state = 'running'
+        self.built, self.failed = [], {}
+        try:
+            self.diff = await diff_indexes(db, self.spec)
+        except Exception as e:
+            self.state = 'error'
+            logger.warning(f"Could not read existing indexes: {e}")
+            return
+        for entry in self.diff['conflicting']:
+            logger.warning(
+                f"Index {entry['collection']}.{entry['name']} differs from the spec "
+                f"(existing {entry['existing']}, wanted {entry['wanted']}); not rebuilt"
+            )
+
+        for collection, models in self.diff['missing'].items():
+            for model in models:
+                name = f"{collection}.{model.document['name']}"
+                started = time.perf_counter()
+                try:
+                    await db[collection].create_indexes([model])
+                except Exception as e:
+                    self.failed[name] = str(e)
+                    logger.error(f"Building index {name} failed: {e}")
+                    continue
+                self.built.append(name)
+                logger.info(f"Built index {name} in {time.perf_counter() - started:.1f}s")
+
+        self.state = 'partial' if self.failed else 'done'
+        self.finished_at = datetime.now(timezone.utc).isoformat()
+
+    @property
+    def status(self) -> dict:
+        diff = self.diff or {}
+        return {
+            'state': self.state,
+            'missing': sorted(
+                f"{collection}.{model.document['name']}"
+                for collection, models in diff.get('missing', {}).items()
+                for model in models
+            ),
+            'built': self.built,
+            'failed': self.failed,
+            'conflicting': diff.get('conflicting', []),
+            'unmanaged': diff.get('unmanaged', []),
+            'finished_at': self.finished_at,
+        }
+
+
+# Shared manager for this worker
+index_manager = IndexManager()
@@ -0,0 +1,301 @@
+"""
+pymongo command and connection-pool listeners for the shared client.
+
+Registered on the clients in database.py. They export:
+
+  * ``mongodb_command_duration_seconds`` per collection and command,
+  * ``mongodb_command_errors_total``,
+  * ``mongodb_pool_checkout_wait_seconds`` and checkout failures,
+  * open / in-use / available connection gauges per server,
+  * per-pool saturation: max size, in-use / max, threads waiting for a
+    connection, and the peak in-use count (to size ``maxPoolSize`` from data).
+
+Pool metrics carry a ``pool`` label: ``main`` for the shared client,
+``analytics`` for the read-only analytics client.
+
+Commands slower than ``MONGO_SLOW_QUERY_MS`` are logged with the *shape* of
+their filter (operators and field names, every value replaced by ``"?"``), so
+the log says which query needs an index without leaking user data.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Tuple
+
+from prometheus_client import Counter, Gauge, Histogram
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+COMMAND_LATENCY = Histogram(
+    'mongodb_command_duration_seconds',
+    'MongoDB command latency in seconds',
+    ['collection', 'command'],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+
+COMMAND_ERRORS = Counter(
+    'mongodb_command_errors_total',
+    'MongoDB commands that failed',
+    ['collection', 'command'],
+)
+
+POOL_CHECKOUT_WAIT = Histogram(
+    'mongodb_pool_checkout_wait_seconds',
+    'Time spent waiting for a connection from the pool',
+    ['pool'],
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0),
+)
+
+POOL_CHECKOUT_FAILURES = Counter(
+    'mongodb_pool_checkout_failures_total',
+    'Connection checkouts that failed',
+    ['pool', 'reason'],
+)
+
+DB_CONNECTION_POOL_SIZE = Gauge(
+    'db_connection_pool_size',
+    'Open connections in the MongoDB pool',
+    ['pool', 'address'],
+)
+
+POOL_IN_USE = Gauge(
+    'mongodb_pool_connections_in_use',
+    'MongoDB connections currently checked out',
+    ['pool', 'address'],
+)
+
+POOL_AVAILABLE = Gauge(
+    'mongodb_pool_connections_available',
+    'Idle MongoDB connections ready to be checked out',
+    ['pool', 'address'],
+)
+
+POOL_MAX_SIZE = Gauge(
+    'mongodb_pool_max_size',
+    'maxPoolSize of the MongoDB pool',
+    ['pool', 'address'],
+)
+
+POOL_SATURATION = Gauge(
+    'mongodb_pool_saturation_ratio',
+    'Checked-out connections as a fraction of maxPoolSize',
+    ['pool', 'address'],
+)
+
+POOL_WAITING = Gauge(
+    'mongodb_pool_checkouts_waiting',
+    'Operations currently waiting for a connection from the pool',
+    ['pool', 'address'],
+)
+
+POOL_PEAK_IN_USE = Gauge(
+    'mongodb_pool_connections_in_use_peak',
+    'Highest number of connections checked out at once since startup',
+    ['pool', 'address'],
+)
+
+# pymongo's maxPoolSize when the client doesn't set one
+DEFAULT_MAX_POOL_SIZE = 100
+
+# Command fields that never carry user data and are worth keeping verbatim
+_VERBATIM_FIELDS = frozenset({'sort', 'projection', 'limit', 'skip', 'batchSize', 'hint', 'allowDiskUse'})
+# Driver/session bookkeeping that says nothing about the query
+_IGNORED_FIELDS = frozenset({
+    '$db', 'lsid', '$clusterTime', 'txnNumber', 'autocommit', 'startTransaction',
+    '$readPreference', 'readConcern', 'writeConcern', 'ordered', 'cursor', 'comment',
+    'maxTimeMS', 'apiVersion', 'apiStrict', 'apiDeprecationErrors',
+})
+
+
+def value_shape(value: Any) -> Any:
+    """Replace every value in a filter with "?", keeping field names and operators."""
+    if isinstance(value, dict):
+        return {key: value_shape(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        # Lists of sub-documents ($or, $and, pipelines) keep their structure; value lists collapse
+        if value and all(isinstance(item, dict) for item in value):
+            return [value_shape(item) for item in value]
+        return '?'
+    return '?'
+
+
+def command_shape(command_name: str, command: dict) -> dict:
+    """Shape of a command document suitable for logging."""
+    shape = {}
+    for key, value in command.items():
+        if key in _IGNORED_FIELDS or key == command_name:
+            continue
+        if key in ('documents',):  # insert payloads
+            shape[key] = f"<{len(value)} documents>"
+        elif key in _VERBATIM_FIELDS:
+            shape[key] = value
+        else:
+            shape[key] = value_shape(value)
+    return shape
+
+
+def _collection_of(event) -> str:
+    """Collection a command targets, or "-" for database/admin commands like ping."""
+    key = 'collection' if event.command_name == 'getMore' else event.command_name
+    target = event.command.get(key)
+    return target if isinstance(target, str) else '-'
+
+
+class CommandMetricsListener(monitoring.CommandListener):
+    """Latency/error metrics per collection and command, plus the slow-query log."""
+
+    def __init__(self, slow_threshold: float = 0.1, history: int = 50):
+        self.slow_threshold = slow_threshold
+        self.slow_queries: deque = deque(maxlen=history)
+        # (request_id, connection_id) -> (collection, command document); pymongo calls
+        # listeners from executor threads, so guard the dict
+        self._started: Dict[Tuple[int, Any], Tuple[str, dict]] = {}
+        self._lock = threading.Lock()
+
+    def started(self, event) -> None:
+        with self._lock:
+            self._started[(event.request_id, event.connection_id)] = (_collection_of(event), event.command)
+
+    def _finish(self, event) -> Tuple[str, Optional[dict]]:
+        with self._lock:
+            collection, command = self._started.pop((event.request_id, event.connection_id), ('-', None))
+        COMMAND_LATENCY.labels(collection=collection, command=event.command_name).observe(
+            event.duration_micros / 1e6
+        )
+        return collection, command
+
+    def succeeded(self, event) -> None:
+        collection, command = self._finish(event)
+        if event.duration_micros / 1e6 >= self.slow_threshold:
+            self._log_slow(event, collection, command)
+
+    def failed(self, event) -> None:
+        collection, command = self._finish(event)
+        COMMAND_ERRORS.labels(collection=collection, command=event.command_name).inc()
+        if event.duration_micros / 1e6 >= self.slow_threshold:
+            self._log_slow(event, collection, command)
+
+    def _log_slow(self, event, collection: str, command: Optional[dict]) -> None:
+        shape = command_shape(event.command_name, command) if command is not None else {}
+        entry = {
+            'at': datetime.now(timezone.utc).isoformat(),
+            'collection': collection,
+            'command': event.command_name,
+            'duration_ms': round(event.duration_micros / 1000, 1),
+            'shape': shape,
+        }
+        self.slow_queries.append(entry)
+        logger.warning(
+            f"Slow MongoDB {event.command_name} on {collection} took {entry['duration_ms']:.0f}ms: {shape}"
+        )
+
+
+class PoolMetricsListener(monitoring.ConnectionPoolListener):
+    """Checkout wait time, connection counts and saturation per server."""
+
+    def __init__(self, pool: str = 'main'):
+        self.pool = pool
+        self._lock = threading.Lock()
+        self._open: Dict[str, int] = {}
+        self._in_use: Dict[str, int] = {}
+        self._peak: Dict[str, int] = {}
+        self._waiting: Dict[str, int] = {}
+        self._max_size: Dict[str, int] = {}
+        # Checkouts happen on the thread running the operation, so a thread-local
+        # pairs each "check out started" with its "checked out"
+        self._local = threading.local()
+
+    @staticmethod
+    def _label(address) -> str:
+        return f"{address[0]}:{address[1]}" if isinstance(address, tuple) else str(address)
+
+    def _update(self, address, open_delta: int = 0, in_use_delta: int = 0, waiting_delta: int = 0) -> None:
+        label = self._label(address)
+        with self._lock:
+            open_count = self._open[label] = max(self._open.get(label, 0) + open_delta, 0)
+            in_use = self._in_use[label] = max(self._in_use.get(label, 0) + in_use_delta, 0)
+            peak = self._peak[label] = max(self._peak.get(label, 0), in_use)
+            waiting = self._waiting[label] = max(self._waiting.get(label, 0) + waiting_delta, 0)
+            max_size = self._max_size.get(label, DEFAULT_MAX_POOL_SIZE)
+        DB_CONNECTION_POOL_SIZE.labels(pool=self.pool, address=label).set(open_count)
+        POOL_IN_USE.labels(pool=self.pool, address=label).set(in_use)
+        POOL_AVAILABLE.labels(pool=self.pool, address=label).set(max(open_count - in_use, 0))
+        POOL_PEAK_IN_USE.labels(pool=self.pool, address=label).set(peak)
+        POOL_WAITING.labels(pool=self.pool, address=label).set(waiting)
+        POOL_SATURATION.labels(pool=self.pool, address=label).set(in_use / max_size if max_size else 0)
+
+    def pool_created(self, event) -> None:
+        label = self._label(event.address)
+        max_size = (getattr(event, 'options', None) or {}).get('maxPoolSize', DEFAULT_MAX_POOL_SIZE)
+        with self._lock:
+            self._max_size[label] = max_size
+        POOL_MAX_SIZE.labels(pool=self.pool, address=label).set(max_size)
+        self._update(event.address)
+
+    def pool_ready(self, event) -> None:
+        pass
+
+    def pool_cleared(self, event) -> None:
+        pass
+
+    def pool_closed(self, event) -> None:
+        pass
+
+    def connection_created(self, event) -> None:
+        self._update(event.address, open_delta=1)
+
+    def connection_ready(self, event) -> None:
+        pass
+
+    def connection_closed(self, event) -> None:
+        self._update(event.address, open_delta=-1)
+
+    def connection_check_out_started(self, event) -> None:
+        self._local.started = time.perf_counter()
+        self._update(event.address, waiting_delta=1)
+
+    def connection_check_out_failed(self, event) -> None:
+        self._local.started = None
+        POOL_CHECKOUT_FAILURES.labels(pool=self.pool, reason=str(event.reason)).inc()
+        self._update(event.address, waiting_delta=-1)
+
+    def connection_checked_out(self, event) -> None:
+        started = getattr(self._local, 'started', None)
+        if started is not None:
+            POOL_CHECKOUT_WAIT.labels(pool=self.pool).observe(time.perf_counter() - started)
+            self._local.started = None
+        self._update(event.address, in_use_delta=1, waiting_delta=-1)
+
+    def connection_checked_in(self, event) -> None:
+        self._update(event.address, in_use_delta=-1)
+
+    @property
+    def status(self) -> dict:
+        with self._lock:
+            return {
+                address: {
+                    'open': self._open.get(address, 0),
+                    'in_use': self._in_use.get(address, 0),
+                    'peak_in_use': self._peak.get(address, 0),
+                    'waiting': self._waiting.get(address, 0),
+                    'max_size': self._max_size.get(address, DEFAULT_MAX_POOL_SIZE),
+                }
+                for address in self._open
+            }
+
+
+command_listener = CommandMetricsListener(
+    slow_threshold=float(os.environ.get('MONGO_SLOW_QUERY_MS', '100')) / 1000,
+)
+pool_listener = PoolMetricsListener()
+analytics_pool_listener = PoolMetricsListener(pool='analytics')
+
+
+def event_listeners() -> list:
+    """Listeners to pass to the shared client's ``event_listeners``."""
+    return [command_listener, pool_listener]
@@ -0,0 +1,126 @@
+"""
+Admin-only runtime diagnostics for finding performance problems in production.
+"""
+
+import os
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+
+from admission import admission
+from auth import require_admin
+from database import analytics_pool_size, db, main_pool_settings
+from db_indexes import explain_report, index_manager
+from db_monitoring import analytics_pool_listener, command_listener, pool_listener
+from loop_monitor import loop_monitor
+from profiler import ProfilerBusy, profiler
+from tracing import tracer
+
+diagnostics_router = APIRouter()
+
+
+@diagnostics_router.get("/loop")
+async def get_loop_diagnostics(current_user: dict = Depends(require_admin)):
+    """Event-loop lag and the most recent slow callbacks with their stacks (Admin only)"""
+    return loop_monitor.status
+
+
+@diagnostics_router.get("/db")
+async def get_db_diagnostics(current_user: dict = Depends(require_admin)):
+    """Connection pool usage and recent slow MongoDB commands (filter shapes only) (Admin only)"""
+    return {
+        "pool": pool_listener.status,
+        "pool_settings": main_pool_settings(),
+        "analytics_pool": analytics_pool_listener.status,
+        "analytics_pool_size": analytics_pool_size(),
+        "slow_query_threshold_ms": command_listener.slow_threshold * 1000,
+        "slow_queries": list(command_listener.slow_queries),
+    }
+
+
+@diagnostics_router.get("/indexes")
+async def get_index_diagnostics(explain: bool = False, current_user: dict = Depends(require_admin)):
+    """
+    Index build status against the declarative spec; with ``explain=true``
+    also the winning plan of every route query shape, flagging COLLSCANs (Admin only)
+    """
+    result = index_manager.status
+    if explain:
+        report = await explain_report(db)
+        result["query_plans"] = report
+        result["collscans"] = [entry["route"] for entry in report if entry["collscan"]]
+    return result
+
+
+@diagnostics_router.get("/admission")
+async def get_admission_diagnostics(current_user: dict = Depends(require_admin)):
+    """In-flight and queued requests per route class, with their limits (Admin only)"""
+    return admission.status
+
+
+@diagnostics_router.get("/traces")
+async def list_traces(current_user: dict = Depends(require_admin)):
+    """Most recent sampled request traces, newest first (Admin only)"""
+    return {"sample_rate": tracer.sample_rate, "traces": tracer.summaries()}
+
+
+@diagnostics_router.get("/traces/{trace_id}")
+async def get_trace(trace_id: str, current_user: dict = Depends(require_admin)):
+    """All spans of one trace; the trace id is the request's X-Request-ID (Admin only)"""
+    trace = tracer.get(trace_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail="Trace not found")
+    return trace
+
+
+@diagnostics_router.get("/profile")
+async def get_profile_status(current_user: dict = Depends(require_admin)):
+    """The profiling session running in this worker, if any (Admin only)"""
+    return profiler.status
+
+
+@diagnostics_router.post("/profile/cpu", response_class=PlainTextResponse)
+async def run_cpu_profile(
+    seconds: float = Query(10, gt=0),
+    interval_ms: float = Query(10, ge=1, le=1000),
+    all_threads: bool = False,
+    current_user: dict = Depends(require_admin),
+):
+    """
+    Sample this worker's stacks for a bounded time and return collapsed stacks,
+    ready for flamegraph.pl or speedscope (Admin only)
+    """
+    try:
+        sampler = await profiler.cpu(seconds, interval=interval_ms / 1000, all_threads=all_threads)
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return PlainTextResponse(
+        sampler.collapsed(),
+        headers={
+            "Content-Disposition": f'attachment; filename="cpu-{os.getpid()}.collapsed"',
+            "X-Profile-Samples": str(sampler.samples),
+        },
+    )
+
+
+@diagnostics_router.post("/profile/memory")
+async def run_memory_profile(
+    seconds: float = Query(30, gt=0),
+    top: int = Query(25, ge=1, le=200),
+    frames: int = Query(10, ge=1, le=50),
+    current_user: dict = Depends(require_admin),
+):
+    """Allocation sites whose memory grew the most over a bounded window (Admin only)"""
+    try:
+        return await profiler.memory(seconds, top=top, frames=frames)
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+# Include router in main app
+def include_diagnostics_routes(app):
+    app.include_router(diagnostics_router, prefix="/api/admin/diagnostics", tags=["Diagnostics"])
@@ -0,0 +1,95 @@
+"""
+Health probes that are cheap enough for aggressive orchestrator polling.
+
+``/livez`` does no I/O at all. ``/readyz`` and ``/api/health`` share a
+``CachedProbe`` around the MongoDB ping: at most one ping per
+``HEALTH_DB_PING_TTL`` seconds per worker, however many probes arrive, and
+concurrent callers wait on the ping already in flight instead of starting
+their own. Failures are logged when the state changes, not on every probe.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Optional
+
+from database import get_database
+
+logger = logging.getLogger(__name__)
+
+
+class CachedProbe:
+    """Runs an async check at most once per ``ttl`` seconds and remembers the outcome."""
+
+    def __init__(
+        self,
+        name: str,
+        check: Callable[[], Awaitable[object]],
+        ttl: float = 5.0,
+        timeout: float = 2.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        Args:
+            name: Name used in logs
+            check: Coroutine function that raises when the dependency is unhealthy
+            ttl: Seconds a result is reused
+            timeout: Seconds after which the check counts as failed
+            clock: Monotonic time source (injectable for tests)
+        """
+        self.name = name
+        self._check = check
+        self.ttl = ttl
+        self.timeout = timeout
+        self._clock = clock
+        self._lock = asyncio.Lock()
+        self._checked: Optional[float] = None
+        self.last: Optional[dict] = None
+
+    def _fresh(self) -> bool:
+        return self._checked is not None and self._clock() - self._checked < self.ttl
+
+    async def result(self) -> dict:
+        """Cached outcome: ``{"healthy", "checked_at", "latency_ms", "error"}``."""
+        if self._fresh():
+            return self.last
+        async with self._lock:
+            # Another caller may have refreshed it while we waited
+            if self._fresh():
+                return self.last
+            started = time.perf_counter()
+            error = None
+            try:
+                await asyncio.wait_for(self._check(), self.timeout)
+            except asyncio.TimeoutError:
+                error = f"timed out after {self.timeout:g}s"
+            except Exception as e:
+                error = str(e) or type(e).__name__
+            was_healthy = self.last["healthy"] if self.last is not None else True
+            self.last = {
+                "healthy": error is None,
+                "checked_at": datetime.now(timezone.utc).isoformat(),
+                "latency_ms": round((time.perf_counter() - started) * 1000, 2),
+                "error": error,
+            }
+            self._checked = self._clock()
+            if error is not None and was_healthy:
+                logger.error(f"{self.name} health check failed: {error}")
+            elif error is None and not was_healthy:
+                logger.info(f"{self.name} health check recovered")
+            return self.last
+
+
+async def _ping_database():
+    await get_database().command('ping')
+
+
+# Shared MongoDB probe for this worker
+db_probe = CachedProbe(
+    "Database",
+    _ping_database,
+    ttl=float(os.environ.get('HEALTH_DB_PING_TTL', '5')),
+    timeout=float(os.environ.get('HEALTH_DB_PING_TIMEOUT', '2')),
+)
@@ -1,40 +1,35 @@
 import asyncio
-import os
-from motor.motor_asyncio import AsyncIOMotorClient
 from pathlib import Path
 from dotenv import load_dotenv
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-async def create_indexes():
-    """Create database indexes for optimal query performance."""
-    mongo_url = os.environ['MONGO_URL']
-    db_name = os.environ['DB_NAME']
+from database import close_client, get_database  # noqa: E402
+from db_indexes import IndexManager  # noqa: E402
 
-    client = AsyncIOMotorClient(mongo_url)
-    db = client[db_name]
 
+async def create_indexes():
+    """
+    Build every index in db_indexes.INDEXES that doesn't exist yet and wait
+    for the builds (the server builds them in the background instead).
+    """
+    manager = IndexManager()
+    await manager.sync(get_database())
+    status = manager.status
+    if status['state'] == 'error' or status['failed']:
+        raise RuntimeError(f"Index build incomplete: {status['failed'] or status['state']}")
+    print(f"Database indexes up to date ({len(status['built'])} built)")
+    for entry in status['conflicting']:
+        print(f"Index {entry['collection']}.{entry['name']} differs from the spec: {entry}")
+
+
+async def _main():
     try:
-        # Users collection indexes
-        await db.users.create_index("username", unique=True, name="username_unique")
-
-        # Incident reports collection indexes
-        await db.incident_reports.create_index("id", unique=True, name="incident_id_unique")
-        await db.incident_reports.create_index("status", name="status_index")
-        await db.incident_reports.create_index("priority", name="priority_index")
-        await db.incident_reports.create_index("fullName", name="fullName_index")
-        await db.incident_reports.create_index("created_at", name="created_at_index")
-        # Compound index for status and priority filtering
-        await db.incident_reports.create_index([("status", 1), ("priority", 1)], name="status_priority_compound")
-
-        print("Database indexes created successfully")
-
-    except Exception as e:
-        print(f"Error creating indexes: {e}")
-        raise
+        await create_indexes()
     finally:
-        client.close()
+        await close_client()
+
 
 if __name__ == "__main__":
-    asyncio.run(create_indexes())
\ No newline at end of file
+    asyncio.run(_main())
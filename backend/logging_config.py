@@ -5,20 +5,35 @@ Includes structured logging, request/response logging, error tracking, and perfo
 
 import time
 import logging
-from typing import Callable
+import uuid
 from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import Optional
 
-from fastapi import Request, Response
-from starlette.middleware.base import BaseHTTPMiddleware
 from loguru import logger
-from prometheus_client import Counter, Histogram, Gauge, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client import Counter, Histogram, Gauge, generate_latest, CONTENT_TYPE_LATEST, REGISTRY
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily, HistogramMetricFamily
 import sentry_sdk
 from sentry_sdk.integrations.fastapi import FastApiIntegration
 from sentry_sdk.integrations.logging import LoggingIntegration
 import psutil
 import os
-
-# Prometheus metrics
+import sys
+
+from access_log import AccessLog, access_log as default_access_log
+# DB_CONNECTION_POOL_SIZE is set by the pool listener registered on the shared client
+from db_monitoring import DB_CONNECTION_POOL_SIZE  # noqa: F401
+from loop_monitor import track_request
+from sentry_sampling import traces_sampler
+from tracing import tracer
+from cache import LOAD_TIME_BUCKETS, short_cache, medium_cache, long_cache
+
+# Endpoint label for requests that matched no route (404s, scanners); keeps
+# the label set bounded no matter which paths clients make up
+UNMATCHED_ENDPOINT = '<unmatched>'
+_KNOWN_METHODS = frozenset({'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'})
+
+# Prometheus metrics, labelled by route template (e.g. /api/typhoons/{typhoon_id})
 REQUEST_COUNT = Counter(
     'http_requests_total',
     'Total number of HTTP requests',
@@ -33,7 +48,7 @@ REQUEST_LATENCY = Histogram(
 
 ACTIVE_CONNECTIONS = Gauge(
     'active_connections',
-    'Number of active connections'
+    'Number of HTTP requests currently being processed'
 )
 
 SYSTEM_CPU_USAGE = Gauge(
@@ -46,141 +61,247 @@ SYSTEM_MEMORY_USAGE = Gauge(
     'Current system memory usage percentage'
 )
 
-DB_CONNECTION_POOL_SIZE = Gauge(
-    'db_connection_pool_size',
-    'Database connection pool size'
-)
 
+class CacheMetricsCollector:
+    """
+    Exports APICache counters at scrape time.
 
-class RequestLoggingMiddleware(BaseHTTPMiddleware):
-    """Middleware for logging all requests and responses with structured data."""
-
-    async def dispatch(self, request: Request, call_next: Callable) -> Response:
-        start_time = time.time()
-
-        # Extract request information
-        request_id = request.headers.get('X-Request-ID', 'unknown')
-        user_agent = request.headers.get('User-Agent', 'unknown')
-        client_ip = request.client.host if request.client else 'unknown'
-
-        # Log incoming request
-        logger.info(
-            "Incoming request",
-            extra={
-                "request_id": request_id,
-                "method": request.method,
-                "url": str(request.url),
-                "headers": dict(request.headers),
-                "client_ip": client_ip,
-                "user_agent": user_agent,
-            }
-        )
+    The caches keep plain integer counters on the request path; this collector
+    turns them into per-cache, per-prefix Prometheus series when /metrics is read.
+    """
 
-        try:
-            # Process the request
-            response = await call_next(request)
-
-            # Calculate processing time
-            process_time = time.time() - start_time
-
-            # Update Prometheus metrics
-            REQUEST_COUNT.labels(
-                method=request.method,
-                endpoint=request.url.path,
-                status_code=response.status_code
-            ).inc()
-
-            REQUEST_LATENCY.labels(
-                method=request.method,
-                endpoint=request.url.path
-            ).observe(process_time)
-
-            # Log response
-            logger.info(
-                "Request completed",
-                extra={
-                    "request_id": request_id,
-                    "method": request.method,
-                    "url": str(request.url),
-                    "status_code": response.status_code,
-                    "process_time": f"{process_time:.4f}s",
-                    "response_headers": dict(response.headers),
-                }
-            )
-
-            # Add custom headers to response
-            response.headers["X-Process-Time"] = f"{process_time:.4f}"
-            response.headers["X-Request-ID"] = request_id
-
-            return response
+    def __init__(self, caches):
+        self._caches = caches
 
+    def collect(self):
+        lookups = CounterMetricFamily(
+            'api_cache_lookups', 'Cache lookups by result', labels=['cache', 'prefix', 'result']
+        )
+        l2_hits = CounterMetricFamily(
+            'api_cache_l2_hits', 'L1 misses served from the shared L2 tier', labels=['cache', 'prefix']
+        )
+        removals = CounterMetricFamily(
+            'api_cache_removals', 'Entries removed by the cache', labels=['cache', 'prefix', 'reason']
+        )
+        coalesced = CounterMetricFamily(
+            'api_cache_coalesced', 'Misses that waited on a load already in flight', labels=['cache', 'prefix']
+        )
+        load_time = HistogramMetricFamily(
+            'api_cache_load_duration_seconds', 'Latency of cache loaders', labels=['cache', 'prefix']
+        )
+        entries = GaugeMetricFamily('api_cache_entries', 'Entries held by the cache', labels=['cache'])
+        size_bytes = GaugeMetricFamily('api_cache_bytes', 'Estimated bytes held by the cache', labels=['cache'])
+
+        for cache in self._caches:
+            entries.add_metric([cache.name], len(cache._cache))
+            size_bytes.add_metric([cache.name], cache._cache.currsize)
+            for prefix, stats in list(cache.metrics.items()):
+                labels = [cache.name, prefix]
+                lookups.add_metric(labels + ['hit'], stats.hits)
+                lookups.add_metric(labels + ['stale'], stats.stale_hits)
+                lookups.add_metric(labels + ['negative'], stats.negative_hits)
+                lookups.add_metric(labels + ['miss'], stats.misses)
+                l2_hits.add_metric(labels, stats.l2_hits)
+                removals.add_metric(labels + ['eviction'], stats.evictions)
+                removals.add_metric(labels + ['expiration'], stats.expirations)
+                coalesced.add_metric(labels, stats.coalesced)
+
+                buckets, cumulative = [], 0
+                for bound, count in zip(LOAD_TIME_BUCKETS + (float('inf'),), stats.load_buckets):
+                    cumulative += count
+                    buckets.append(('+Inf' if bound == float('inf') else str(bound), cumulative))
+                load_time.add_metric(labels, buckets, sum_value=stats.load_sum)
+
+        yield from (lookups, l2_hits, removals, coalesced, load_time, entries, size_bytes)
+
+
+REGISTRY.register(CacheMetricsCollector((short_cache, medium_cache, long_cache)))
+
+
+def _endpoint_label(scope) -> str:
+    """Route template matched by the router, or UNMATCHED_ENDPOINT."""
+    route = scope.get('route')
+    return getattr(route, 'path', None) or UNMATCHED_ENDPOINT
+
+
+def _header(scope, name: bytes) -> Optional[str]:
+    for key, value in scope.get('headers', ()):
+        if key == name:
+            return value.decode('latin-1')
+    return None
+
+
+class InstrumentationMiddleware:
+    """
+    Pure ASGI middleware for access logging and Prometheus metrics.
+
+    Unlike BaseHTTPMiddleware it doesn't wrap the request in an extra task and
+    memory stream: it only watches the ``http.response.start`` message going
+    out, so streaming bodies pass through untouched.
+
+    Metrics are labelled with the route template the router stored in the
+    scope, never the raw path, so per-ID URLs don't each create a series.
+
+    Each request produces at most one access log record, handed to the
+    queued, sampled AccessLog (see access_log) once the response is done.
+    """
+
+    def __init__(self, app, access_log: Optional[AccessLog] = None):
+        self.app = app
+        self.access_log = access_log or default_access_log
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        start_time = time.perf_counter()
+        method = scope['method'] if scope['method'] in _KNOWN_METHODS else 'OTHER'
+        path = scope['path']
+        # Also the trace id, so a slow response can be found by the id the client saw
+        request_id = _header(scope, b'x-request-id') or uuid.uuid4().hex
+        status_code = 500
+        response_bytes = 0
+        track_request(scope)
+
+        async def send_wrapper(message):
+            nonlocal status_code, response_bytes
+            if message['type'] == 'http.response.body':
+                response_bytes += len(message.get('body', b''))
+            elif message['type'] == 'http.response.start':
+                status_code = message['status']
+                process_time = time.perf_counter() - start_time
+                message['headers'] = [
+                    *message.get('headers', ()),
+                    (b'x-process-time', f"{process_time:.4f}".encode()),
+                    (b'x-request-id', request_id.encode('latin-1')),
+                ]
+            await send(message)
+
+        root_span = tracer.start_trace(f"{scope['method']} {path}", request_id)
+        ACTIVE_CONNECTIONS.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
         except Exception as e:
-            # Calculate processing time for errors
-            process_time = time.time() - start_time
-
-            # Log error
+            process_time = time.perf_counter() - start_time
             logger.error(
                 "Request failed",
                 extra={
                     "request_id": request_id,
-                    "method": request.method,
-                    "url": str(request.url),
+                    "method": method,
+                    "url": path,
                     "process_time": f"{process_time:.4f}s",
                     "error": str(e),
                     "error_type": type(e).__name__,
                 }
             )
-
-            # Update error metrics
-            REQUEST_COUNT.labels(
-                method=request.method,
-                endpoint=request.url.path,
-                status_code=500
-            ).inc()
-
-            REQUEST_LATENCY.labels(
-                method=request.method,
-                endpoint=request.url.path
-            ).observe(process_time)
-
-            # Re-raise the exception
+            endpoint = _endpoint_label(scope)
+            REQUEST_COUNT.labels(method=method, endpoint=endpoint, status_code=500).inc()
+            REQUEST_LATENCY.labels(method=method, endpoint=endpoint).observe(process_time)
+            traces_sampler.observe(method, endpoint, 500, process_time)
+            self._log_access(scope, request_id, endpoint, 500, process_time, response_bytes, e)
             raise
+        finally:
+            ACTIVE_CONNECTIONS.dec()
+            if root_span is not None:
+                root_span.name = f"{scope['method']} {_endpoint_label(scope)}"
+                tracer.end_trace(root_span, status_code=status_code, path=path)
+
+        # Measured once the whole body has been sent (includes streaming time)
+        process_time = time.perf_counter() - start_time
+        endpoint = _endpoint_label(scope)
+        REQUEST_COUNT.labels(method=method, endpoint=endpoint, status_code=status_code).inc()
+        REQUEST_LATENCY.labels(method=method, endpoint=endpoint).observe(process_time)
+        traces_sampler.observe(method, endpoint, status_code, process_time)
+
+        if self.access_log.should_log(status_code, process_time):
+            self._log_access(scope, request_id, endpoint, status_code, process_time, response_bytes)
+
+    def _log_access(self, scope, request_id, endpoint, status_code, process_time, response_bytes, error=None):
+        record = {
+            "ts": self.access_log.timestamp(),
+            "request_id": request_id,
+            "method": scope['method'],
+            "path": scope['path'],
+            "route": endpoint,
+            "status": status_code,
+            "duration_ms": round(process_time * 1000, 2),
+            "bytes": response_bytes,
+            "client_ip": scope['client'][0] if scope.get('client') else None,
+            "headers": self.access_log.request_headers(scope),
+        }
+        if scope.get('query_string'):
+            record["query"] = scope['query_string'].decode('latin-1')
+        if error is not None:
+            record["error"] = f"{type(error).__name__}: {error}"
+        self.access_log.log(record)
+
+
+_system_monitoring_started = False
+
+# Latest system sample taken by the monitoring thread; served by /api/health
+# so health checks never call psutil themselves
+_system_snapshot = {
+    "cpu_percent": None,
+    "memory_percent": None,
+    "disk_usage": None,
+    "updated_at": None,
+}
+
+
+def system_snapshot() -> dict:
+    """Most recent CPU, memory and disk sample (values are None until the first one)."""
+    return dict(_system_snapshot)
+
+
+def start_system_monitoring():
+    """Start the background thread that samples CPU, memory and disk usage (once per process)."""
+    global _system_monitoring_started
+    if _system_monitoring_started:
+        return
+    _system_monitoring_started = True
+
+    import threading
+
+    interval = float(os.environ.get('SYSTEM_METRICS_INTERVAL', '30'))
+
+    def collect_system_metrics():
+        while True:
+            try:
+                # Update system metrics
+                cpu = psutil.cpu_percent(interval=1)
+                memory = psutil.virtual_memory().percent
+                SYSTEM_CPU_USAGE.set(cpu)
+                SYSTEM_MEMORY_USAGE.set(memory)
+                _system_snapshot.update(
+                    cpu_percent=cpu,
+                    memory_percent=memory,
+                    disk_usage=psutil.disk_usage('/').percent,
+                    updated_at=datetime.now(timezone.utc).isoformat(),
+                )
+
+                # Sleep before next collection
+                time.sleep(interval)
+            except Exception as e:
+                logger.error(f"Failed to collect system metrics: {e}")
+                time.sleep(interval)
+
+    # Start system monitoring in a background thread
+    monitoring_thread = threading.Thread(target=collect_system_metrics, daemon=True)
+    monitoring_thread.start()
 
 
-class PerformanceMonitoringMiddleware(BaseHTTPMiddleware):
-    """Middleware for performance monitoring and system metrics."""
-
-    def __init__(self, app):
-        super().__init__(app)
-        self._setup_system_monitoring()
-
-    def _setup_system_monitoring(self):
-        """Set up periodic system metrics collection."""
-        import threading
-
-        def collect_system_metrics():
-            while True:
-                try:
-                    # Update system metrics
-                    SYSTEM_CPU_USAGE.set(psutil.cpu_percent(interval=1))
-                    SYSTEM_MEMORY_USAGE.set(psutil.virtual_memory().percent)
-
-                    # Sleep for 30 seconds before next collection
-                    time.sleep(30)
-                except Exception as e:
-                    logger.error(f"Failed to collect system metrics: {e}")
-
-        # Start system monitoring in a background thread
-        monitoring_thread = threading.Thread(target=collect_system_metrics, daemon=True)
-        monitoring_thread.start()
-    
-    async def dispatch(self, request: Request, call_next: Callable) -> Response:
-        """Process the request and return response."""
-        return await call_next(request)
+def setup_logging():
+    """
+    Configure structured logging with loguru.
 
+    Both sinks are enqueued, so formatting and I/O happen on loguru's writer
+    thread rather than the event loop. Per-request access logs go through
+    access_log instead. Set LOG_DIAGNOSE=true to include variable values in
+    tracebacks (slow, and may leak secrets; development only).
+    """
+    diagnose = os.environ.get('LOG_DIAGNOSE', 'false').lower() == 'true'
 
-def setup_logging():
-    """Configure structured logging with loguru."""
     # Remove default logger
     logging.getLogger().handlers.clear()
 
@@ -189,7 +310,7 @@ def setup_logging():
 
     # Add console handler with structured format
     logger.add(
-        lambda msg: print(msg, end=""),
+        sys.stderr,
         format=(
             "<green>{time:YYYY-MM-DD HH:mm:ss.SSS}</green> | "
             "<level>{level: <8}</level> | "
@@ -199,8 +320,9 @@ def setup_logging():
         ),
         level="INFO",
         serialize=False,  # Set to True for JSON output in production
+        enqueue=True,
         backtrace=True,
-        diagnose=True
+        diagnose=diagnose
     )
 
     # Add file handler for persistent logging
@@ -214,8 +336,9 @@ def setup_logging():
             "{name}:{function}:{line} | {message} | {extra}"
         ),
         serialize=True,  # JSON format for file logs
+        enqueue=True,
         backtrace=True,
-        diagnose=True
+        diagnose=diagnose
     )
 
     # Intercept standard library logging
@@ -256,12 +379,11 @@ def setup_sentry():
                     event_level=logging.ERROR  # Send errors as events
                 ),
             ],
-            # Set traces_sample_rate to 1.0 to capture 100%
-            # of transactions for performance monitoring
-            traces_sample_rate=1.0,
-            # Set profiles_sample_rate to 1.0 to profile 100%
-            # of sampled transactions
-            profiles_sample_rate=1.0,
+            # Errors are always sent; transactions are sampled adaptively to
+            # hold a per-worker budget (see sentry_sampling)
+            traces_sampler=traces_sampler,
+            # Fraction of sampled transactions that are also profiled
+            profiles_sample_rate=float(os.environ.get('SENTRY_PROFILES_SAMPLE_RATE', '0.1')),
             environment=os.environ.get('ENVIRONMENT', 'development'),
             release=os.environ.get('RELEASE_VERSION', '1.0.0'),
         )
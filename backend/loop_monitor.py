@@ -0,0 +1,204 @@
+"""
+Event-loop lag sampling and blocking-call detection.
+
+``LoopMonitor`` runs a small task on the event loop that sleeps for a fixed
+interval and records how late it woke up as ``event_loop_lag_seconds``. Any
+synchronous work on the loop (a blocking HTTP client, bcrypt, a sync SDK call)
+shows up as lag.
+
+The opt-in slow-callback detector (``LOOP_SLOW_CALLBACK_MS``) adds a watchdog
+thread. When the loop hasn't ticked for longer than the threshold, the
+watchdog captures the loop thread's current stack — i.e. the code that is
+blocking, while it is still blocking — together with the route of the request
+being served. Once the loop recovers, the total stall is logged and kept in a
+ring buffer served by the admin diagnostics endpoint. Unlike asyncio debug
+mode this costs nothing per callback, so it is safe to leave on in production.
+"""
+
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+import weakref
+from collections import deque
+from datetime import datetime, timezone
+from typing import Optional
+
+from prometheus_client import Counter, Histogram
+
+logger = logging.getLogger(__name__)
+
+LOOP_LAG = Histogram(
+    'event_loop_lag_seconds',
+    'How late the event loop ran a timer scheduled for a fixed interval',
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+
+SLOW_CALLBACKS = Counter(
+    'event_loop_slow_callbacks_total',
+    'Callbacks that held the event loop longer than the slow-callback threshold',
+    ['route'],
+)
+
+# Frames kept per captured stack (innermost last)
+STACK_DEPTH = 25
+
+# Request scopes of tasks currently serving HTTP requests, for attributing stalls
+_request_scopes: "weakref.WeakKeyDictionary[asyncio.Task, dict]" = weakref.WeakKeyDictionary()
+
+
+def _route_of(scope: Optional[dict]) -> str:
+    """Route template of a request scope; bounded like the request metrics' endpoint label."""
+    if scope is None:
+        return '-'
+    return getattr(scope.get('route'), 'path', None) or '<unmatched>'
+
+
+class LoopMonitor:
+    """Lag sampler plus optional watchdog for one event loop."""
+
+    def __init__(
+        self,
+        interval: float = 0.5,
+        slow_callback_threshold: Optional[float] = None,
+        history: int = 50,
+    ):
+        """
+        Args:
+            interval: Seconds between lag samples
+            slow_callback_threshold: Seconds the loop may be held before the
+                watchdog captures a stack; None disables the detector
+            history: Number of slow callbacks kept for the admin endpoint
+        """
+        self.interval = interval
+        self.threshold = slow_callback_threshold
+        self.slow_callbacks: deque = deque(maxlen=history)
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        # Monotonic time the loop last ticked; written by the loop, read by the watchdog
+        self._heartbeat = time.monotonic()
+        # Stall captured by the watchdog, completed by the loop once it recovers
+        self._pending: Optional[dict] = None
+
+    @property
+    def detector_enabled(self) -> bool:
+        return self.threshold is not None
+
+    def _tick_interval(self) -> float:
+        # The watchdog needs heartbeats well inside the threshold
+        if self.threshold is None:
+            return self.interval
+        return min(self.interval, self.threshold / 2)
+
+    def start(self) -> None:
+        if self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._task = self._loop.create_task(self._sample())
+        if self.detector_enabled:
+            self._stopping.clear()
+            self._watchdog = threading.Thread(target=self._watch, name='loop-watchdog', daemon=True)
+            self._watchdog.start()
+            logger.info(f"Slow-callback detector enabled (threshold {self.threshold * 1000:.0f}ms)")
+
+    async def stop(self) -> None:
+        self._stopping.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._watchdog = None
+
+    async def _sample(self) -> None:
+        tick = self._tick_interval()
+        loop = asyncio.get_running_loop()
+        while True:
+            scheduled = loop.time()
+            await asyncio.sleep(tick)
+            lag = max(loop.time() - scheduled - tick, 0.0)
+            self._heartbeat = time.monotonic()
+            self.last_lag = lag
+            self.max_lag = max(self.max_lag, lag)
+            LOOP_LAG.observe(lag)
+            if self._pending is not None:
+                self._finish_stall(lag)
+
+    def _watch(self) -> None:
+        """Watchdog thread: capture the loop's stack while it is stalled."""
+        threshold = self.threshold
+        tick = self._tick_interval()
+        check_every = max(threshold / 4, 0.001)
+        captured_for = None
+        while not self._stopping.wait(check_every):
+            heartbeat = self._heartbeat
+            blocked_for = time.monotonic() - heartbeat - tick
+            if blocked_for < threshold or captured_for == heartbeat:
+                continue
+            captured_for = heartbeat
+            self._pending = self._capture(blocked_for)
+
+    def _capture(self, blocked_for: float) -> dict:
+        frame = sys._current_frames().get(self._loop_thread_id)
+        stack = traceback.format_stack(frame, limit=STACK_DEPTH) if frame is not None else []
+        task = asyncio.current_task(self._loop) if self._loop is not None else None
+        return {
+            'detected_at': datetime.now(timezone.utc).isoformat(),
+            'route': _route_of(_request_scopes.get(task)) if task is not None else '-',
+            'task': task.get_name() if task is not None else None,
+            'blocked_ms': round(blocked_for * 1000, 1),
+            'stack': [line.rstrip() for line in stack],
+        }
+
+    def _finish_stall(self, lag: float) -> None:
+        stall, self._pending = self._pending, None
+        stall['blocked_ms'] = round(max(lag, stall['blocked_ms'] / 1000) * 1000, 1)
+        self.slow_callbacks.append(stall)
+        SLOW_CALLBACKS.labels(route=stall['route']).inc()
+        innermost = stall['stack'][-1].strip().splitlines()[0] if stall['stack'] else 'unknown'
+        logger.warning(
+            f"Event loop blocked for {stall['blocked_ms']:.0f}ms in {stall['route']} at {innermost}"
+        )
+
+    @property
+    def status(self) -> dict:
+        return {
+            'running': self._task is not None,
+            'interval_seconds': self._tick_interval(),
+            'last_lag_ms': round(self.last_lag * 1000, 2),
+            'max_lag_ms': round(self.max_lag * 1000, 2),
+            'slow_callback_threshold_ms': self.threshold * 1000 if self.threshold is not None else None,
+            'slow_callbacks': list(self.slow_callbacks),
+        }
+
+
+def track_request(scope: dict) -> None:
+    """Associate the current task with an HTTP scope so stalls can name the route."""
+    if loop_monitor.detector_enabled:
+        task = asyncio.current_task()
+        if task is not None:
+            _request_scopes[task] = scope
+
+
+def _from_env() -> LoopMonitor:
+    threshold_ms = os.environ.get('LOOP_SLOW_CALLBACK_MS')
+    return LoopMonitor(
+        interval=float(os.environ.get('LOOP_LAG_INTERVAL', '0.5')),
+        slow_callback_threshold=float(threshold_ms) / 1000 if threshold_ms else None,
+    )
+
+
+# Shared monitor for this worker
+loop_monitor = _from_env()
@@ -0,0 +1,158 @@
+"""
+Online migration of ISO-8601 timestamp strings to BSON dates.
+
+Documents written before timestamps were stored as dates still hold strings
+in ``created_at``/``updated_at``/``timestamp``. This converts them in batches
+while the API keeps serving (readers accept both formats, see timestamps):
+
+  * each batch selects documents with a string in one of the fields, in
+    ``_id`` order after the last one handled, and converts them with an
+    unordered ``bulk_write``;
+  * every update is filtered on the original string, so a document the API
+    rewrote in the meantime is left alone;
+  * progress is checkpointed in the ``migrations`` collection after every
+    batch, so an interrupted run resumes where it stopped, while a run after
+    a finished one scans from the start again;
+  * values that do not parse are left as they are and counted.
+
+Usage: ``python migrate_dates.py [--dry-run] [--batch-size N] [--pause SECONDS] [collection ...]``
+"""
+
+import argparse
+import asyncio
+import logging
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Tuple
+
+from dotenv import load_dotenv
+from pymongo import UpdateOne
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+from database import close_client, get_database  # noqa: E402
+from timestamps import as_datetime  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+# Timestamp fields of every collection the API writes
+DATE_FIELDS: Dict[str, Tuple[str, ...]] = {
+    'users': ('created_at',),
+    'incident_reports': ('created_at', 'updated_at'),
+    'typhoons': ('created_at', 'updated_at'),
+    'analytics_events': ('timestamp',),
+    'push_subscriptions': ('created_at',),
+    'notification_logs': ('timestamp',),
+    'status_checks': ('timestamp',),
+}
+
+CHECKPOINTS = 'migrations'
+
+
+def _checkpoint_id(collection: str) -> str:
+    return f"bson_dates:{collection}"
+
+
+async def migrate_collection(db, collection: str, fields: Tuple[str, ...], batch_size: int = 500,
+                             pause: float = 0.0, dry_run: bool = False) -> dict:
+    """
+    Convert the string timestamps of one collection, resuming from its checkpoint.
+
+    Returns ``{"collection", "scanned", "converted", "unparseable"}``
+    for this run. A dry run reads and counts but writes nothing, checkpoints
+    included.
+    """
+    checkpoints = db[CHECKPOINTS]
+    checkpoint = await checkpoints.find_one({'_id': _checkpoint_id(collection)}) or {}
+    # An interrupted pass resumes after its last batch; a finished one starts a new pass from the
+    # beginning, since old workers mid-deploy may have written strings into any document
+    last_id = None if checkpoint.get('done') else checkpoint.get('last_id')
+    stats = {'collection': collection, 'scanned': 0, 'converted': 0, 'unparseable': 0}
+
+    string_fields = {'$or': [{field: {'$type': 'string'}} for field in fields]}
+    while True:
+        query = string_fields if last_id is None else {'$and': [string_fields, {'_id': {'$gt': last_id}}]}
+        batch = await db[collection].find(query, {field: 1 for field in fields}) \
+            .sort('_id', 1).limit(batch_size).to_list(batch_size)
+        if not batch:
+            break
+
+        updates = []
+        for doc in batch:
+            for field in fields:
+                value = doc.get(field)
+                if not isinstance(value, str):
+                    continue
+                parsed = as_datetime(value)
+                if parsed is None:
+                    stats['unparseable'] += 1
+                    continue
+                updates.append(UpdateOne({'_id': doc['_id'], field: value}, {'$set': {field: parsed}}))
+        stats['scanned'] += len(batch)
+        last_id = batch[-1]['_id']
+
+        if dry_run:
+            stats['converted'] += len(updates)
+        else:
+            converted = 0
+            if updates:
+                converted = (await db[collection].bulk_write(updates, ordered=False)).modified_count
+            stats['converted'] += converted
+            await checkpoints.update_one(
+                {'_id': _checkpoint_id(collection)},
+                {'$set': {'last_id': last_id, 'done': False, 'updated_at': datetime.now(timezone.utc)},
+                 '$inc': {'converted': converted}},
+                upsert=True,
+            )
+        if len(batch) < batch_size:
+            break
+        if pause:
+            await asyncio.sleep(pause)
+
+    if not dry_run:
+        await checkpoints.update_one(
+            {'_id': _checkpoint_id(collection)},
+            {'$set': {'done': True, 'finished_at': datetime.now(timezone.utc)}},
+            upsert=True,
+        )
+    logger.info(
+        f"{collection}: scanned {stats['scanned']}, converted {stats['converted']}, "
+        f"unparseable {stats['unparseable']}{' (dry run)' if dry_run else ''}"
+    )
+    return stats
+
+
+async def migrate(db, collections=None, batch_size: int = 500, pause: float = 0.0, dry_run: bool = False):
+    """Migrate every collection in DATE_FIELDS (or the named ones), one after another."""
+    results = []
+    for collection in collections or DATE_FIELDS:
+        results.append(await migrate_collection(
+            db, collection, DATE_FIELDS[collection], batch_size=batch_size, pause=pause, dry_run=dry_run,
+        ))
+    return results
+
+
+async def _main(args):
+    try:
+        for stats in await migrate(get_database(), args.collections, args.batch_size, args.pause, args.dry_run):
+            print(
+                f"{stats['collection']}: converted {stats['converted']} of {stats['scanned']} scanned, "
+                f"{stats['unparseable']} unparseable"
+            )
+    finally:
+        await close_client()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert ISO-string timestamps to BSON dates")
+    parser.add_argument('collections', nargs='*', metavar='collection', help=f"any of {', '.join(DATE_FIELDS)}")
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--pause', type=float, default=0.0, help="seconds to sleep between batches")
+    parser.add_argument('--dry-run', action='store_true')
+    args = parser.parse_args()
+    unknown = set(args.collections) - set(DATE_FIELDS)
+    if unknown:
+        parser.error(f"unknown collection(s): {', '.join(sorted(unknown))}")
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main(args))
@@ -0,0 +1,93 @@
+"""
+Keyset (cursor) pagination for listings ordered newest first.
+
+``skip``/``limit`` makes the server walk and discard every earlier document,
+so page N costs O(N). A keyset page instead starts from the last
+``(created_at, id)`` the client saw:
+
+    {"$or": [{"created_at": {"$lt": t}}, {"created_at": t, "id": {"$lt": id}}]}
+
+With a compound index ending in ``created_at: -1, id: -1`` (after any
+equality-filtered fields such as ``status``), every page is an index seek plus
+``limit`` keys, however deep it is.
+
+The cursor is opaque to clients: URL-safe base64 of the last document's sort
+key. While ISO-string timestamps are still being migrated (see timestamps),
+BSON orders strings after dates when sorting descending, so a cursor on a date
+also admits every string, and a cursor on a string compares as a string.
+"""
+
+import base64
+import json
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+import timestamps
+from timestamps import as_datetime
+
+SORT_FIELD = 'created_at'
+TIE_BREAKER = 'id'
+
+
+class InvalidCursor(ValueError):
+    """The cursor was not produced by encode_cursor."""
+
+
+def encode_cursor(doc: dict, field: str = SORT_FIELD) -> str:
+    """Opaque cursor pointing just after ``doc`` in (field desc, id desc) order."""
+    value = doc.get(field)
+    if isinstance(value, datetime):
+        key = {'t': as_datetime(value).isoformat(), 'id': doc[TIE_BREAKER]}
+    else:
+        key = {'s': value, 'id': doc[TIE_BREAKER]}
+    raw = json.dumps(key, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[object, str]:
+    """``(sort value, id)`` from a cursor; raises InvalidCursor if it is malformed."""
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        if 't' in key:
+            value = datetime.fromisoformat(key['t'])
+        else:
+            value = key['s']
+        tie = key['id']
+    except (ValueError, TypeError, KeyError) as e:
+        raise InvalidCursor(f"Invalid cursor: {cursor!r}") from e
+    if not isinstance(tie, str) or not isinstance(value, (datetime, str)):
+        raise InvalidCursor(f"Invalid cursor: {cursor!r}")
+    return value, tie
+
+
+def after_cursor(cursor: str, field: str = SORT_FIELD) -> dict:
+    """Filter for the documents that come after ``cursor`` in (field desc, id desc) order."""
+    value, tie = decode_cursor(cursor)
+    branches = [
+        {field: {'$lt': value}},
+        {field: value, TIE_BREAKER: {'$lt': tie}},
+    ]
+    if isinstance(value, datetime) and timestamps.LEGACY_STRINGS:
+        # Unmigrated string timestamps sort after every date
+        branches.append({field: {'$type': 'string'}})
+    return {'$or': branches}
+
+
+async def keyset_page(collection, query: dict, limit: int, cursor: Optional[str] = None,
+                      field: str = SORT_FIELD) -> Tuple[List[dict], Optional[str]]:
+    """
+    One page of ``query`` newest first, and the cursor of the next page.
+
+    ``cursor`` is None (or empty) for the first page. The next cursor is None
+    once there is nothing after this page; one extra document is fetched to
+    tell.
+    """
+    if cursor:
+        # Equality filters stay top-level so they lead the index bounds of every $or branch
+        query = {**query, **after_cursor(cursor, field)}
+    docs = await collection.find(query, {'_id': 0}) \
+        .sort([(field, -1), (TIE_BREAKER, -1)]).limit(limit + 1).to_list(limit + 1)
+    if len(docs) <= limit:
+        return docs, None
+    docs = docs[:limit]
+    return docs, encode_cursor(docs[-1], field)
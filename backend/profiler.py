@@ -0,0 +1,182 @@
+"""
+On-demand profiling of a live worker, for environments where no external
+profiler can be attached.
+
+Two kinds of session, started from the admin diagnostics endpoints:
+
+  * CPU: a background thread samples the Python stack of the event-loop
+    thread (or of every thread) at a fixed interval and returns the result
+    in collapsed-stack format (``frame;frame;frame count`` per line), which
+    flamegraph.pl, speedscope and inferno read directly.
+  * Memory: tracemalloc snapshots taken at the start and end of the window,
+    returned as the allocation sites that grew the most, to chase leaks such
+    as a cache or registry that keeps growing under traffic.
+
+Only one session runs at a time per worker and every session is bounded by
+``PROFILE_MAX_SECONDS``, so a forgotten request cannot leave a profiler
+running under production traffic. Sessions profile the worker that serves
+the request; the response names its pid.
+"""
+
+import asyncio
+import logging
+import os
+import sys
+import threading
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Frames kept per sampled stack (outermost frames are dropped beyond this)
+MAX_STACK_DEPTH = 128
+
+
+class ProfilerBusy(RuntimeError):
+    """Raised when a session is requested while another one is running."""
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    parts = code.co_filename.replace('\\', '/').rsplit('/', 2)
+    return f"{code.co_name} ({'/'.join(parts[-2:])}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """Thread that counts collapsed stacks of one thread (or all threads)."""
+
+    def __init__(self, interval: float = 0.01, thread_id: Optional[int] = None):
+        """
+        Args:
+            interval: Seconds between samples
+            thread_id: Thread to sample; None samples every thread but the sampler
+        """
+        self.interval = interval
+        self.thread_id = thread_id
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while not self._stopping.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own or (self.thread_id is not None and ident != self.thread_id):
+                    continue
+                stack = []
+                while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                if self.thread_id is None:
+                    stack.append(f"thread:{names.get(ident, ident)}")
+                self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    def collapsed(self) -> str:
+        """Samples in collapsed-stack format, hottest stack first."""
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class Profiler:
+    """Runs at most one bounded profiling session at a time."""
+
+    def __init__(self, max_duration: float = 60.0):
+        self.max_duration = max_duration
+        self.active: Optional[dict] = None
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _session(self, kind: str, seconds: float):
+        if not 0 < seconds <= self.max_duration:
+            raise ValueError(f"Duration must be between 0 and {self.max_duration:g} seconds")
+        with self._lock:
+            if self.active is not None:
+                raise ProfilerBusy(f"A {self.active['kind']} profile is already running")
+            self.active = {
+                'kind': kind,
+                'started_at': datetime.now(timezone.utc).isoformat(),
+                'seconds': seconds,
+            }
+        logger.info(f"Starting {seconds:g}s {kind} profile in worker {os.getpid()}")
+        try:
+            yield
+        finally:
+            self.active = None
+
+    async def cpu(self, seconds: float, interval: float = 0.01, all_threads: bool = False) -> StackSampler:
+        """
+        Sample stacks for ``seconds`` and return the finished sampler.
+
+        Must be awaited on the event loop to profile it: the calling thread is
+        the one sampled unless ``all_threads`` is set.
+        """
+        with self._session('cpu', seconds):
+            sampler = StackSampler(interval, thread_id=None if all_threads else threading.get_ident())
+            sampler.start()
+            try:
+                await asyncio.sleep(seconds)
+            finally:
+                sampler.stop()
+            return sampler
+
+    async def memory(self, seconds: float, top: int = 25, frames: int = 10) -> dict:
+        """Allocation sites whose retained memory grew the most over ``seconds``."""
+        with self._session('memory', seconds):
+            # Leave tracing on if it was enabled for the process (PYTHONTRACEMALLOC)
+            started_here = not tracemalloc.is_tracing()
+            if started_here:
+                tracemalloc.start(frames)
+            try:
+                before = tracemalloc.take_snapshot()
+                await asyncio.sleep(seconds)
+                after = tracemalloc.take_snapshot()
+                traced_current, traced_peak = tracemalloc.get_traced_memory()
+            finally:
+                if started_here:
+                    tracemalloc.stop()
+
+        ignore = (
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+        )
+        diff = after.filter_traces(ignore).compare_to(before.filter_traces(ignore), 'traceback')
+        return {
+            'pid': os.getpid(),
+            'seconds': seconds,
+            'traced_kb': round(traced_current / 1024, 1),
+            'peak_kb': round(traced_peak / 1024, 1),
+            'growth_kb': round(sum(stat.size_diff for stat in diff) / 1024, 1),
+            'top': [
+                {
+                    'size_diff_kb': round(stat.size_diff / 1024, 1),
+                    'size_kb': round(stat.size / 1024, 1),
+                    'count_diff': stat.count_diff,
+                    'traceback': [f"{frame.filename}:{frame.lineno}" for frame in stat.traceback],
+                }
+                for stat in diff[:top]
+            ],
+        }
+
+    @property
+    def status(self) -> dict:
+        return {'pid': os.getpid(), 'max_seconds': self.max_duration, 'active': self.active}
+
+
+# Shared profiler for this worker
+profiler = Profiler(max_duration=float(os.environ.get('PROFILE_MAX_SECONDS', '60')))
@@ -6,15 +6,12 @@ import uuid
 import os
 import json
 from pywebpush import webpush, WebPushException
-from motor.motor_asyncio import AsyncIOMotorClient
 from auth import get_current_user
 
-router = APIRouter(prefix="/api/notifications", tags=["notifications"])
+# Import shared database connection
+from database import db
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+router = APIRouter(prefix="/api/notifications", tags=["notifications"])
 
 # VAPID configuration
 VAPID_PUBLIC_KEY = os.environ.get('VAPID_PUBLIC_KEY')
@@ -66,7 +63,7 @@ async def subscribe_to_push(data: SubscriptionCreate):
             "keys": data.subscription.keys,
             "expirationTime": data.subscription.expirationTime,
             "preferences": data.preferences,
-            "created_at": datetime.now(timezone.utc).isoformat(),
+            "created_at": datetime.now(timezone.utc),
             "active": True
         }
         
@@ -175,7 +172,7 @@ async def send_notification(notification: NotificationSend, current_user: dict =
             "sent_by": current_user.get("id"),
             "sent_count": sent_count,
             "failed_count": failed_count,
-            "timestamp": datetime.now(timezone.utc).isoformat()
+            "timestamp": datetime.now(timezone.utc)
         })
         
         return {
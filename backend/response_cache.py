@@ -0,0 +1,137 @@
+"""
+Pre-serialized, pre-compressed responses for hot public GET endpoints.
+
+Loaders cached with ``cached`` return an EncodedResponse instead of raw
+documents: the payload is validated against the response model and
+JSON-encoded once, compressed once per encoding, and given a strong ETag per
+encoding (the variants are different bytes, so they must not share a strong
+validator). A cache hit then skips pydantic, JSON encoding and GZipMiddleware
+entirely, and ``If-None-Match`` revalidations are answered with 304.
+"""
+
+import gzip
+import hashlib
+from typing import Any, FrozenSet, Iterable, Optional
+
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+
+from tracing import span
+
+try:
+    import brotli
+except ImportError:  # optional: gzip and identity are always available
+    brotli = None
+
+# Bodies smaller than this are not worth compressing (matches GZipMiddleware)
+MIN_COMPRESS_SIZE = 500
+
+# Clients may keep a copy but must revalidate; revalidation is a cheap 304
+CACHE_CONTROL = "no-cache"
+
+
+def _accepted_encodings(header: str) -> FrozenSet[str]:
+    """Parse Accept-Encoding into the set of codings with a non-zero q-value."""
+    accepted = set()
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        if not coding:
+            continue
+        params = params.replace(" ", "")
+        if params.startswith("q="):
+            try:
+                if float(params[2:]) == 0:
+                    continue
+            except ValueError:
+                pass
+        accepted.add(coding.lower())
+    return frozenset(accepted)
+
+
+def _etag_matches(if_none_match: str, etags: Iterable[str]) -> bool:
+    """Weak comparison against any of ``etags``, as required for If-None-Match (RFC 9110 13.1.2)."""
+    if if_none_match.strip() == "*":
+        return True
+    etags = set(etags)
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate in etags:
+            return True
+    return False
+
+
+def _content_etag(body: bytes) -> str:
+    return f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+
+def _variant_etag(etag: str, coding: str) -> str:
+    """Strong ETag of a compressed variant: the identity ETag with ``-<coding>`` appended."""
+    return f'{etag[:-1]}-{coding}"'
+
+
+class EncodedResponse:
+    """JSON body plus its compressed variants, each with its own strong ETag."""
+
+    __slots__ = ("body", "gzip", "br", "etag")
+
+    def __init__(self, body: bytes):
+        self.body = body
+        self.etag = _content_etag(body)
+        compress = len(body) >= MIN_COMPRESS_SIZE
+        self.gzip: Optional[bytes] = gzip.compress(body, compresslevel=6) if compress else None
+        self.br: Optional[bytes] = brotli.compress(body, quality=5) if compress and brotli else None
+
+    @classmethod
+    def from_variants(cls, body: bytes, gzip_body: Optional[bytes], br_body: Optional[bytes]) -> "EncodedResponse":
+        """Rebuild from already-compressed variants (e.g. read back from the shared L2 tier)."""
+        encoded = cls.__new__(cls)
+        encoded.body, encoded.gzip, encoded.br = body, gzip_body, br_body
+        encoded.etag = _content_etag(body)
+        return encoded
+
+    @property
+    def size(self) -> int:
+        """Total bytes held for this response across all variants."""
+        return len(self.body) + len(self.gzip or b"") + len(self.br or b"")
+
+    @property
+    def etags(self) -> tuple:
+        """Strong ETags of every variant held (identity first)."""
+        etags = [self.etag]
+        if self.gzip is not None:
+            etags.append(_variant_etag(self.etag, "gzip"))
+        if self.br is not None:
+            etags.append(_variant_etag(self.etag, "br"))
+        return tuple(etags)
+
+    def to_response(self, request: Request) -> Response:
+        """Pick the best variant for the request, or 304 if the client holds any current variant."""
+        body, coding = self.body, None
+        if self.gzip is not None:
+            accepted = _accepted_encodings(request.headers.get("accept-encoding", ""))
+            if self.br is not None and "br" in accepted:
+                body, coding = self.br, "br"
+            elif "gzip" in accepted:
+                body, coding = self.gzip, "gzip"
+
+        etag = _variant_etag(self.etag, coding) if coding else self.etag
+        headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL, "Vary": "Accept-Encoding"}
+
+        # Any variant's ETag proves the client's copy is current; the 304 names the one it would get now
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and _etag_matches(if_none_match, self.etags):
+            return Response(status_code=304, headers=headers)
+
+        if coding:
+            headers["Content-Encoding"] = coding
+        return Response(content=body, media_type="application/json", headers=headers)
+
+
+def encode_response(content: Any, adapter: TypeAdapter) -> EncodedResponse:
+    """Validate ``content`` against a response model adapter and encode it once."""
+    with span("response.validate"):
+        validated = adapter.validate_python(content)
+    with span("response.serialize"):
+        return EncodedResponse(adapter.dump_json(validated, by_alias=True))
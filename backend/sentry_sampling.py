@@ -0,0 +1,171 @@
+"""
+Adaptive ``traces_sampler`` for Sentry performance monitoring.
+
+Sampling every transaction (and profiling every sampled one) costs time on
+every request under load. ``AdaptiveTracesSampler`` decides per transaction:
+
+  1. A decision already made upstream (``parent_sampled``) is kept, so
+     distributed traces stay complete.
+  2. Routes that recently failed (5xx) or ran slower than
+     ``SENTRY_SLOW_SECONDS`` are sampled at 100% for ``SENTRY_BOOST_SECONDS``;
+     the next requests to a misbehaving endpoint are always traced. (Error
+     *events* are sent regardless of trace sampling.)
+  3. Everything else is sampled at a base rate that is recomputed every
+     window to hold ``SENTRY_TRACES_PER_SECOND`` sampled transactions per
+     worker, whatever the traffic. That is the overhead budget.
+  4. Each route may contribute at most ``SENTRY_ROUTE_TRACES_PER_MINUTE``
+     sampled transactions, so high-volume public GETs such as
+     ``/api/typhoons/active`` cannot use up the budget.
+
+The instrumentation middleware reports every finished request through
+``observe``; the sampler itself only runs when Sentry is enabled. The server
+binds the sampler to the app so it can match request paths to routes.
+"""
+
+import os
+import random
+import threading
+import time
+from typing import Callable, Dict, Tuple
+
+from starlette.routing import Match
+
+# Same label the request metrics use for paths no route matched
+UNMATCHED_ROUTE = '<unmatched>'
+
+RouteKey = Tuple[str, str]
+
+
+class AdaptiveTracesSampler:
+    """Callable usable as ``sentry_sdk.init(traces_sampler=...)``."""
+
+    def __init__(
+        self,
+        traces_per_second: float = 2.0,
+        route_traces_per_minute: float = 30.0,
+        slow_threshold: float = 1.0,
+        boost_seconds: float = 300.0,
+        window: float = 10.0,
+        initial_rate: float = 0.1,
+        min_rate: float = 0.001,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        Args:
+            traces_per_second: Sampled transactions per second this worker may send
+            route_traces_per_minute: Cap on sampled transactions per route
+            slow_threshold: Seconds after which a request marks its route as slow
+            boost_seconds: How long a slow or failing route is sampled at 100%
+            window: Seconds between recomputations of the base rate
+            initial_rate: Base rate used until the first window has passed
+            min_rate: Lower bound of the base rate
+            clock: Monotonic time source (injectable for tests)
+        """
+        self.traces_per_second = traces_per_second
+        self.route_traces_per_minute = route_traces_per_minute
+        self.slow_threshold = slow_threshold
+        self.boost_seconds = boost_seconds
+        self.window = window
+        self.min_rate = min_rate
+        self.rate = initial_rate
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._window_start = clock()
+        self._window_requests = 0
+        # Route -> time until which it is sampled at 100%
+        self._boosted: Dict[RouteKey, float] = {}
+        # Route -> (tokens, last refill); per-route token buckets
+        self._buckets: Dict[RouteKey, Tuple[float, float]] = {}
+        self._app = None
+
+    def bind(self, app) -> None:
+        """Use ``app``'s routes to resolve the route template of sampled requests."""
+        self._app = app
+
+    def observe(self, method: str, route: str, status_code: int, duration: float) -> None:
+        """Record a finished request (called by the instrumentation middleware)."""
+        now = self._clock()
+        with self._lock:
+            self._window_requests += 1
+            if status_code >= 500 or duration >= self.slow_threshold:
+                self._boosted[(method, route)] = now + self.boost_seconds
+            if now - self._window_start >= self.window:
+                self._adjust(now)
+
+    def _adjust(self, now: float) -> None:
+        request_rate = self._window_requests / (now - self._window_start)
+        if request_rate > 0:
+            self.rate = min(1.0, max(self.min_rate, self.traces_per_second / request_rate))
+        self._window_start = now
+        self._window_requests = 0
+        self._boosted = {key: until for key, until in self._boosted.items() if until > now}
+
+    def _take_token(self, key: RouteKey, now: float) -> bool:
+        capacity = self.route_traces_per_minute
+        tokens, last = self._buckets.get(key, (capacity, now))
+        tokens = min(capacity, tokens + (now - last) * capacity / 60)
+        if tokens < 1:
+            self._buckets[key] = (tokens, now)
+            return False
+        self._buckets[key] = (tokens - 1, now)
+        return True
+
+    def __call__(self, sampling_context: dict) -> float:
+        parent_sampled = sampling_context.get('parent_sampled')
+        if parent_sampled is not None:
+            return float(parent_sampled)
+
+        scope = sampling_context.get('asgi_scope')
+        if scope is None or scope.get('type') != 'http':
+            # Background tasks and other non-request transactions
+            return self.rate
+
+        key = (scope.get('method', 'GET'), _route_template(self._app, scope))
+        now = self._clock()
+        with self._lock:
+            if self._boosted.get(key, 0) > now:
+                return 1.0
+            if random.random() >= self.rate:
+                return 0.0
+            return 1.0 if self._take_token(key, now) else 0.0
+
+    @property
+    def status(self) -> dict:
+        now = self._clock()
+        with self._lock:
+            return {
+                'base_rate': self.rate,
+                'traces_per_second': self.traces_per_second,
+                'route_traces_per_minute': self.route_traces_per_minute,
+                'boosted_routes': sorted(
+                    f"{method} {route}" for (method, route), until in self._boosted.items() if until > now
+                ),
+            }
+
+
+def _route_template(app, scope: dict) -> str:
+    """
+    Route template a request will be dispatched to.
+
+    Sentry samples when the transaction starts, outside the application and
+    before the router has stored the route in the scope, so the bound app's
+    routes are matched here.
+    """
+    for route in getattr(getattr(app, 'router', None), 'routes', ()):
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(route, 'path', UNMATCHED_ROUTE)
+    return UNMATCHED_ROUTE
+
+
+def _from_env() -> AdaptiveTracesSampler:
+    return AdaptiveTracesSampler(
+        traces_per_second=float(os.environ.get('SENTRY_TRACES_PER_SECOND', '2')),
+        route_traces_per_minute=float(os.environ.get('SENTRY_ROUTE_TRACES_PER_MINUTE', '30')),
+        slow_threshold=float(os.environ.get('SENTRY_SLOW_SECONDS', '1.0')),
+        boost_seconds=float(os.environ.get('SENTRY_BOOST_SECONDS', '300')),
+    )
+
+
+# Shared sampler for this worker
+traces_sampler = _from_env()
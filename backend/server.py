@@ -1,5 +1,5 @@
-from fastapi import FastAPI, APIRouter, HTTPException
-from fastapi.responses import PlainTextResponse
+from fastapi import FastAPI, APIRouter, Depends, HTTPException
+from fastapi.responses import JSONResponse, PlainTextResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from starlette.middleware.gzip import GZipMiddleware
@@ -16,27 +16,38 @@ from contextlib import asynccontextmanager
 from database import db, client, close_client
 
 # Import authentication and incident management
-from auth import include_auth_routes, include_incident_routes
+from auth import include_auth_routes, include_incident_routes, require_admin
 from typhoon_routes import include_typhoon_routes
 from push_notification_routes import include_push_notification_routes
 from analytics_routes import include_analytics_routes
 from ai_chat_routes import include_ai_chat_routes
+from diagnostics_routes import include_diagnostics_routes
 
 # Import caching
-from cache import clear_all_caches
+from cache import clear_all_caches, clear_all_caches_async, set_l2_backend
+from cache_backends import RedisBackend
+from cache_invalidation import start_invalidation_bus, stop_invalidation_bus, invalidation_bus_status
+from cache_warmup import warmup
+from health import db_probe
+from admission import AdmissionControlMiddleware
+from access_log import access_log
+from loop_monitor import loop_monitor
+from tracing import tracer
+from sentry_sampling import traces_sampler
 
 # Import logging and monitoring
 from logging_config import (
     setup_logging,
     setup_sentry,
-    RequestLoggingMiddleware,
-    PerformanceMonitoringMiddleware,
+    InstrumentationMiddleware,
+    start_system_monitoring,
+    system_snapshot,
     get_metrics,
     logger
 )
 
-# Import database initialization
-from init_db import create_indexes
+# Declarative index spec, built in the background at startup
+from db_indexes import index_manager
 
 
 ROOT_DIR = Path(__file__).parent
@@ -45,6 +56,7 @@ load_dotenv(ROOT_DIR / '.env')
 # Setup logging and monitoring
 setup_logging()
 setup_sentry()
+start_system_monitoring()
 
 
 # Application lifespan for startup/shutdown
@@ -53,24 +65,49 @@ async def app_lifespan(app: FastAPI):
     """Application lifespan context manager for startup/shutdown events."""
     # Startup
     logger.info("Application startup - initializing...")
+    loop_monitor.start()
     
+    # Shared L2 cache tier so workers don't each query MongoDB for hot reads
+    l2_backend = None
+    cache_redis_url = os.environ.get('CACHE_REDIS_URL')
+    if cache_redis_url:
+        l2_backend = RedisBackend(cache_redis_url)
+        set_l2_backend(l2_backend)
+        logger.info("Shared L2 cache enabled")
+
     try:
-        # Create database indexes
-        await create_indexes()
+        # Build missing indexes without delaying startup (see db_indexes)
+        index_manager.start(db)
         
         # Seed demo users if not exist
         await _ensure_bootstrap_data()
+
+        # Evict local caches when other workers write (falls back to TTL-only without a replica set)
+        if os.environ.get('CACHE_INVALIDATION_BUS', 'true').lower() != 'false':
+            start_invalidation_bus(db)
         
         logger.info("Application startup complete")
     except Exception as e:
         logger.warning(f"Startup initialization warning: {e}")
+
+    # Fill hot caches before taking traffic (bounded so a slow DB can't block
+    # startup; warmer failures are logged and the worker still becomes ready)
+    await warmup.run(budget=float(os.environ.get('CACHE_WARMUP_BUDGET', '10')))
     
     yield
     
     # Shutdown
     logger.info("Application shutdown - cleaning up...")
+    await stop_invalidation_bus()
+    await index_manager.stop()
+    await loop_monitor.stop()
     clear_all_caches()
+    if l2_backend is not None:
+        set_l2_backend(None)
+        await l2_backend.close()
     await close_client()
+    access_log.close()
+    tracer.close()
     logger.info("Application shutdown complete")
 
 
@@ -86,7 +123,7 @@ async def _ensure_bootstrap_data():
                 "email": "admin@emergency.com",
                 "hashed_password": bcrypt.hashpw(b"admin123", bcrypt.gensalt()).decode("utf-8"),
                 "role": "admin",
-                "created_at": datetime.now(timezone.utc).isoformat(),
+                "created_at": datetime.now(timezone.utc),
             })
             logger.info("Created admin user")
 
@@ -99,7 +136,7 @@ async def _ensure_bootstrap_data():
                 "email": "user@test.com",
                 "hashed_password": bcrypt.hashpw(b"test123", bcrypt.gensalt()).decode("utf-8"),
                 "role": "user",
-                "created_at": datetime.now(timezone.utc).isoformat(),
+                "created_at": datetime.now(timezone.utc),
             })
             logger.info("Created test user")
     except Exception as e:
@@ -113,6 +150,8 @@ app = FastAPI(
     version="1.0.0",
     lifespan=app_lifespan
 )
+# Lets the Sentry traces sampler resolve request paths to route templates
+traces_sampler.bind(app)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -171,57 +210,35 @@ async def create_status_check(input: StatusCheckCreate):
     status_dict = input.model_dump()
     status_obj = StatusCheck(**status_dict)
     
-    # Convert to dict and serialize datetime to ISO string for MongoDB
-    doc = status_obj.model_dump()
-    doc['timestamp'] = doc['timestamp'].isoformat()
-    
-    _ = await db.status_checks.insert_one(doc)
+    _ = await db.status_checks.insert_one(status_obj.model_dump())
     return status_obj
 
 @api_router.get("/status", response_model=List[StatusCheck])
 async def get_status_checks():
     # Exclude MongoDB's _id field from the query results
     status_checks = await db.status_checks.find({}, {"_id": 0}).to_list(1000)
-
-    # Convert ISO string timestamps back to datetime objects
-    for check in status_checks:
-        if isinstance(check['timestamp'], str):
-            check['timestamp'] = datetime.fromisoformat(check['timestamp'])
-
     return status_checks
 
 @api_router.get("/health")
 async def health_check():
-    """Enhanced health check endpoint with system metrics (non-blocking)."""
-    try:
-        # Check database connection
-        await db.command('ping')
-        db_status = "healthy"
-    except Exception as e:
-        logger.error(f"Database health check failed: {e}")
-        db_status = "unhealthy"
-
-    import psutil
-    
-    # Non-blocking system metrics (no interval parameter)
-    health_data = {
-        "status": "healthy" if db_status == "healthy" else "unhealthy",
+    """
+    Detailed health: cached database ping plus the system snapshot taken by
+    the metrics thread (no psutil or disk calls per request).
+    """
+    database = await db_probe.result()
+    db_status = "healthy" if database["healthy"] else "unhealthy"
+    return {
+        "status": db_status,
         "timestamp": datetime.now(timezone.utc).isoformat(),
         "services": {
             "database": db_status,
             "api": "healthy"
         },
-        "system": {
-            "cpu_percent": psutil.cpu_percent(interval=None),  # Non-blocking
-            "memory_percent": psutil.virtual_memory().percent,
-            "disk_usage": psutil.disk_usage('/').percent
-        },
+        "database": database,
+        "system": system_snapshot(),
         "version": "1.0.0"
     }
 
-    logger.info("Health check performed", extra={"health_status": health_data["status"]})
-    return health_data
-
 @app.get("/metrics")
 async def metrics():
     """Prometheus metrics endpoint."""
@@ -231,6 +248,24 @@ async def metrics():
         media_type=CONTENT_TYPE_LATEST
     )
 
+@app.get("/livez")
+async def livez():
+    """Liveness probe: the event loop is serving requests. No I/O."""
+    return {"status": "alive"}
+
+@app.get("/readyz")
+async def readyz():
+    """Readiness probe: cache warm-up finished and the (cached) database ping succeeds."""
+    database = await db_probe.result()
+    ready = warmup.ready and database["healthy"]
+    if not ready:
+        status = "warming_up" if not warmup.ready else "database_unavailable"
+        return JSONResponse(
+            status_code=503,
+            content={"status": status, "warmup": warmup.status, "database": database},
+        )
+    return {"status": "ready", "warmup": warmup.status, "database": database}
+
 @api_router.get("/cache/stats")
 async def cache_stats():
     """Get cache statistics."""
@@ -238,13 +273,15 @@ async def cache_stats():
     return {
         "short_cache": short_cache.stats,
         "medium_cache": medium_cache.stats,
-        "long_cache": long_cache.stats
+        "long_cache": long_cache.stats,
+        "invalidation_bus": invalidation_bus_status(),
+        "warmup": warmup.status,
     }
 
 @api_router.post("/cache/clear")
-async def clear_cache():
-    """Clear all caches (admin operation)."""
-    clear_all_caches()
+async def clear_cache(current_user: dict = Depends(require_admin)):
+    """Clear all caches, including the shared L2 tier (Admin only)."""
+    await clear_all_caches_async()
     return {"message": "All caches cleared"}
 
 # Include the router in the main app
@@ -257,6 +294,11 @@ include_typhoon_routes(app)
 include_push_notification_routes(app)
 include_analytics_routes(app)
 include_ai_chat_routes(app)
+include_diagnostics_routes(app)
+
+# Queue or shed requests per route class under overload (innermost, so 503s
+# still get CORS headers and show up in request metrics)
+app.add_middleware(AdmissionControlMiddleware)
 
 # Add GZip compression middleware (compress responses > 500 bytes)
 app.add_middleware(GZipMiddleware, minimum_size=500)
@@ -269,9 +311,8 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Add monitoring middleware
-app.add_middleware(PerformanceMonitoringMiddleware)
-app.add_middleware(RequestLoggingMiddleware)
+# Request logging and metrics (outermost, so it times the whole stack)
+app.add_middleware(InstrumentationMiddleware)
 
 
 @app.on_event("shutdown")
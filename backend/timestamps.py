@@ -0,0 +1,56 @@
+"""
+Timestamp storage helpers.
+
+``created_at``, ``updated_at`` and ``timestamp`` fields are stored as BSON
+dates. The shared client is ``tz_aware``, so they come back as UTC-aware
+datetimes that the response models serialize directly, with no parsing per
+document. Documents written before the switch hold ISO-8601 strings until
+``migrate_dates`` converts them. Until then:
+
+  * response models parse either form (pydantic accepts ISO strings for
+    ``datetime`` fields), so list endpoints need no per-document conversion;
+  * ``time_range`` matches both forms in range queries;
+  * ``as_datetime`` normalizes a single value for code that does arithmetic
+    or grouping on it.
+
+Once the migration has finished everywhere, set ``TIMESTAMPS_LEGACY_STRINGS=false``
+to drop the string half of range queries.
+"""
+
+import os
+from datetime import datetime, timezone
+from typing import Any, Optional
+
+# Whether range queries should still match documents holding ISO strings
+LEGACY_STRINGS = os.environ.get('TIMESTAMPS_LEGACY_STRINGS', 'true').lower() != 'false'
+
+
+def as_datetime(value: Any) -> Optional[datetime]:
+    """UTC-aware datetime for a stored timestamp in either format; None if absent or unparseable."""
+    if isinstance(value, datetime):
+        return value if value.tzinfo is not None else value.replace(tzinfo=timezone.utc)
+    if isinstance(value, str) and value:
+        try:
+            parsed = datetime.fromisoformat(value)
+        except ValueError:
+            return None
+        return parsed if parsed.tzinfo is not None else parsed.replace(tzinfo=timezone.utc)
+    return None
+
+
+def time_range(field: str, start: Optional[datetime] = None, end: Optional[datetime] = None) -> dict:
+    """
+    Filter for ``start <= field <= end`` on a timestamp field.
+
+    BSON compares dates and strings in separate type brackets, so during the
+    rollout the date range and the equivalent ISO-string range are OR-ed; both
+    halves can use the field's index.
+    """
+    dates, strings = {}, {}
+    if start is not None:
+        dates['$gte'], strings['$gte'] = start, start.isoformat()
+    if end is not None:
+        dates['$lte'], strings['$lte'] = end, end.isoformat()
+    if not LEGACY_STRINGS:
+        return {field: dates}
+    return {'$or': [{field: dates}, {field: strings}]}
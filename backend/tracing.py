@@ -0,0 +1,222 @@
+"""
+Lightweight per-request tracing with local exporters.
+
+A sampled request gets a trace whose id is its ``X-Request-ID`` (taken from
+the client or generated by the instrumentation middleware, and echoed back),
+so a slow response can be looked up by the id the client saw. Spans are
+recorded for:
+
+  * the request itself (root span, opened by the middleware),
+  * dependencies and helpers decorated with ``@traced`` (e.g. JWT decoding
+    and the user lookup in ``get_current_user``),
+  * every MongoDB command, via a pymongo command listener (motor runs commands
+    in a copied context, so the listener sees the request's current span),
+  * response validation and serialization in ``encode_response``.
+
+Finished traces go to an in-memory ring buffer served by the admin
+diagnostics endpoint and, if ``TRACE_EXPORT_PATH`` is set, to a JSON-lines
+file through the same queued writer as the access log. No collector needed.
+Unsampled requests pay one context-variable lookup per instrumented call.
+"""
+
+import os
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from functools import wraps
+from typing import Any, Dict, Optional, Tuple
+
+from pymongo import monitoring
+
+from access_log import AccessLog
+
+# Spans recorded per trace before further ones are counted but dropped
+MAX_SPANS_PER_TRACE = 500
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("trace_span", default=None)
+
+
+class Trace:
+    """Spans of one sampled request."""
+
+    __slots__ = ("trace_id", "started_at", "origin", "spans", "dropped_spans")
+
+    def __init__(self, trace_id: str):
+        self.trace_id = trace_id
+        self.started_at = datetime.now(timezone.utc).isoformat()
+        self.origin = time.perf_counter()
+        self.spans: list = []
+        self.dropped_spans = 0
+
+    def new_span(self, name: str, parent: Optional["Span"], attributes: dict) -> Optional["Span"]:
+        if len(self.spans) >= MAX_SPANS_PER_TRACE:
+            self.dropped_spans += 1
+            return None
+        span = Span(self, name, parent, attributes)
+        self.spans.append(span)
+        return span
+
+
+class Span:
+    __slots__ = ("trace", "span_id", "parent_id", "name", "start", "end", "attributes", "token")
+
+    def __init__(self, trace: Trace, name: str, parent: Optional["Span"], attributes: dict):
+        self.trace = trace
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent.span_id if parent is not None else None
+        self.name = name
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.attributes = attributes
+        self.token = None
+
+    def finish(self, end: Optional[float] = None) -> None:
+        self.end = end if end is not None else time.perf_counter()
+
+    def as_dict(self) -> dict:
+        origin = self.trace.origin
+        end = self.end if self.end is not None else time.perf_counter()
+        return {
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "offset_ms": round((self.start - origin) * 1000, 3),
+            "duration_ms": round((end - self.start) * 1000, 3),
+            "attributes": self.attributes,
+        }
+
+
+class Tracer:
+    """Samples requests, opens root spans and exports finished traces."""
+
+    def __init__(self, sample_rate: float = 0.0, buffer_size: int = 200, export_path: Optional[str] = None):
+        self.sample_rate = sample_rate
+        self.traces: deque = deque(maxlen=buffer_size)
+        self._file = AccessLog(path=export_path) if export_path else None
+        self.sampled = 0
+
+    def start_trace(self, name: str, trace_id: str, **attributes) -> Optional[Span]:
+        """Open a root span for a request if it is sampled; returns None otherwise."""
+        if self.sample_rate <= 0 or (self.sample_rate < 1 and random.random() >= self.sample_rate):
+            return None
+        self.sampled += 1
+        root = Trace(trace_id).new_span(name, None, attributes)
+        root.token = _current_span.set(root)
+        return root
+
+    def end_trace(self, root: Span, **attributes) -> None:
+        root.attributes.update(attributes)
+        root.finish()
+        _current_span.reset(root.token)
+        trace = root.trace
+        record = {
+            "trace_id": trace.trace_id,
+            "name": root.name,
+            "started_at": trace.started_at,
+            "duration_ms": round((root.end - root.start) * 1000, 3),
+            "spans": [span.as_dict() for span in trace.spans],
+        }
+        if trace.dropped_spans:
+            record["dropped_spans"] = trace.dropped_spans
+        self.traces.append(record)
+        if self._file is not None:
+            self._file.log(record)
+
+    def get(self, trace_id: str) -> Optional[dict]:
+        for record in reversed(self.traces):
+            if record["trace_id"] == trace_id:
+                return record
+        return None
+
+    def summaries(self) -> list:
+        return [
+            {
+                "trace_id": record["trace_id"],
+                "name": record["name"],
+                "started_at": record["started_at"],
+                "duration_ms": record["duration_ms"],
+                "spans": len(record["spans"]),
+            }
+            for record in reversed(self.traces)
+        ]
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Record a child span of the current span; a no-op outside sampled requests."""
+    parent = _current_span.get()
+    child = parent.trace.new_span(name, parent, attributes) if parent is not None else None
+    if child is None:
+        yield None
+        return
+    token = _current_span.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.attributes["error"] = type(e).__name__
+        raise
+    finally:
+        child.finish()
+        _current_span.reset(token)
+
+
+def traced(name: str):
+    """Decorator recording each call of an async function as a span."""
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            with span(name):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class TracingCommandListener(monitoring.CommandListener):
+    """Adds a span for each MongoDB command run inside a sampled request."""
+
+    def __init__(self):
+        self._open: Dict[Tuple[int, Any], Span] = {}
+        self._lock = threading.Lock()
+
+    def started(self, event) -> None:
+        parent = _current_span.get()
+        if parent is None:
+            return
+        target = event.command.get('collection' if event.command_name == 'getMore' else event.command_name)
+        child = parent.trace.new_span(
+            f"mongodb.{event.command_name}",
+            parent,
+            {"collection": target if isinstance(target, str) else None},
+        )
+        if child is not None:
+            with self._lock:
+                self._open[(event.request_id, event.connection_id)] = child
+
+    def _finish(self, event, **attributes) -> None:
+        with self._lock:
+            child = self._open.pop((event.request_id, event.connection_id), None)
+        if child is not None:
+            child.attributes.update(attributes)
+            child.finish(child.start + event.duration_micros / 1e6)
+
+    def succeeded(self, event) -> None:
+        self._finish(event)
+
+    def failed(self, event) -> None:
+        self._finish(event, error=str(getattr(event, 'failure', {}).get('codeName', 'error')))
+
+
+tracer = Tracer(
+    sample_rate=float(os.environ.get('TRACE_SAMPLE_RATE', '0.0')),
+    buffer_size=int(os.environ.get('TRACE_BUFFER_SIZE', '200')),
+    export_path=os.environ.get('TRACE_EXPORT_PATH'),
+)
+command_listener = TracingCommandListener()
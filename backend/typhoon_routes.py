@@ -1,6 +1,6 @@
-from fastapi import APIRouter, HTTPException, Depends, status
-from pydantic import BaseModel, Field, ConfigDict
-from typing import List, Optional
+from fastapi import APIRouter, HTTPException, Depends, Request
+from pydantic import BaseModel, Field, ConfigDict, TypeAdapter
+from typing import List, Optional, Union
 from datetime import datetime, timezone
 import uuid
 import os
@@ -11,10 +11,13 @@ from pathlib import Path
 from database import db
 
 # Import auth
-from auth import get_current_user
+from auth import require_admin
 
 # Import caching
-from cache import cached, short_cache, medium_cache, invalidate_cache
+from cache import cached, short_cache, medium_cache, invalidate_cache_async
+from response_cache import EncodedResponse, encode_response
+from cache_warmup import register_warmer
+from pagination import InvalidCursor, decode_cursor, keyset_page
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -105,6 +108,10 @@ class TyphoonUpdate(BaseModel):
     totalDistance: Optional[int] = None
     trackingTime: Optional[int] = None
 
+class TyphoonPage(BaseModel):
+    items: List[Typhoon]
+    next_cursor: Optional[str] = None
+
 class TrackingPointAdd(BaseModel):
     lat: float
     lon: float
@@ -113,27 +120,68 @@ class TrackingPointAdd(BaseModel):
     pressure: Optional[int] = None
 
 
-# Helper function to check if user is admin
-async def require_admin(current_user: dict = Depends(get_current_user)):
-    if current_user.get("role") != "admin":
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Admin privileges required"
-        )
-    return current_user
-
-
 # Typhoon Router
 typhoon_router = APIRouter()
 
 
-def _process_typhoon_timestamps(typhoon: dict) -> dict:
-    """Helper to process typhoon timestamps."""
-    if isinstance(typhoon.get('created_at'), str):
-        typhoon['created_at'] = datetime.fromisoformat(typhoon['created_at'])
-    if typhoon.get('updated_at') and isinstance(typhoon['updated_at'], str):
-        typhoon['updated_at'] = datetime.fromisoformat(typhoon['updated_at'])
-    return typhoon
+# Hot public reads: cached as pre-encoded responses and refreshed in the background once stale
+_TYPHOON_LIST_ADAPTER = TypeAdapter(List[Typhoon])
+_TYPHOON_ADAPTER = TypeAdapter(Typhoon)
+_TYPHOON_PAGE_ADAPTER = TypeAdapter(TyphoonPage)
+
+
+@cached(cache=short_cache, prefix="typhoons", refresh_after=30)
+async def _load_typhoons(status: Optional[str], skip: int, limit: int) -> EncodedResponse:
+    query = {}
+    if status:
+        query["status"] = status
+
+    typhoons = await db.typhoons.find(
+        query,
+        {"_id": 0}
+    ).sort("created_at", -1).skip(skip).limit(limit).to_list(limit)
+
+    return encode_response(typhoons, _TYPHOON_LIST_ADAPTER)
+
+
+@cached(cache=short_cache, prefix="typhoon_pages", tags=lambda *args: ["typhoons"], refresh_after=30)
+async def _load_typhoon_page(status: Optional[str], cursor: str, limit: int) -> EncodedResponse:
+    typhoons, next_cursor = await keyset_page(
+        db.typhoons, {"status": status} if status else {}, limit, cursor
+    )
+    return encode_response({"items": typhoons, "next_cursor": next_cursor}, _TYPHOON_PAGE_ADAPTER)
+
+
+@cached(cache=short_cache, prefix="active_typhoons", refresh_after=20)
+async def _load_active_typhoons() -> EncodedResponse:
+    typhoons = await db.typhoons.find(
+        {"status": "active"},
+        {"_id": 0}
+    ).sort("created_at", -1).to_list(100)
+
+    return encode_response(typhoons, _TYPHOON_LIST_ADAPTER)
+
+
+@cached(
+    cache=short_cache,
+    prefix="typhoon_detail",
+    tags=lambda typhoon_id: [f"typhoon:{typhoon_id}"],
+    refresh_after=30,
+    # Offline clients keep polling deleted IDs; remember the 404 briefly
+    negative_ttl=15,
+)
+async def _load_typhoon(typhoon_id: str) -> Optional[EncodedResponse]:
+    typhoon = await db.typhoons.find_one({"id": typhoon_id}, {"_id": 0})
+    if not typhoon:
+        return None
+
+    return encode_response(typhoon, _TYPHOON_ADAPTER)
+
+
+# Warm the default list and the active list before the worker reports ready;
+# arguments must match what the routes pass so the keys line up
+register_warmer("typhoons", lambda: _load_typhoons(None, 0, 100))
+register_warmer("active_typhoons", _load_active_typhoons)
 
 
 @typhoon_router.post("/", response_model=Typhoon)
@@ -145,57 +193,57 @@ async def create_typhoon(
     typhoon_dict = typhoon.model_dump()
     typhoon_dict["id"] = str(uuid.uuid4())
     typhoon_dict["status"] = "active"
-    typhoon_dict["created_at"] = datetime.now(timezone.utc).isoformat()
+    typhoon_dict["created_at"] = datetime.now(timezone.utc)
     typhoon_dict["created_by"] = current_user.get("username")
     
     await db.typhoons.insert_one(typhoon_dict)
     created_typhoon = await db.typhoons.find_one({"id": typhoon_dict["id"]}, {"_id": 0})
     
     # Invalidate typhoon caches
-    invalidate_cache("typhoons")
-    invalidate_cache("active_typhoons")
+    await invalidate_cache_async("typhoons")
+    await invalidate_cache_async("active_typhoons")
     
-    return _process_typhoon_timestamps(created_typhoon)
+    return created_typhoon
 
 
-@typhoon_router.get("/", response_model=List[Typhoon])
+@typhoon_router.get("/", response_model=Union[List[Typhoon], TyphoonPage])
 async def get_typhoons(
+    request: Request,
     status: Optional[str] = None,
     skip: int = 0,
-    limit: int = 100
+    limit: int = 100,
+    cursor: Optional[str] = None,
 ):
-    """Get all typhoons with optional status filter"""
-    query = {}
-    if status:
-        query["status"] = status
-    
-    typhoons = await db.typhoons.find(
-        query, 
-        {"_id": 0}
-    ).sort("created_at", -1).skip(skip).limit(limit).to_list(limit)
-    
-    return [_process_typhoon_timestamps(t) for t in typhoons]
+    """
+    Get all typhoons with optional status filter, newest first.
+
+    Pass ``cursor`` (empty for the first page) for keyset pagination: the
+    response becomes ``{"items", "next_cursor"}``. Without it, skip/limit.
+    """
+    if cursor is None:
+        return (await _load_typhoons(status, skip, limit)).to_response(request)
+    if cursor:
+        try:
+            decode_cursor(cursor)
+        except InvalidCursor as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    return (await _load_typhoon_page(status, cursor, max(limit, 1))).to_response(request)
 
 
 @typhoon_router.get("/active", response_model=List[Typhoon])
-async def get_active_typhoons():
-    """Get all currently active typhoons (cached for 1 minute)"""
-    typhoons = await db.typhoons.find(
-        {"status": "active"}, 
-        {"_id": 0}
-    ).sort("created_at", -1).to_list(100)
-    
-    return [_process_typhoon_timestamps(t) for t in typhoons]
+async def get_active_typhoons(request: Request):
+    """Get all currently active typhoons (cached, refreshed in the background after 20s)"""
+    return (await _load_active_typhoons()).to_response(request)
 
 
 @typhoon_router.get("/{typhoon_id}", response_model=Typhoon)
-async def get_typhoon(typhoon_id: str):
+async def get_typhoon(typhoon_id: str, request: Request):
     """Get a specific typhoon by ID"""
-    typhoon = await db.typhoons.find_one({"id": typhoon_id}, {"_id": 0})
-    if not typhoon:
+    typhoon = await _load_typhoon(typhoon_id)
+    if typhoon is None:
         raise HTTPException(status_code=404, detail="Typhoon not found")
     
-    return _process_typhoon_timestamps(typhoon)
+    return typhoon.to_response(request)
 
 
 @typhoon_router.put("/{typhoon_id}", response_model=Typhoon)
@@ -209,7 +257,7 @@ async def update_typhoon(
     if not update_data:
         raise HTTPException(status_code=400, detail="No valid fields to update")
     
-    update_data["updated_at"] = datetime.now(timezone.utc).isoformat()
+    update_data["updated_at"] = datetime.now(timezone.utc)
     update_data["updated_by"] = current_user.get("username")
     
     result = await db.typhoons.update_one(
@@ -225,10 +273,11 @@ async def update_typhoon(
     updated_typhoon = await db.typhoons.find_one({"id": typhoon_id}, {"_id": 0})
     
     # Invalidate caches
-    invalidate_cache("typhoons")
-    invalidate_cache("active_typhoons")
+    await invalidate_cache_async("typhoons")
+    await invalidate_cache_async("active_typhoons")
+    await invalidate_cache_async(f"typhoon:{typhoon_id}")
     
-    return _process_typhoon_timestamps(updated_typhoon)
+    return updated_typhoon
 
 
 @typhoon_router.put("/{typhoon_id}/archive", response_model=Typhoon)
@@ -239,7 +288,7 @@ async def archive_typhoon(
     """Archive a typhoon (change status to inactive) (Admin only)"""
     update_data = {
         "status": "inactive",
-        "updated_at": datetime.now(timezone.utc).isoformat(),
+        "updated_at": datetime.now(timezone.utc),
         "updated_by": current_user.get("username")
     }
     
@@ -256,10 +305,11 @@ async def archive_typhoon(
     archived_typhoon = await db.typhoons.find_one({"id": typhoon_id}, {"_id": 0})
     
     # Invalidate caches
-    invalidate_cache("typhoons")
-    invalidate_cache("active_typhoons")
+    await invalidate_cache_async("typhoons")
+    await invalidate_cache_async("active_typhoons")
+    await invalidate_cache_async(f"typhoon:{typhoon_id}")
     
-    return _process_typhoon_timestamps(archived_typhoon)
+    return archived_typhoon
 
 
 @typhoon_router.post("/{typhoon_id}/tracking", response_model=Typhoon)
@@ -280,7 +330,7 @@ async def add_tracking_point(
         {
             "$push": {"trackingPath": new_point},
             "$set": {
-                "updated_at": datetime.now(timezone.utc).isoformat(),
+                "updated_at": datetime.now(timezone.utc),
                 "updated_by": current_user.get("username")
             }
         }
@@ -289,10 +339,11 @@ async def add_tracking_point(
     updated_typhoon = await db.typhoons.find_one({"id": typhoon_id}, {"_id": 0})
     
     # Invalidate caches
-    invalidate_cache("typhoons")
-    invalidate_cache("active_typhoons")
+    await invalidate_cache_async("typhoons")
+    await invalidate_cache_async("active_typhoons")
+    await invalidate_cache_async(f"typhoon:{typhoon_id}")
     
-    return _process_typhoon_timestamps(updated_typhoon)
+    return updated_typhoon
 
 
 @typhoon_router.delete("/{typhoon_id}")
@@ -306,8 +357,9 @@ async def delete_typhoon(
         raise HTTPException(status_code=404, detail="Typhoon not found")
     
     # Invalidate caches
-    invalidate_cache("typhoons")
-    invalidate_cache("active_typhoons")
+    await invalidate_cache_async("typhoons")
+    await invalidate_cache_async("active_typhoons")
+    await invalidate_cache_async(f"typhoon:{typhoon_id}")
     
     return {"message": "Typhoon deleted successfully"}
 
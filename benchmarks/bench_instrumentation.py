@@ -0,0 +1,160 @@
+"""
+Microbenchmark: request logging/metrics middleware overhead.
+
+Drives a trivial FastAPI route in-process (no sockets) through
+
+  * no middleware,
+  * the previous BaseHTTPMiddleware pair (RequestLoggingMiddleware +
+    PerformanceMonitoringMiddleware, reproduced below), and
+  * the pure ASGI InstrumentationMiddleware,
+
+and prints requests/sec for each. Logs go to null sinks (loguru for the old
+middleware, the queued access log for the new one) so the cost of building
+log records is included but terminal and disk I/O is not.
+
+    python benchmarks/bench_instrumentation.py [--requests 20000]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from fastapi import FastAPI, Request  # noqa: E402
+from starlette.middleware.base import BaseHTTPMiddleware  # noqa: E402
+
+from access_log import AccessLog  # noqa: E402
+from logging_config import (  # noqa: E402
+    REQUEST_COUNT,
+    REQUEST_LATENCY,
+    InstrumentationMiddleware,
+    logger,
+)
+
+
+class LegacyRequestLoggingMiddleware(BaseHTTPMiddleware):
+    """The BaseHTTPMiddleware implementation InstrumentationMiddleware replaced."""
+
+    async def dispatch(self, request: Request, call_next):
+        start_time = time.time()
+        request_id = request.headers.get('X-Request-ID', 'unknown')
+        logger.info(
+            "Incoming request",
+            extra={
+                "request_id": request_id,
+                "method": request.method,
+                "url": str(request.url),
+                "headers": dict(request.headers),
+                "client_ip": request.client.host if request.client else 'unknown',
+                "user_agent": request.headers.get('User-Agent', 'unknown'),
+            }
+        )
+        response = await call_next(request)
+        process_time = time.time() - start_time
+        REQUEST_COUNT.labels(method=request.method, endpoint=request.url.path, status_code=response.status_code).inc()
+        REQUEST_LATENCY.labels(method=request.method, endpoint=request.url.path).observe(process_time)
+        logger.info(
+            "Request completed",
+            extra={
+                "request_id": request_id,
+                "method": request.method,
+                "url": str(request.url),
+                "status_code": response.status_code,
+                "process_time": f"{process_time:.4f}s",
+                "response_headers": dict(response.headers),
+            }
+        )
+        response.headers["X-Process-Time"] = f"{process_time:.4f}"
+        response.headers["X-Request-ID"] = request_id
+        return response
+
+
+class LegacyPerformanceMonitoringMiddleware(BaseHTTPMiddleware):
+    """The no-op dispatch that still cost a task and a stream per request."""
+
+    async def dispatch(self, request: Request, call_next):
+        return await call_next(request)
+
+
+def make_app(variant: str) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    if variant == "base_http":
+        app.add_middleware(LegacyPerformanceMonitoringMiddleware)
+        app.add_middleware(LegacyRequestLoggingMiddleware)
+    elif variant == "asgi":
+        app.add_middleware(InstrumentationMiddleware, access_log=AccessLog(path=os.devnull))
+    return app
+
+
+async def run(app, requests: int) -> float:
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": "/ping",
+        "raw_path": b"/ping",
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"host", b"bench"), (b"user-agent", b"bench"), (b"accept", b"*/*")],
+        "client": ("127.0.0.1", 5000),
+        "server": ("bench", 80),
+    }
+
+    idle = asyncio.Event()
+
+    async def send(message):
+        pass
+
+    async def request():
+        body_sent = False
+
+        async def receive():
+            nonlocal body_sent
+            if body_sent:
+                # Like a real server: block until the client disconnects
+                await idle.wait()
+            body_sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        await app(dict(scope), receive, send)
+
+    for _ in range(200):  # warm up route matching, label children, etc.
+        await request()
+
+    start = time.perf_counter()
+    for _ in range(requests):
+        await request()
+    return requests / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20000)
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(lambda message: None, level="INFO")
+
+    results = {}
+    for variant in ("none", "base_http", "asgi"):
+        results[variant] = asyncio.run(run(make_app(variant), args.requests))
+
+    for variant, rps in results.items():
+        print(f"{variant:>10}: {rps:10.0f} req/s  ({1e6 / rps:7.1f} us/req)")
+    overhead_before = 1e6 / results["base_http"] - 1e6 / results["none"]
+    overhead_after = 1e6 / results["asgi"] - 1e6 / results["none"]
+    print(f"middleware overhead: {overhead_before:.1f} us/req before, {overhead_after:.1f} us/req after")
+
+
+if __name__ == "__main__":
+    main()
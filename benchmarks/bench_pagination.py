@@ -0,0 +1,138 @@
+"""
+Benchmark: deep-page latency of skip/limit vs keyset (cursor) pagination.
+
+Seeds a throwaway database with ``--docs`` incident-like documents (with the
+incident_reports indexes from db_indexes), then for page numbers
+1, 10, 100, ... fetches that page
+
+  * with ``skip((N - 1) * limit).limit(limit)``, as the legacy list does, and
+  * with ``keyset_page`` from the cursor the previous page returned,
+
+and prints the median latency and the index keys each plan examined.
+skip/limit grows linearly with N; keyset stays flat.
+
+Needs a MongoDB it may write to (the database is dropped afterwards):
+
+    MONGO_URL=mongodb://localhost:27017 python benchmarks/bench_pagination.py [--docs 200000]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from motor.motor_asyncio import AsyncIOMotorClient  # noqa: E402
+
+from db_indexes import INDEXES  # noqa: E402
+from pagination import after_cursor, keyset_page  # noqa: E402
+
+STATUSES = ("submitted", "in_progress", "resolved")
+
+
+async def seed(collection, docs: int):
+    start = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    batch = []
+    for i in range(docs):
+        batch.append({
+            "id": str(uuid.uuid4()),
+            "incidentType": "flood",
+            "fullName": f"user{i % 500}",
+            "description": "x" * 200,
+            "timestamp": "",
+            "status": STATUSES[i % len(STATUSES)],
+            "priority": "high" if i % 5 == 0 else "medium",
+            # Several reports per second, so created_at ties are common
+            "created_at": start + timedelta(milliseconds=250 * i),
+        })
+        if len(batch) == 5000:
+            await collection.insert_many(batch)
+            batch = []
+    if batch:
+        await collection.insert_many(batch)
+    await collection.create_indexes(INDEXES["incident_reports"])
+
+
+async def cursors_for(collection, query, limit, pages):
+    """Cursor that starts each wanted page, found by walking the keyset pages once."""
+    wanted, cursors, cursor = set(pages), {1: ""}, ""
+    for page in range(1, max(pages)):
+        _, cursor = await keyset_page(collection, query, limit, cursor)
+        if cursor is None:
+            break
+        if page + 1 in wanted:
+            cursors[page + 1] = cursor
+    return cursors
+
+
+async def timed(fetch, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await fetch()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples) * 1000
+
+
+async def keys_examined(db, query, sort, skip, limit) -> int:
+    find = {"find": "incident_reports", "filter": query, "sort": sort, "skip": skip, "limit": limit}
+    explained = await db.command("explain", find, verbosity="executionStats")
+    return explained["executionStats"]["totalKeysExamined"]
+
+
+async def run(args):
+    client = AsyncIOMotorClient(args.mongo_url, tz_aware=True, tzinfo=timezone.utc)
+    db = client[f"bench_pagination_{uuid.uuid4().hex[:8]}"]
+    collection = db.incident_reports
+    sort = {"created_at": -1, "id": -1}
+    try:
+        print(f"seeding {args.docs} documents...")
+        await seed(collection, args.docs)
+
+        last_page = args.docs // args.limit
+        pages = [p for p in (1, 10, 100, 1000, 10000, 100000) if p <= last_page]
+        for label, query in (("all", {}), ("status=submitted", {"status": "submitted"})):
+            cursors = await cursors_for(collection, query, args.limit, pages)
+            print(f"\nfilter {label}, limit {args.limit}")
+            print(f"{'page':>8} {'skip ms':>10} {'keys':>10} {'keyset ms':>10} {'keys':>8}")
+            for page in pages:
+                if page not in cursors:
+                    continue
+                skip = (page - 1) * args.limit
+                cursor = cursors[page]
+
+                async def by_skip():
+                    await collection.find(query, {"_id": 0}).sort(list(sort.items())) \
+                        .skip(skip).limit(args.limit).to_list(args.limit)
+
+                async def by_cursor():
+                    await keyset_page(collection, query, args.limit, cursor)
+
+                keyset_query = {**query, **after_cursor(cursor)} if cursor else query
+                print(
+                    f"{page:>8} {await timed(by_skip, args.repeat):>10.2f} "
+                    f"{await keys_examined(db, query, sort, skip, args.limit):>10} "
+                    f"{await timed(by_cursor, args.repeat):>10.2f} "
+                    f"{await keys_examined(db, keyset_query, sort, 0, args.limit + 1):>8}"
+                )
+    finally:
+        await client.drop_database(db.name)
+        client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-url", default=os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    parser.add_argument("--docs", type=int, default=200000)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=5)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
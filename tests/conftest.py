@@ -0,0 +1,24 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# Backend modules import each other as top-level modules (e.g. ``from database import db``)
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+
+# The shared access log (used by apps importing server) must not write into the checkout
+os.environ.setdefault("ACCESS_LOG_PATH", os.path.join(tempfile.mkdtemp(prefix="access-log-"), "access.log"))
+
+import pytest  # noqa: E402
+
+
+@pytest.fixture
+def access_log(tmp_path):
+    """An AccessLog writing under tmp_path, for apps built with InstrumentationMiddleware."""
+    from access_log import AccessLog
+
+    log = AccessLog(path=str(tmp_path / "access.log"))
+    yield log
+    log.close()
@@ -0,0 +1,107 @@
+import json
+
+import pytest
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+
+from access_log import AccessLog
+from logging_config import InstrumentationMiddleware
+
+
+def _records(path):
+    if not path.exists():
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+class TestAccessLog:
+    def test_sampling_always_keeps_errors_and_slow_requests(self):
+        log = AccessLog(sample_rate=0.0, slow_threshold=0.5, error_status=500)
+        assert not log.should_log(200, 0.01)
+        assert log.should_log(503, 0.01)
+        assert log.should_log(200, 0.6)
+        assert AccessLog(sample_rate=1.0).should_log(200, 0.01)
+
+    def test_only_allowlisted_headers_are_kept(self):
+        log = AccessLog(headers=["User-Agent"])
+        scope = {"headers": [(b"user-agent", b"pwa"), (b"authorization", b"Bearer secret"), (b"cookie", b"c")]}
+        assert log.request_headers(scope) == {"user-agent": "pwa"}
+
+    def test_full_queue_drops_instead_of_blocking(self, tmp_path):
+        path = tmp_path / "access.log"
+        log = AccessLog(path=str(path), max_queue=2, batch_size=100, flush_interval=60)
+
+        assert log.log({"n": 1})
+        assert log.log({"n": 2})
+        assert not log.log({"n": 3})
+        assert log.status["dropped"] == 1
+        assert log.status["queue_depth"] == 2
+
+        log.close()
+        assert _records(path) == [{"n": 1}, {"n": 2}]
+        assert log.status == {"queue_depth": 0, "dropped": 1, "written": 2, "sample_rate": 1.0}
+
+    def test_records_are_compact_json_lines(self, tmp_path):
+        path = tmp_path / "access.log"
+        log = AccessLog(path=str(path))
+        log.log({"a": 1, "b": "x"})
+        log.close()
+        assert path.read_text() == '{"a":1,"b":"x"}\n'
+
+    def test_failed_write_counts_the_batch_as_dropped(self):
+        class BrokenStream:
+            def write(self, data):
+                raise OSError("disk full")
+
+        log = AccessLog(batch_size=2)
+        for n in range(3):
+            log._queue.append({"n": n})
+
+        log._flush(BrokenStream())
+
+        assert log.status["dropped"] == 3
+        assert log.status["written"] == 0
+        assert log.queue_depth == 0
+
+
+class TestMiddlewareAccessLogging:
+    def make_client(self, path, **kwargs):
+        app = FastAPI()
+
+        @app.get("/items/{item_id}")
+        async def get_item(item_id: str):
+            if item_id == "broken":
+                raise HTTPException(status_code=503, detail="down")
+            return {"id": item_id}
+
+        log = AccessLog(path=str(path), **kwargs)
+        app.add_middleware(InstrumentationMiddleware, access_log=log)
+        return TestClient(app), log
+
+    def test_one_record_per_request_with_route_and_allowlisted_headers(self, tmp_path):
+        path = tmp_path / "access.log"
+        client, log = self.make_client(path)
+
+        client.get("/items/a?verbose=1", headers={"X-Request-ID": "r1", "Authorization": "Bearer secret"})
+        log.close()
+
+        [record] = _records(path)
+        assert record["request_id"] == "r1"
+        assert record["route"] == "/items/{item_id}"
+        assert record["path"] == "/items/a"
+        assert record["query"] == "verbose=1"
+        assert record["status"] == 200
+        assert record["bytes"] == len(b'{"id":"a"}')
+        assert "authorization" not in record["headers"]
+        assert record["headers"]["user-agent"] == "testclient"
+
+    @pytest.mark.parametrize("item_id, logged", [("a", False), ("broken", True)])
+    def test_successful_requests_are_sampled_errors_are_not(self, tmp_path, item_id, logged):
+        path = tmp_path / "access.log"
+        client, log = self.make_client(path, sample_rate=0.0)
+
+        client.get(f"/items/{item_id}")
+        log.close()
+
+        assert len(_records(path)) == (1 if logged else 0)
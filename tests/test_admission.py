@@ -0,0 +1,133 @@
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from admission import (
+    ADMISSION_REJECTED,
+    AdmissionControlMiddleware,
+    AdmissionController,
+    Overloaded,
+    RouteClass,
+    default_concurrency,
+)
+
+
+def make_controller():
+    return AdmissionController({
+        "critical": RouteClass("critical", max_concurrency=4, max_queue=4, max_wait=1),
+        "normal": RouteClass("normal", max_concurrency=2, max_queue=2, max_wait=1, shed_lag=0.5),
+        "low": RouteClass("low", max_concurrency=1, max_queue=0, max_wait=1, shed_lag=0.2, retry_after=10),
+    })
+
+
+class TestClassification:
+    def test_routes_are_classified_by_priority(self):
+        controller = make_controller()
+        assert controller.classify("POST", "/api/incidents/").name == "critical"
+        assert controller.classify("GET", "/api/typhoons/active").name == "critical"
+        assert controller.classify("GET", "/api/incidents/").name == "normal"
+        assert controller.classify("GET", "/api/typhoons/abc").name == "normal"
+        assert controller.classify("GET", "/api/analytics/dashboard").name == "low"
+        assert controller.classify("POST", "/api/ai-chat").name == "low"
+        assert controller.classify("GET", "/readyz") is None
+
+    def test_disabled_controller_admits_everything(self):
+        controller = make_controller()
+        controller.enabled = False
+        assert controller.classify("GET", "/api/analytics/dashboard") is None
+
+
+class TestDefaultConcurrency:
+    @pytest.mark.parametrize("pool_size", [10, 50, 100, 237])
+    def test_class_limits_fit_in_the_pool(self, pool_size):
+        limits = default_concurrency(pool_size)
+        assert sum(limits.values()) <= pool_size
+        assert limits["critical"] > limits["normal"] > limits["low"] >= 1
+
+    def test_default_pool_is_split_by_priority(self):
+        assert default_concurrency(50) == {"critical": 30, "normal": 15, "low": 5}
+
+
+class TestRouteClass:
+    def test_queued_request_gets_the_released_slot(self):
+        route_class = RouteClass("test-queue", max_concurrency=1, max_queue=1, max_wait=1)
+
+        async def scenario():
+            await route_class.acquire()
+            waiting = asyncio.create_task(route_class.acquire())
+            await asyncio.sleep(0)
+            assert route_class.queued == 1
+            with pytest.raises(Overloaded) as rejected:
+                await route_class.acquire()
+            assert rejected.value.reason == "queue_full"
+
+            route_class.release()
+            await waiting
+            assert (route_class.in_flight, route_class.queued) == (1, 0)
+            route_class.release()
+
+        asyncio.run(scenario())
+        assert route_class.in_flight == 0
+
+    def test_waiting_too_long_is_shed(self):
+        route_class = RouteClass("test-timeout", max_concurrency=1, max_queue=5, max_wait=0.02)
+        rejected = ADMISSION_REJECTED.labels(route_class="test-timeout", reason="queue_timeout")
+
+        async def scenario():
+            await route_class.acquire()
+            with pytest.raises(Overloaded):
+                await route_class.acquire()
+
+        asyncio.run(scenario())
+        assert rejected._value.get() == 1
+        assert route_class.queued == 0
+
+    def test_loop_lag_sheds_low_priority_first(self, monkeypatch):
+        controller = make_controller()
+        monkeypatch.setattr("admission.loop_monitor", SimpleNamespace(last_lag=0.3))
+
+        async def scenario():
+            await controller.classes["critical"].acquire()
+            await controller.classes["normal"].acquire()
+            with pytest.raises(Overloaded) as rejected:
+                await controller.classes["low"].acquire()
+            return rejected.value.reason
+
+        assert asyncio.run(scenario()) == "loop_lag"
+
+
+class TestAdmissionMiddleware:
+    def test_overloaded_low_priority_gets_503_while_critical_is_served(self):
+        release = asyncio.Event()
+        app = FastAPI()
+
+        @app.post("/api/ai-chat")
+        async def chat():
+            await release.wait()
+            return {"reply": "ok"}
+
+        @app.get("/api/typhoons/active")
+        async def active():
+            return []
+
+        app.add_middleware(AdmissionControlMiddleware, controller=make_controller())
+
+        async def scenario():
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                first = asyncio.create_task(client.post("/api/ai-chat"))
+                await asyncio.sleep(0.01)
+                shed = await client.post("/api/ai-chat")
+                critical = await client.get("/api/typhoons/active")
+                release.set()
+                return shed, critical, await first
+
+        shed, critical, first = asyncio.run(scenario())
+        assert shed.status_code == 503
+        assert shed.headers["retry-after"] == "10"
+        assert shed.json()["reason"] == "queue_full"
+        assert critical.status_code == 200
+        assert first.status_code == 200
@@ -0,0 +1,68 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from pymongo.errors import ExecutionTimeout
+
+from analytics_routes import ANALYTICS_MAX_TIME_MS, router
+from auth import get_current_user
+from database import analytics_db, analytics_pool_size, db
+
+
+class FakeCursor:
+    def __init__(self, error=None):
+        self.error = error
+
+    async def to_list(self, length):
+        if self.error:
+            raise self.error
+        return []
+
+
+class FakeCollection:
+    def __init__(self, error=None):
+        self.error = error
+        self.find_kwargs = []
+
+    def find(self, query, projection=None, **kwargs):
+        self.find_kwargs.append(kwargs)
+        return FakeCursor(self.error)
+
+
+class FakeDatabase(dict):
+    def __init__(self, error=None):
+        super().__init__()
+        self.error = error
+
+    def __getattr__(self, name):
+        return self.setdefault(name, FakeCollection(self.error))
+
+
+def make_client():
+    app = FastAPI()
+    app.include_router(router)
+    app.dependency_overrides[get_current_user] = lambda: {"role": "admin"}
+    return TestClient(app)
+
+
+class TestAnalyticsConnection:
+    def test_reads_prefer_secondaries_on_their_own_pool(self):
+        client = analytics_db.client
+        assert client is not db.client
+        assert client.read_preference.mongos_mode == "secondaryPreferred"
+        assert client.options.pool_options.max_pool_size == analytics_pool_size()
+
+    def test_dashboard_queries_carry_time_limits(self, monkeypatch):
+        fake = FakeDatabase()
+        monkeypatch.setattr("analytics_routes.analytics_db", fake)
+
+        response = make_client().get("/api/analytics/dashboard")
+
+        assert response.status_code == 200
+        assert fake["incident_reports"].find_kwargs == [{"max_time_ms": ANALYTICS_MAX_TIME_MS, "allow_disk_use": False}]
+
+    def test_timed_out_query_is_a_503(self, monkeypatch):
+        monkeypatch.setattr("analytics_routes.analytics_db", FakeDatabase(ExecutionTimeout("operation exceeded time limit")))
+
+        response = make_client().get("/api/analytics/incidents")
+
+        assert response.status_code == 503
+        assert response.headers["retry-after"] == "30"
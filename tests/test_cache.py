@@ -0,0 +1,824 @@
+import asyncio
+import os
+import time
+import tracemalloc
+
+import pytest
+
+from cache import (
+    APICache,
+    SingleFlight,
+    cached,
+    estimate_size,
+    invalidate_cache,
+    invalidate_cache_async,
+    l2_dumps,
+    short_cache,
+    medium_cache,
+)
+from cache_backends import CacheBackend, InMemoryBackend
+from response_cache import EncodedResponse
+
+
+class FakeTimer:
+    """Manually advanced clock for TTL tests."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+class TestTagIndex:
+    def test_invalidate_prefix_removes_keys_built_by_make_key(self):
+        cache = APICache(maxsize=100, ttl=60)
+        typhoons_key = cache._make_key("typhoons", status="active")
+        incidents_key = cache._make_key("incidents", skip=0)
+        cache.set(typhoons_key, ["t1"], tags=["typhoons"])
+        cache.set(incidents_key, ["i1"], tags=["incidents"])
+
+        assert cache.invalidate_prefix("typhoons") == 1
+
+        assert cache.get(typhoons_key) is None
+        assert cache.get(incidents_key) == ["i1"]
+
+    def test_extra_tags_invalidate_only_matching_entries(self):
+        cache = APICache(maxsize=100, ttl=60)
+        cache.set("typhoon:a", {"id": "a"}, tags=["typhoon_detail", "typhoon:a"])
+        cache.set("typhoon:b", {"id": "b"}, tags=["typhoon_detail", "typhoon:b"])
+
+        assert cache.invalidate_tag("typhoon:a") == 1
+
+        assert cache.get("typhoon:a") is None
+        assert cache.get("typhoon:b") == {"id": "b"}
+        assert cache._tags["typhoon_detail"] == {"typhoon:b"}
+        assert "typhoon:a" not in cache._tags
+
+    def test_reset_replaces_previous_tags(self):
+        cache = APICache(maxsize=100, ttl=60)
+        cache.set("k", 1, tags=["old"])
+        cache.set("k", 2, tags=["new"])
+
+        assert cache.invalidate_tag("old") == 0
+        assert cache.get("k") == 2
+        assert cache.invalidate_tag("new") == 1
+
+    def test_index_cleaned_on_ttl_expiry(self):
+        timer = FakeTimer()
+        cache = APICache(maxsize=100, ttl=10, timer=timer)
+        for i in range(50):
+            cache.set(f"k{i}", i, tags=["bulk", f"item:{i}"])
+
+        timer.advance(11)
+        cache.set("fresh", 1, tags=["other"])
+
+        assert "bulk" not in cache._tags
+        assert set(cache._key_tags) == {"fresh"}
+        assert cache.stats["tags"] == 1
+
+    def test_index_cleaned_on_eviction(self):
+        cache = APICache(maxsize=10, ttl=60)
+        for i in range(1000):
+            cache.set(f"k{i}", i, tags=["bulk", f"item:{i}"])
+
+        assert len(cache._key_tags) == 10
+        assert len(cache._tags["bulk"]) == 10
+        # one per-item tag per live key plus the shared prefix tag
+        assert len(cache._tags) == 11
+
+    def test_delete_and_clear_drop_index(self):
+        cache = APICache(maxsize=100, ttl=60)
+        cache.set("a", 1, tags=["x"])
+        cache.set("b", 2, tags=["x"])
+        cache.delete("a")
+        assert cache._tags["x"] == {"b"}
+
+        cache.clear()
+        assert cache._tags == {}
+        assert cache._key_tags == {}
+
+
+class TestMemoryBudget:
+    def test_byte_budget_evicts_least_recently_used(self):
+        blob = "x" * 1000
+        cache = APICache(maxsize=100, ttl=60, max_bytes=estimate_size(blob) * 3)
+        for key in "abc":
+            cache.set(key, blob)
+        cache.get("a")
+
+        cache.set("d", blob)
+
+        assert cache.get("b") is None
+        assert cache.get("a") == blob
+        stats = cache.stats
+        assert stats["size"] == 3
+        assert stats["bytes"] <= stats["max_bytes"]
+        assert stats["evictions"] == 1
+        assert stats["evicted_bytes"] == estimate_size(blob)
+
+    def test_eviction_keeps_tag_index_in_sync(self):
+        blob = "x" * 1000
+        cache = APICache(maxsize=100, ttl=60, max_bytes=estimate_size(blob) * 2)
+        cache.set("a", blob, tags=["typhoons"])
+        cache.set("b", blob, tags=["incidents"])
+        cache.set("c", blob, tags=["incidents"])
+
+        assert cache.invalidate_tag("typhoons") == 0
+        assert cache.stats["tags"] == 1
+
+    def test_oversized_value_is_rejected_not_flushing_cache(self):
+        cache = APICache(maxsize=100, ttl=60, max_bytes=10_000)
+        cache.set("small", "x")
+        cache.set("huge", "x" * 20_000)
+
+        assert cache.get("huge") is None
+        assert cache.get("small") == "x"
+        assert cache.stats["rejected"] == 1
+
+    def test_entry_count_limit_still_applies(self):
+        cache = APICache(maxsize=2, ttl=60, max_bytes=10_000_000)
+        for key in "abc":
+            cache.set(key, key)
+        assert cache.stats["size"] == 2
+        assert cache.get("a") is None
+
+    def test_encoded_responses_are_weighed_by_their_variants(self):
+        response = EncodedResponse(b"[" + b"1," * 1000 + b"1]")
+        assert estimate_size(response) >= response.size
+        cache = APICache(maxsize=10, ttl=60)
+        cache.set("r", response)
+        assert cache.stats["bytes"] == estimate_size(response)
+
+    def test_nested_values_count_shared_objects_once(self):
+        shared = "y" * 1000
+        assert estimate_size([shared, shared]) < 2 * estimate_size(shared)
+        assert estimate_size({"a": [shared]}) > estimate_size(shared)
+
+
+class TestCacheMetrics:
+    def test_lookups_are_counted_per_prefix(self):
+        timer = FakeTimer()
+        cache = APICache(maxsize=100, ttl=60, timer=timer)
+
+        @cached(cache=cache, prefix="typhoons", refresh_after=10)
+        async def load_typhoons():
+            return ["t1"]
+
+        @cached(cache=cache, prefix="incidents")
+        async def load_incidents():
+            return ["i1"]
+
+        async def scenario():
+            await load_typhoons()
+            await load_typhoons()
+            timer.advance(15)
+            await load_typhoons()
+            await load_incidents()
+
+        asyncio.run(scenario())
+        prefixes = cache.stats["prefixes"]
+        assert prefixes["typhoons"]["misses"] == 1
+        assert prefixes["typhoons"]["hits"] == 1
+        assert prefixes["typhoons"]["stale_hits"] == 1
+        assert prefixes["typhoons"]["hit_ratio"] == round(2 / 3, 4)
+        assert prefixes["incidents"]["misses"] == 1
+        assert prefixes["incidents"]["loads"] == 1
+        assert cache.stats["hit_ratio"] == 0.5
+
+    def test_coalesced_waiters_are_counted(self):
+        cache = APICache(maxsize=100, ttl=60)
+
+        @cached(cache=cache, prefix="slow")
+        async def load(gate):
+            await gate.wait()
+            return "v"
+
+        async def scenario():
+            gate = asyncio.Event()
+            calls = [asyncio.ensure_future(load(gate)) for _ in range(5)]
+            await asyncio.sleep(0)
+            gate.set()
+            await asyncio.gather(*calls)
+
+        asyncio.run(scenario())
+        assert cache.metrics["slow"].misses == 5
+        assert cache.metrics["slow"].coalesced == 4
+        assert cache.metrics["slow"].load_count == 1
+
+    def test_evictions_and_expirations_are_attributed_to_prefix(self):
+        timer = FakeTimer()
+        cache = APICache(maxsize=2, ttl=60, timer=timer)
+        cache.set("typhoons:a", 1)
+        cache.set("typhoons:b", 2)
+        cache.set("incidents:c", 3)
+        timer.advance(61)
+
+        stats = cache.stats["prefixes"]
+        assert stats["typhoons"]["evictions"] == 1
+        assert stats["typhoons"]["expirations"] == 1
+        assert stats["incidents"]["expirations"] == 1
+        assert cache.stats["expirations"] == 2
+
+    def test_loader_latency_histogram(self):
+        cache = APICache(maxsize=100, ttl=60)
+        cache.prefix_stats("x").observe_load(0.003)
+        cache.prefix_stats("x").observe_load(0.2)
+        cache.prefix_stats("x").observe_load(60)
+
+        stats = cache.metrics["x"]
+        assert stats.load_count == 3
+        assert stats.load_buckets[0] == 1
+        assert stats.load_buckets[-1] == 1
+        assert sum(stats.load_buckets) == 3
+
+    def test_prometheus_collector_exports_cumulative_buckets(self):
+        from logging_config import CacheMetricsCollector
+
+        cache = APICache(maxsize=100, ttl=60, name="probe")
+        cache.set("typhoons:a", 1)
+        cache.get("typhoons:a")
+        cache.get("typhoons:missing")
+        cache.prefix_stats("typhoons").observe_load(0.003)
+        cache.prefix_stats("typhoons").observe_load(0.2)
+
+        families = {family.name: family for family in CacheMetricsCollector([cache]).collect()}
+        lookups = {
+            sample.labels["result"]: sample.value
+            for sample in families["api_cache_lookups"].samples
+            if sample.name == "api_cache_lookups_total"
+        }
+        assert lookups == {"hit": 1, "stale": 0, "negative": 0, "miss": 1}
+        buckets = [
+            sample.value
+            for sample in families["api_cache_load_duration_seconds"].samples
+            if sample.name.endswith("_bucket")
+        ]
+        assert buckets == sorted(buckets)
+        assert buckets[-1] == 2
+
+
+class TestNegativeCaching:
+    def _loader(self, cache, db):
+        lookups = []
+
+        @cached(
+            cache=cache,
+            prefix="typhoon_detail",
+            tags=lambda typhoon_id: [f"typhoon:{typhoon_id}"],
+            negative_ttl=10,
+        )
+        async def load(typhoon_id):
+            lookups.append(typhoon_id)
+            return db.get(typhoon_id)
+
+        return load, lookups
+
+    def test_not_found_is_cached_for_negative_ttl(self):
+        timer = FakeTimer()
+        cache = APICache(maxsize=100, ttl=60, timer=timer)
+        load, lookups = self._loader(cache, {})
+
+        async def scenario():
+            assert await load("gone") is None
+            assert await load("gone") is None
+            timer.advance(11)
+            assert await load("gone") is None
+
+        asyncio.run(scenario())
+        assert lookups == ["gone", "gone"]
+        stats = cache.stats["prefixes"]["typhoon_detail"]
+        assert stats["negative_hits"] == 1
+        assert stats["hits"] == 0
+        assert stats["misses"] == 2
+
+    def test_create_invalidates_negative_entry(self):
+        cache = APICache(maxsize=100, ttl=60)
+        db = {}
+        load, lookups = self._loader(cache, db)
+
+        async def scenario():
+            assert await load("t1") is None
+            db["t1"] = {"id": "t1"}
+            await invalidate_cache_async("typhoon:t1", cache=cache)
+            assert await load("t1") == {"id": "t1"}
+            assert await load("t1") == {"id": "t1"}
+
+        asyncio.run(scenario())
+        assert lookups == ["t1", "t1"]
+        assert cache.stats["prefixes"]["typhoon_detail"]["hits"] == 1
+
+    def test_negative_entries_stay_out_of_l2(self):
+        backend = InMemoryBackend()
+        cache = APICache(maxsize=100, ttl=60, backend=backend)
+        load, _ = self._loader(cache, {})
+
+        asyncio.run(load("gone"))
+        assert backend._data == {}
+
+    def test_none_is_not_cached_without_negative_ttl(self):
+        cache = APICache(maxsize=100, ttl=60)
+        lookups = []
+
+        @cached(cache=cache, prefix="typhoon_detail")
+        async def load(typhoon_id):
+            lookups.append(typhoon_id)
+            return None
+
+        async def scenario():
+            await load("gone")
+            await load("gone")
+
+        asyncio.run(scenario())
+        assert len(lookups) == 2
+
+
+class TestCachedDecorator:
+    def test_invalidate_cache_evicts_decorated_results(self):
+        cache = APICache(maxsize=100, ttl=60)
+        calls = []
+
+        @cached(cache=cache, prefix="typhoons", tags=lambda typhoon_id: [f"typhoon:{typhoon_id}"])
+        async def load(typhoon_id):
+            calls.append(typhoon_id)
+            return {"id": typhoon_id}
+
+        async def scenario():
+            await load("a")
+            await load("a")
+            await load("b")
+            invalidate_cache("typhoon:a", cache=cache)
+            await load("a")
+            await load("b")
+            load.invalidate()
+            await load("b")
+
+        asyncio.run(scenario())
+        assert calls == ["a", "b", "a", "b"]
+
+    def test_invalidate_cache_defaults_to_all_global_caches(self):
+        short_cache.set("s", 1, tags=["shared"])
+        medium_cache.set("m", 2, tags=["shared"])
+        try:
+            assert invalidate_cache("shared") == 2
+            assert short_cache.get("s") is None
+            assert medium_cache.get("m") is None
+        finally:
+            short_cache.clear()
+            medium_cache.clear()
+
+
+class TestStaleWhileRevalidate:
+    def test_stale_value_served_while_single_refresh_runs(self):
+        timer = FakeTimer()
+        cache = APICache(maxsize=100, ttl=60, timer=timer)
+        calls = []
+        release = None
+
+        @cached(cache=cache, prefix="active", refresh_after=10)
+        async def load():
+            calls.append(len(calls))
+            if len(calls) > 1:
+                await release.wait()
+            return len(calls)
+
+        async def scenario():
+            nonlocal release
+            release = asyncio.Event()
+            assert await load() == 1
+
+            timer.advance(15)
+            # All stale readers get the old value immediately; only one refresh starts
+            results = await asyncio.gather(*(load() for _ in range(20)))
+            assert results == [1] * 20
+            assert len(cache._refreshing) == 1
+
+            release.set()
+            await asyncio.sleep(0)
+            await asyncio.sleep(0)
+            assert await load() == 2
+
+        asyncio.run(scenario())
+        assert len(calls) == 2
+        stats = cache.stats
+        assert stats["stale_hits"] == 20
+        assert stats["refreshes"] == 1
+        assert stats["refreshing"] == 0
+
+    def test_hard_stale_cutoff_blocks_on_reload(self):
+        timer = FakeTimer()
+        cache = APICache(maxsize=100, ttl=60, timer=timer)
+        calls = []
+
+        @cached(cache=cache, prefix="active", refresh_after=10, max_stale=30)
+        async def load():
+            calls.append(1)
+            return len(calls)
+
+        async def scenario():
+            assert await load() == 1
+            timer.advance(31)
+            assert await load() == 2
+
+        asyncio.run(scenario())
+        assert cache.stats["stale_hits"] == 0
+
+    def test_failed_refresh_keeps_stale_value_and_backs_off(self):
+        timer = FakeTimer()
+        cache = APICache(maxsize=100, ttl=600, timer=timer)
+        attempts = []
+
+        @cached(cache=cache, prefix="active", refresh_after=10, error_backoff=5)
+        async def load():
+            attempts.append(1)
+            if len(attempts) > 1:
+                raise RuntimeError("mongo down")
+            return "v1"
+
+        async def drain():
+            while cache._refreshing:
+                await asyncio.sleep(0)
+
+        async def scenario():
+            assert await load() == "v1"
+            timer.advance(11)
+            assert await load() == "v1"
+            await drain()
+            assert len(attempts) == 2
+
+            # Within the backoff window no new refresh is attempted
+            timer.advance(4)
+            assert await load() == "v1"
+            await drain()
+            assert len(attempts) == 2
+
+            # After the backoff a retry happens, then the window doubles
+            timer.advance(2)
+            assert await load() == "v1"
+            await drain()
+            assert len(attempts) == 3
+            timer.advance(9)
+            assert await load() == "v1"
+            await drain()
+            assert len(attempts) == 3
+
+        asyncio.run(scenario())
+        assert cache.stats["refresh_failures"] == 2
+
+    def test_invalidation_during_refresh_discards_result(self):
+        timer = FakeTimer()
+        cache = APICache(maxsize=100, ttl=60, timer=timer)
+        release = None
+        version = 0
+
+        @cached(cache=cache, prefix="active", refresh_after=10)
+        async def load():
+            nonlocal version
+            version += 1
+            loaded = version
+            if loaded > 1:
+                await release.wait()
+            return loaded
+
+        async def scenario():
+            nonlocal release
+            release = asyncio.Event()
+            await load()
+            timer.advance(11)
+            await load()
+            invalidate_cache("active", cache=cache)
+            release.set()
+            while cache._refreshing:
+                await asyncio.sleep(0)
+            assert cache.get_entry(cache._make_key("active")) is None
+
+        asyncio.run(scenario())
+
+
+    def test_unrelated_invalidation_does_not_discard_a_load(self):
+        cache = APICache(maxsize=100, ttl=60)
+        release = None
+        calls = []
+
+        @cached(cache=cache, prefix="active_typhoons")
+        async def load():
+            calls.append(1)
+            await release.wait()
+            return "typhoons"
+
+        async def scenario():
+            nonlocal release
+            release = asyncio.Event()
+            loading = asyncio.create_task(load())
+            await asyncio.sleep(0)
+            # A stream of incident writes must not keep the typhoon feed uncached
+            cache.invalidate_tag("incidents")
+            cache.invalidate_tag("incident:42")
+            release.set()
+            await loading
+            assert await load() == "typhoons"
+
+        asyncio.run(scenario())
+        assert len(calls) == 1
+
+    def test_forgotten_tag_marks_discard_older_loads(self, monkeypatch):
+        monkeypatch.setattr("cache.MAX_TAG_MARKS", 2)
+        cache = APICache(maxsize=100, ttl=60)
+        mark = cache.invalidation_mark()
+        cache.invalidate_tag("a")
+        for tag in ("b", "c"):
+            cache.invalidate_tag(tag)
+        # "a" was pruned; a load started before it can no longer prove it is unaffected
+        assert cache.invalidated_since(("a",), mark)
+        assert not cache.invalidated_since(("a",), cache.invalidation_mark())
+
+
+class TestSingleFlight:
+    def test_concurrent_misses_share_one_load(self):
+        cache = APICache(maxsize=100, ttl=60)
+        calls = []
+
+        @cached(cache=cache, prefix="incidents")
+        async def load(page):
+            calls.append(page)
+            await asyncio.sleep(0.01)
+            return [page]
+
+        async def scenario():
+            results = await asyncio.gather(*(load(1) for _ in range(50)))
+            assert all(r == [1] for r in results)
+            assert len(cache._flights) == 0
+
+        asyncio.run(scenario())
+        assert calls == [1]
+        assert cache.stats["coalesced"] == 49
+
+    def test_exception_reaches_all_waiters_and_is_not_cached(self):
+        cache = APICache(maxsize=100, ttl=60)
+        calls = []
+
+        @cached(cache=cache, prefix="incidents")
+        async def load():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            if len(calls) == 1:
+                raise RuntimeError("mongo down")
+            return "ok"
+
+        async def scenario():
+            results = await asyncio.gather(*(load() for _ in range(10)), return_exceptions=True)
+            assert all(isinstance(r, RuntimeError) for r in results)
+            assert len(cache._flights) == 0
+            assert await load() == "ok"
+
+        asyncio.run(scenario())
+        assert len(calls) == 2
+
+    def test_cancelled_caller_does_not_cancel_shared_load(self):
+        flights = SingleFlight()
+
+        async def slow():
+            await asyncio.sleep(0.01)
+            return "done"
+
+        async def scenario():
+            first = asyncio.ensure_future(flights.do("k", slow))
+            second = asyncio.ensure_future(flights.do("k", slow))
+            await asyncio.sleep(0)
+            first.cancel()
+            assert await second == "done"
+            assert len(flights) == 0
+
+        asyncio.run(scenario())
+
+    def test_memory_constant_over_many_distinct_keys(self):
+        cache = APICache(maxsize=100, ttl=60)
+
+        @cached(cache=cache, prefix="incidents")
+        async def load(skip, limit, status):
+            return [skip]
+
+        async def run(start, count):
+            for i in range(start, start + count):
+                await load(i, 100, "submitted")
+
+        asyncio.run(run(0, 2_000))
+        tracemalloc.start()
+        try:
+            baseline, _ = tracemalloc.get_traced_memory()
+            asyncio.run(run(2_000, 20_000))
+            current, _ = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        assert len(cache._flights) == 0
+        assert len(cache._key_tags) <= 100
+        # 20k distinct keys must not leave per-key state behind
+        assert current - baseline < 128 * 1024
+
+    @pytest.mark.skipif(not os.environ.get("RUN_SLOW_TESTS"), reason="set RUN_SLOW_TESTS=1 to run")
+    def test_million_distinct_keys_leave_no_inflight_state(self):
+        flights = SingleFlight()
+
+        async def load():
+            return None
+
+        async def scenario():
+            for i in range(1_000_000):
+                await flights.do(str(i), load)
+                assert len(flights) == 0
+
+        asyncio.run(scenario())
+
+
+class FailingBackend(CacheBackend):
+    name = "failing"
+
+    async def get(self, key):
+        raise ConnectionError("redis unreachable")
+
+    async def set(self, key, value, ttl, tags=()):
+        raise ConnectionError("redis unreachable")
+
+    async def invalidate_tag(self, tag):
+        raise ConnectionError("redis unreachable")
+
+
+class TestSharedL2:
+    def _workers(self, backend, loads):
+        """Two caches sharing one backend, like two uvicorn workers sharing Redis."""
+        workers = []
+        for _ in range(2):
+            cache = APICache(maxsize=100, ttl=60, name="short", backend=backend)
+
+            @cached(cache=cache, prefix="active_typhoons")
+            async def load():
+                loads.append(1)
+                return [{"id": "t1", "name": f"v{len(loads)}"}]
+
+            workers.append((cache, load))
+        return workers
+
+    def test_second_worker_reads_from_l2(self):
+        backend = InMemoryBackend()
+        loads = []
+        (cache_a, load_a), (cache_b, load_b) = self._workers(backend, loads)
+
+        async def scenario():
+            assert await load_a() == [{"id": "t1", "name": "v1"}]
+            assert await load_b() == [{"id": "t1", "name": "v1"}]
+            # now served from worker B's own L1
+            assert await load_b() == [{"id": "t1", "name": "v1"}]
+
+        asyncio.run(scenario())
+        assert len(loads) == 1
+        assert cache_b.stats["l2_hits"] == 1
+        assert cache_b.stats["l2"] == "memory"
+
+    def test_invalidation_reaches_l2(self):
+        backend = InMemoryBackend()
+        loads = []
+        (cache_a, load_a), (cache_b, load_b) = self._workers(backend, loads)
+
+        async def scenario():
+            await load_a()
+            await invalidate_cache_async("active_typhoons", cache=cache_a)
+            assert await load_b() == [{"id": "t1", "name": "v2"}]
+
+        asyncio.run(scenario())
+        assert len(loads) == 2
+
+    def test_l2_entry_older_than_a_local_invalidation_is_not_reused(self):
+        backend = InMemoryBackend()
+        loads = []
+        (cache_a, load_a), (cache_b, load_b) = self._workers(backend, loads)
+
+        async def scenario():
+            await load_a()
+            # Worker B hears about the write before the writer has cleared L2
+            cache_b.invalidate_tag("active_typhoons")
+            assert await load_b() == [{"id": "t1", "name": "v2"}]
+            # ... and its fresh load replaces the stale entry for everyone else
+            cache_c = APICache(maxsize=100, ttl=60, name="short", backend=backend)
+            assert (await cache_c._l2_get(cache_b._make_key("active_typhoons")))[0] == [{"id": "t1", "name": "v2"}]
+
+        asyncio.run(scenario())
+        assert len(loads) == 2
+        assert cache_b.stats["l2_hits"] == 0
+
+    def test_l2_entry_newer_than_a_local_invalidation_is_reused(self):
+        backend = InMemoryBackend()
+        cache = APICache(maxsize=100, ttl=60, name="short", backend=backend)
+
+        async def scenario():
+            cache.invalidate_tag("incidents")
+            await backend.set("short:k", l2_dumps(["fresh"], time.time() + 1, ("incidents",)), ttl=60)
+            return await cache._l2_get("k")
+
+        assert asyncio.run(scenario())[0] == ["fresh"]
+
+    def test_l2_tags_survive_round_trip(self):
+        backend = InMemoryBackend()
+        cache_a = APICache(maxsize=100, ttl=60, name="short", backend=backend)
+        cache_b = APICache(maxsize=100, ttl=60, name="short", backend=backend)
+
+        def make(cache):
+            @cached(cache=cache, prefix="typhoon", tags=lambda typhoon_id: [f"typhoon:{typhoon_id}"])
+            async def load(typhoon_id):
+                return {"id": typhoon_id}
+            return load
+
+        async def scenario():
+            await make(cache_a)("t1")
+            await make(cache_b)("t1")
+            # worker B indexed the entry it pulled from L2 under the same tags
+            assert cache_b.invalidate_tag("typhoon:t1") == 1
+
+        asyncio.run(scenario())
+
+    def test_clear_async_only_touches_own_namespace(self):
+        backend = InMemoryBackend()
+        short = APICache(maxsize=100, ttl=60, name="short", backend=backend)
+        medium = APICache(maxsize=100, ttl=60, name="medium", backend=backend)
+
+        async def scenario():
+            await short._l2_set("k", 1, ("p",))
+            await medium._l2_set("k", 2, ("p",))
+            await short.clear_async()
+            assert await short._l2_get("k") is None
+            assert (await medium._l2_get("k"))[0] == 2
+
+        asyncio.run(scenario())
+
+    def test_backend_errors_fall_back_to_loader(self):
+        cache = APICache(maxsize=100, ttl=60, backend=FailingBackend())
+        loads = []
+
+        @cached(cache=cache, prefix="incidents")
+        async def load():
+            loads.append(1)
+            return ["ok"]
+
+        async def scenario():
+            assert await load() == ["ok"]
+            assert await load() == ["ok"]
+            await invalidate_cache_async("incidents", cache=cache)
+
+        asyncio.run(scenario())
+        assert len(loads) == 1
+        assert cache.stats["l2_errors"] == 3
+
+    def test_sync_invalidate_schedules_l2_invalidation(self):
+        backend = InMemoryBackend()
+        cache = APICache(maxsize=100, ttl=60, backend=backend)
+
+        async def scenario():
+            await cache._l2_set("incidents:x", ["old"], ("incidents",))
+            invalidate_cache("incidents", cache=cache)
+            await asyncio.sleep(0)
+            await asyncio.sleep(0)
+            assert await cache._l2_get("incidents:x") is None
+
+        asyncio.run(scenario())
+
+    def test_encoded_responses_round_trip_as_data(self):
+        backend = InMemoryBackend()
+        cache = APICache(maxsize=100, ttl=60, name="short", backend=backend)
+        encoded = EncodedResponse(b'{"typhoons": "' + b"x" * 1000 + b'"}')
+
+        async def scenario():
+            await cache._l2_set("typhoons:x", encoded, ("typhoons",))
+            return await cache._l2_get("typhoons:x")
+
+        value, _, tags = asyncio.run(scenario())
+        assert (value.body, value.gzip, value.etag) == (encoded.body, encoded.gzip, encoded.etag)
+        assert tags == ("typhoons",)
+
+    def test_pickled_payloads_are_never_unpickled(self):
+        import pickle
+
+        class Exploit:
+            def __reduce__(self):
+                return (exec, ("raise SystemExit('unpickled')",))
+
+        backend = InMemoryBackend()
+        cache = APICache(maxsize=100, ttl=60, name="short", backend=backend)
+
+        async def scenario():
+            await backend.set("short:k", pickle.dumps((Exploit(), 0.0, ())), ttl=60)
+            return await cache._l2_get("k")
+
+        assert asyncio.run(scenario()) is None
+        assert cache.stats["l2_errors"] == 1
+
+
+class TestClearEndpoint:
+    def test_requires_admin(self):
+        from fastapi.testclient import TestClient
+        from backend.server import app
+
+        response = TestClient(app).post("/api/cache/clear")
+        assert response.status_code == 403
@@ -0,0 +1,152 @@
+import asyncio
+import os
+import time
+import uuid
+
+import pytest
+
+from cache import APICache, cached
+from cache_backends import RedisBackend
+
+REDIS_TEST_URL = os.environ.get("REDIS_TEST_URL")
+
+needs_redis = pytest.mark.skipif(not REDIS_TEST_URL, reason="set REDIS_TEST_URL to a disposable Redis")
+
+
+def run_with_backend(scenario):
+    """Run ``scenario(backend)`` against a fresh namespace, removed afterwards."""
+    async def wrapper():
+        backend = RedisBackend(REDIS_TEST_URL, namespace=f"apicache_test_{uuid.uuid4().hex[:8]}")
+        try:
+            return await scenario(backend)
+        finally:
+            await backend.clear()
+            await backend.close()
+
+    return asyncio.run(wrapper())
+
+
+@needs_redis
+class TestRedisBackend:
+    def test_set_get_delete_round_trip(self):
+        async def scenario(backend):
+            await backend.set("k", b"\x00value", ttl=60, tags=["t"])
+            assert await backend.get("k") == b"\x00value"
+            assert await backend.get("missing") is None
+            await backend.delete("k")
+            assert await backend.get("k") is None
+
+        run_with_backend(scenario)
+
+    def test_keys_and_tag_sets_expire(self):
+        async def scenario(backend):
+            await backend.set("k", b"v", ttl=0.05, tags=["t"])
+            await asyncio.sleep(0.15)
+            assert await backend.get("k") is None
+            assert not await backend._redis.exists(backend._tag_key("t"))
+
+        run_with_backend(scenario)
+
+    def test_invalidate_tag_removes_only_its_keys_and_the_set(self):
+        async def scenario(backend):
+            await backend.set("a", b"1", ttl=60, tags=["t", "all"])
+            await backend.set("b", b"2", ttl=60, tags=["t", "all"])
+            await backend.set("c", b"3", ttl=60, tags=["other", "all"])
+
+            assert await backend.invalidate_tag("t") == 2
+            assert await backend.get("a") is None
+            assert await backend.get("b") is None
+            assert await backend.get("c") == b"3"
+            assert not await backend._redis.exists(backend._tag_key("t"))
+            assert await backend.invalidate_tag("t") == 0
+
+        run_with_backend(scenario)
+
+    def test_tag_set_outlives_its_longest_member(self):
+        async def scenario(backend):
+            await backend.set("long", b"1", ttl=60, tags=["t"])
+            await backend.set("short", b"2", ttl=0.05, tags=["t"])
+            await asyncio.sleep(0.15)
+            assert await backend._redis.pttl(backend._tag_key("t")) > 50000
+            assert await backend.invalidate_tag("t") == 2
+            assert await backend.get("long") is None
+
+        run_with_backend(scenario)
+
+    def test_writes_prune_expired_tag_members(self):
+        async def scenario(backend):
+            for i in range(2):
+                await backend.set(f"old{i}", b"x", ttl=0.05, tags=["t"])
+            await asyncio.sleep(0.15)
+            await backend.set("new", b"y", ttl=60, tags=["t"])
+            members = await backend._redis.smembers(backend._tag_key("t"))
+            # Each write samples 3 members, so with 3 in the set every expired one is found
+            assert members == {backend._key("new").encode()}
+
+        run_with_backend(scenario)
+
+    def test_clear_only_touches_own_namespace(self):
+        async def scenario(backend):
+            neighbour = RedisBackend(REDIS_TEST_URL, namespace=f"apicache_test_{uuid.uuid4().hex[:8]}")
+            try:
+                await backend.set("k", b"1", ttl=60, tags=["t"])
+                await neighbour.set("k", b"2", ttl=60, tags=["t"])
+                await backend.clear()
+                assert await backend.get("k") is None
+                assert await neighbour.get("k") == b"2"
+            finally:
+                await neighbour.clear()
+                await neighbour.close()
+
+        run_with_backend(scenario)
+
+    def test_workers_share_values_and_invalidations(self):
+        async def scenario(backend):
+            loads = []
+            workers = []
+            for _ in range(2):
+                cache = APICache(maxsize=100, ttl=60, name="short", backend=backend)
+
+                @cached(cache=cache, prefix="active_typhoons")
+                async def load():
+                    loads.append(1)
+                    return [{"id": "t1", "version": len(loads)}]
+
+                workers.append((cache, load))
+            (cache_a, load_a), (cache_b, load_b) = workers
+
+            assert await load_a() == await load_b() == [{"id": "t1", "version": 1}]
+            assert cache_b.stats["l2_hits"] == 1
+            await cache_a.invalidate_tag_async("active_typhoons")
+            cache_b.invalidate_tag("active_typhoons")
+            assert await load_b() == [{"id": "t1", "version": 2}]
+
+        run_with_backend(scenario)
+
+
+class TestRedisOutage:
+    def test_unreachable_redis_falls_back_to_l1(self):
+        loads = []
+
+        async def scenario():
+            # Nothing listens on port 1, so every L2 call fails fast
+            backend = RedisBackend("redis://127.0.0.1:1/0", socket_connect_timeout=0.2)
+            cache = APICache(maxsize=100, ttl=60, name="outage", backend=backend)
+
+            @cached(cache=cache, prefix="typhoons")
+            async def load():
+                loads.append(1)
+                return ["t1"]
+
+            started = time.perf_counter()
+            assert await load() == ["t1"]
+            assert await load() == ["t1"]
+            assert await cache.invalidate_tag_async("typhoons") == 1
+            elapsed = time.perf_counter() - started
+            await backend.close()
+            return cache.stats, elapsed
+
+        stats, elapsed = asyncio.run(scenario())
+        assert len(loads) == 1
+        assert stats["l2_errors"] >= 2
+        assert elapsed < 5
@@ -0,0 +1,192 @@
+import asyncio
+import os
+import uuid
+
+import pytest
+from pymongo.errors import AutoReconnect, OperationFailure
+
+from cache_invalidation import CacheInvalidationSubscriber, tags_for_change
+
+
+class FakeStream:
+    def __init__(self, events, error=None):
+        self._events = list(events)
+        self._error = error
+        self.resume_token = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._events:
+            event = self._events.pop(0)
+            self.resume_token = event["_id"]
+            return event
+        if self._error is not None:
+            raise self._error
+        # Block like an idle change stream
+        await asyncio.Event().wait()
+
+
+class FakeDatabase:
+    def __init__(self, streams):
+        self._streams = list(streams)
+        self.watch_calls = []
+
+    def watch(self, pipeline, **kwargs):
+        self.watch_calls.append(kwargs)
+        stream = self._streams.pop(0)
+        if isinstance(stream, Exception):
+            raise stream
+        return stream
+
+
+def _event(token, coll, op="update", doc=None):
+    event = {"_id": {"_data": token}, "operationType": op, "ns": {"db": "test", "coll": coll}}
+    if doc is not None:
+        event["fullDocument"] = doc
+    return event
+
+
+class TestTagsForChange:
+    def test_typhoon_update_maps_to_list_and_detail_tags(self):
+        tags = tags_for_change(_event("1", "typhoons", doc={"id": "t1"}))
+        assert tags == ["typhoons", "active_typhoons", "typhoon:t1"]
+
+    def test_delete_without_document_falls_back_to_detail_prefix(self):
+        assert tags_for_change(_event("1", "incident_reports", op="delete")) == ["incidents", "incident_detail"]
+
+    def test_push_subscription_tags_include_user(self):
+        tags = tags_for_change(_event("1", "push_subscriptions", op="insert", doc={"user_id": "u1"}))
+        assert tags == ["push_subscriptions", "push_user:u1"]
+
+    def test_unwatched_collection_and_drop_are_ignored(self):
+        assert tags_for_change(_event("1", "users", doc={"id": "u"})) == []
+        assert tags_for_change(_event("1", "typhoons", op="drop")) == []
+
+
+class TestCacheInvalidationSubscriber:
+    def _subscriber(self, db, invalidated, flushes):
+        return CacheInvalidationSubscriber(
+            db,
+            invalidate=lambda tag: invalidated.append(tag) or 1,
+            flush=lambda: flushes.append(1),
+            retry_delay=0,
+        )
+
+    def test_events_evict_tags_and_resume_after_error(self):
+        db = FakeDatabase([
+            FakeStream(
+                [_event("a", "typhoons", doc={"id": "t1"}), _event("b", "incident_reports", doc={"id": "i1"})],
+                error=AutoReconnect("primary stepped down"),
+            ),
+            FakeStream([]),
+        ])
+        invalidated, flushes = [], []
+        subscriber = self._subscriber(db, invalidated, flushes)
+
+        async def scenario():
+            subscriber.start()
+            while len(db.watch_calls) < 2 or subscriber.mode != "change_streams":
+                await asyncio.sleep(0)
+            await subscriber.stop()
+
+        asyncio.run(scenario())
+        assert invalidated == ["typhoons", "active_typhoons", "typhoon:t1", "incidents", "incident:i1"]
+        assert db.watch_calls[0]["resume_after"] is None
+        assert db.watch_calls[1]["resume_after"] == {"_data": "b"}
+        # A reconnect may have missed events, so local caches are flushed once
+        assert flushes == [1]
+        assert subscriber.status["reconnects"] == 1
+        assert subscriber.status["events"] == 2
+
+    def test_lost_history_restarts_without_resume_token(self):
+        db = FakeDatabase([
+            FakeStream([_event("a", "typhoons", doc={"id": "t1"})], error=OperationFailure("history lost", code=286)),
+            FakeStream([]),
+        ])
+        subscriber = self._subscriber(db, [], [])
+
+        async def scenario():
+            subscriber.start()
+            while len(db.watch_calls) < 2:
+                await asyncio.sleep(0)
+            await subscriber.stop()
+
+        asyncio.run(scenario())
+        assert db.watch_calls[1]["resume_after"] is None
+
+    def test_default_eviction_leaves_the_shared_l2_to_the_writer(self, monkeypatch):
+        from cache import APICache
+        from cache_backends import InMemoryBackend
+
+        class CountingBackend(InMemoryBackend):
+            def __init__(self):
+                super().__init__()
+                self.invalidated = []
+
+            async def invalidate_tag(self, tag):
+                self.invalidated.append(tag)
+                return await super().invalidate_tag(tag)
+
+        backend = CountingBackend()
+        cache = APICache(name="bus_test", backend=backend)
+        cache.set("incidents:list", [1], tags=("incidents",))
+        monkeypatch.setattr("cache._ALL_CACHES", [cache])
+        subscriber = CacheInvalidationSubscriber(FakeDatabase([]))
+
+        subscriber.handle_change(_event("a", "incident_reports", doc={"id": "i1"}))
+
+        assert cache.get("incidents:list") is None
+        assert backend.invalidated == []
+
+    def test_standalone_server_falls_back_to_ttl_only(self):
+        db = FakeDatabase([
+            OperationFailure("The $changeStream stage is only supported on replica sets", code=40573),
+        ])
+        subscriber = self._subscriber(db, [], [])
+
+        async def scenario():
+            subscriber.start()
+            await subscriber._task
+
+        asyncio.run(scenario())
+        assert subscriber.mode == "ttl_only"
+        assert len(db.watch_calls) == 1
+
+
+@pytest.mark.skipif(
+    not os.environ.get("MONGO_REPLSET_URL"),
+    reason="set MONGO_REPLSET_URL to a single-node replica set (mongod --replSet rs0)",
+)
+def test_change_stream_against_replica_set():
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    async def scenario():
+        client = AsyncIOMotorClient(os.environ["MONGO_REPLSET_URL"])
+        db = client[f"cache_bus_test_{uuid.uuid4().hex[:8]}"]
+        invalidated = []
+        subscriber = CacheInvalidationSubscriber(db, invalidate=lambda tag: invalidated.append(tag) or 1)
+        try:
+            subscriber.start()
+            while subscriber.mode != "change_streams":
+                await asyncio.sleep(0.05)
+            await asyncio.sleep(0.5)
+            await db.typhoons.insert_one({"id": "t1", "status": "active"})
+            for _ in range(100):
+                if "typhoon:t1" in invalidated:
+                    break
+                await asyncio.sleep(0.05)
+            assert "typhoon:t1" in invalidated
+        finally:
+            await subscriber.stop()
+            await client.drop_database(db.name)
+            client.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,72 @@
+import asyncio
+
+from cache import APICache, cached
+from cache_warmup import CacheWarmup
+
+
+class TestCacheWarmup:
+    def test_warmers_fill_the_cache_before_first_request(self):
+        cache = APICache(maxsize=100, ttl=60)
+        warmup = CacheWarmup()
+        loads = []
+
+        @cached(cache=cache, prefix="active_typhoons")
+        async def load_active():
+            loads.append(1)
+            return ["t1"]
+
+        warmup.register("active_typhoons", load_active)
+
+        async def scenario():
+            assert not warmup.ready
+            await warmup.run(budget=1)
+            assert await load_active() == ["t1"]
+
+        asyncio.run(scenario())
+        assert loads == [1]
+        assert warmup.ready
+        assert warmup.status["state"] == "done"
+        assert warmup.status["warmers"] == {"active_typhoons": "ok"}
+
+    def test_warmers_run_concurrently(self):
+        warmup = CacheWarmup()
+        running = []
+
+        async def slow():
+            running.append(1)
+            await asyncio.sleep(0.2)
+
+        for name in ("a", "b", "c"):
+            warmup.register(name, slow)
+
+        status = asyncio.run(warmup.run(budget=2))
+        assert status["duration_seconds"] < 0.5
+        assert len(running) == 3
+
+    def test_budget_cancels_slow_warmers_and_failures_are_reported(self):
+        warmup = CacheWarmup()
+        cancelled = []
+
+        @warmup.register("slow")
+        async def slow():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(1)
+                raise
+
+        @warmup.register("broken")
+        async def broken():
+            raise RuntimeError("no database")
+
+        status = asyncio.run(warmup.run(budget=0.05))
+        assert status["state"] == "partial"
+        assert status["warmers"] == {"broken": "error: no database", "slow": "timeout"}
+        assert cancelled == [1]
+        # A partial warm-up still lets the worker take traffic
+        assert warmup.ready
+
+    def test_empty_registry_is_ready_immediately(self):
+        warmup = CacheWarmup()
+        assert asyncio.run(warmup.run())["state"] == "done"
+        assert warmup.ready
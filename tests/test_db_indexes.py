@@ -0,0 +1,145 @@
+import asyncio
+import os
+import uuid
+
+import pytest
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+from db_indexes import IndexManager, QUERY_SHAPES, diff_indexes, explain_report, plan_stages, uncovered_shapes
+
+
+class FakeCollection:
+    def __init__(self, indexes, fail=False):
+        self.indexes = [{"name": "_id_", "key": {"_id": 1}}, *indexes]
+        self.created = []
+        self.fail = fail
+
+    async def list_indexes(self):
+        for index in self.indexes:
+            yield index
+
+    async def create_indexes(self, models):
+        if self.fail:
+            raise OperationFailure("E11000 duplicate key")
+        self.created.extend(model.document["name"] for model in models)
+
+
+class FakeDatabase(dict):
+    def __getitem__(self, name):
+        return self.setdefault(name, FakeCollection([]))
+
+
+SPEC = {
+    "typhoons": [
+        IndexModel([("id", ASCENDING)], unique=True, name="typhoon_id_unique"),
+        IndexModel([("status", ASCENDING), ("created_at", DESCENDING)], name="status_created_at"),
+        IndexModel([("created_at", DESCENDING)], name="created_at_desc"),
+    ],
+    "notification_logs": [IndexModel([("timestamp", DESCENDING)], name="timestamp_desc")],
+}
+
+
+class TestDiffIndexes:
+    def test_reports_missing_conflicting_and_unmanaged(self):
+        db = FakeDatabase(typhoons=FakeCollection([
+            {"name": "typhoon_id_unique", "key": {"id": 1}},  # spec wants unique
+            {"name": "legacy_created", "key": {"created_at": -1}},  # same key, other name
+            {"name": "name_text", "key": {"name": 1}},
+        ]))
+
+        diff = asyncio.run(diff_indexes(db, SPEC))
+
+        assert {c: [m.document["name"] for m in models] for c, models in diff["missing"].items()} == {
+            "typhoons": ["status_created_at"],
+            "notification_logs": ["timestamp_desc"],
+        }
+        [conflict] = diff["conflicting"]
+        assert conflict["name"] == "typhoon_id_unique"
+        assert conflict["wanted"] == {"key": {"id": 1}, "unique": True}
+        assert diff["unmanaged"] == [{"collection": "typhoons", "name": "name_text", "key": {"name": 1}}]
+
+
+class TestIndexManager:
+    def test_builds_missing_indexes_and_keeps_going_after_a_failure(self):
+        db = FakeDatabase(notification_logs=FakeCollection([], fail=True))
+        manager = IndexManager(SPEC)
+
+        asyncio.run(manager.sync(db))
+
+        assert db["typhoons"].created == ["typhoon_id_unique", "status_created_at", "created_at_desc"]
+        assert manager.status["state"] == "partial"
+        assert "notification_logs.timestamp_desc" in manager.status["failed"]
+
+    def test_start_runs_in_the_background(self):
+        db = FakeDatabase()
+        manager = IndexManager(SPEC)
+
+        async def scenario():
+            manager.start(db)
+            assert manager.state == "pending"
+            await manager._task
+
+        asyncio.run(scenario())
+        assert manager.status["state"] == "done"
+        assert len(manager.status["built"]) == 4
+
+
+class TestPlanStages:
+    def test_collects_stages_from_classic_and_sbe_plans(self):
+        classic = {"stage": "LIMIT", "inputStage": {"stage": "FETCH", "inputStage": {"stage": "IXSCAN"}}}
+        sbe = {"queryPlan": {"stage": "SORT", "inputStage": {"stage": "COLLSCAN"}}, "slotBasedPlan": {}}
+        assert plan_stages(classic) == ["LIMIT", "FETCH", "IXSCAN"]
+        assert plan_stages(sbe) == ["SORT", "COLLSCAN"]
+
+
+class TestUncoveredShapes:
+    def _shape(self, query, sort=None, collection="typhoons"):
+        return {"route": "-", "collection": collection, "filter": query, "sort": sort}
+
+    def test_every_route_query_shape_has_an_index_prefix(self):
+        assert [(shape["route"], shape["filter"]) for shape in uncovered_shapes()] == []
+
+    def test_unindexed_field_is_reported(self):
+        assert uncovered_shapes([self._shape({"name": "x"})]) != []
+
+    def test_sort_must_follow_the_equality_fields(self):
+        spec = {"typhoons": [IndexModel([("status", ASCENDING), ("name", ASCENDING)], name="status_name"),
+                             IndexModel([("created_at", DESCENDING)], name="created_at_desc")]}
+        served = self._shape({"status": "active"}, sort={"name": -1})
+        unsorted = self._shape({"status": "active"}, sort={"created_at": -1})
+        assert uncovered_shapes([served, unsorted], spec) == [unsorted]
+
+    def test_each_or_branch_needs_an_index(self):
+        spec = {"typhoons": [IndexModel([("created_at", DESCENDING)], name="created_at_desc")]}
+        keyset = self._shape({"$or": [{"created_at": {"$lt": 1}}, {"created_at": 1, "id": {"$lt": "x"}}]},
+                             sort={"created_at": -1, "id": -1})
+        assert uncovered_shapes([keyset], spec) == [keyset]
+
+    def test_wildcard_index_serves_subfields(self):
+        spec = {"push_subscriptions": [IndexModel([("preferences.$**", ASCENDING)], name="preferences_wildcard")]}
+        query = self._shape({"preferences.typhoons": True}, collection="push_subscriptions")
+        assert uncovered_shapes([query], spec) == []
+
+
+@pytest.mark.skipif(not os.environ.get("MONGO_TEST_URL"), reason="set MONGO_TEST_URL to a disposable MongoDB")
+def test_no_route_query_shape_needs_a_collection_scan():
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    async def scenario():
+        client = AsyncIOMotorClient(os.environ["MONGO_TEST_URL"])
+        db = client[f"index_test_{uuid.uuid4().hex[:8]}"]
+        try:
+            for collection in {shape["collection"] for shape in QUERY_SHAPES}:
+                await db[collection].insert_one({"seed": True})
+            await IndexManager().sync(db)
+            report = await explain_report(db)
+            unindexed = await explain_report(db, [{"route": "-", "collection": "typhoons", "filter": {"name": "x"}}])
+            return report, unindexed
+        finally:
+            await client.drop_database(db.name)
+            client.close()
+
+    report, unindexed = asyncio.run(scenario())
+    assert [entry["route"] for entry in report if entry["collscan"]] == []
+    assert unindexed[0]["collscan"] is True
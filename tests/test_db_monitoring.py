@@ -0,0 +1,153 @@
+from types import SimpleNamespace
+
+import pytest
+
+from database import pool_settings
+from db_monitoring import (
+    COMMAND_ERRORS,
+    COMMAND_LATENCY,
+    POOL_SATURATION,
+    CommandMetricsListener,
+    PoolMetricsListener,
+    command_shape,
+    value_shape,
+)
+
+
+def _started(request_id, command_name, command):
+    return SimpleNamespace(request_id=request_id, connection_id=("db", 27017), command_name=command_name, command=command)
+
+
+def _finished(request_id, command_name, duration_ms):
+    return SimpleNamespace(
+        request_id=request_id,
+        connection_id=("db", 27017),
+        command_name=command_name,
+        duration_micros=int(duration_ms * 1000),
+    )
+
+
+class TestFilterShape:
+    def test_values_are_replaced_but_operators_and_fields_kept(self):
+        shape = value_shape({
+            "status": "active",
+            "created_at": {"$gte": "2024-01-01"},
+            "$or": [{"priority": "high"}, {"assigned_to": {"$in": ["a", "b"]}}],
+        })
+        assert shape == {
+            "status": "?",
+            "created_at": {"$gte": "?"},
+            "$or": [{"priority": "?"}, {"assigned_to": {"$in": "?"}}],
+        }
+
+    def test_command_shape_drops_session_fields_and_payloads(self):
+        shape = command_shape("find", {
+            "find": "incident_reports",
+            "filter": {"phoneNumber": "+63 912 345 6789"},
+            "sort": {"created_at": -1},
+            "limit": 100,
+            "lsid": {"id": "x"},
+            "$db": "emergency",
+        })
+        assert shape == {"filter": {"phoneNumber": "?"}, "sort": {"created_at": -1}, "limit": 100}
+        assert command_shape("insert", {"insert": "typhoons", "documents": [{"name": "Odette"}]}) == {
+            "documents": "<1 documents>"
+        }
+
+
+class TestCommandMetricsListener:
+    def test_latency_is_labelled_by_collection_and_command(self):
+        listener = CommandMetricsListener(slow_threshold=10)
+        histogram = COMMAND_LATENCY.labels(collection="monitoring_test", command="find")
+        before = histogram._sum.get()
+
+        listener.started(_started(1, "find", {"find": "monitoring_test", "filter": {}}))
+        listener.succeeded(_finished(1, "find", 20))
+
+        assert histogram._sum.get() - before == pytest.approx(0.02)
+        assert not listener.slow_queries
+
+    def test_slow_queries_and_errors_are_recorded_without_values(self):
+        listener = CommandMetricsListener(slow_threshold=0.05)
+        errors = COMMAND_ERRORS.labels(collection="monitoring_test", command="aggregate")
+        before = errors._value.get()
+
+        listener.started(_started(2, "find", {"find": "monitoring_test", "filter": {"user_id": "u-secret"}}))
+        listener.succeeded(_finished(2, "find", 120))
+        listener.started(_started(3, "aggregate", {"aggregate": "monitoring_test", "pipeline": []}))
+        listener.failed(_finished(3, "aggregate", 1))
+
+        [slow] = listener.slow_queries
+        assert slow["collection"] == "monitoring_test"
+        assert slow["duration_ms"] == 120
+        assert slow["shape"] == {"filter": {"user_id": "?"}}
+        assert "u-secret" not in str(slow)
+        assert errors._value.get() == before + 1
+
+    def test_admin_commands_use_placeholder_collection(self):
+        listener = CommandMetricsListener()
+        listener.started(_started(4, "ping", {"ping": 1}))
+        assert listener._started[(4, ("db", 27017))][0] == "-"
+
+
+class TestPoolMetricsListener:
+    def test_connection_counts_follow_pool_events(self):
+        listener = PoolMetricsListener()
+        address = ("pool-test", 27017)
+        event = SimpleNamespace(address=address)
+
+        listener.connection_created(event)
+        listener.connection_created(event)
+        listener.connection_check_out_started(event)
+        listener.connection_checked_out(event)
+
+        assert listener.status["pool-test:27017"] == {
+            "open": 2, "in_use": 1, "peak_in_use": 1, "waiting": 0, "max_size": 100,
+        }
+
+        listener.connection_checked_in(event)
+        listener.connection_closed(event)
+        assert listener.status["pool-test:27017"]["open"] == 1
+        assert listener.status["pool-test:27017"]["in_use"] == 0
+
+    def test_saturation_against_max_pool_size(self):
+        listener = PoolMetricsListener()
+        address = ("saturation-test", 27017)
+        event = SimpleNamespace(address=address)
+
+        listener.pool_created(SimpleNamespace(address=address, options={"maxPoolSize": 4}))
+        for _ in range(3):
+            listener.connection_created(event)
+            listener.connection_check_out_started(event)
+            listener.connection_checked_out(event)
+        listener.connection_check_out_started(event)
+
+        status = listener.status["saturation-test:27017"]
+        assert (status["in_use"], status["waiting"], status["max_size"]) == (3, 1, 4)
+        assert POOL_SATURATION.labels(pool="main", address="saturation-test:27017")._value.get() == 0.75
+
+        listener.connection_checked_in(event)
+        assert listener.status["saturation-test:27017"]["peak_in_use"] == 3
+
+
+class TestPoolSettings:
+    def test_defaults_to_target_concurrency(self, monkeypatch):
+        monkeypatch.delenv("MONGO_MAX_POOL_SIZE", raising=False)
+        monkeypatch.delenv("MONGO_CONNECTION_BUDGET", raising=False)
+        assert pool_settings(workers=4, target_concurrency=50) == {"maxPoolSize": 50, "minPoolSize": 10}
+
+    def test_connection_budget_is_split_across_workers(self, monkeypatch):
+        monkeypatch.delenv("MONGO_MAX_POOL_SIZE", raising=False)
+        # 500 connections per server, 16 workers: 31 each, 2 of them for monitoring
+        assert pool_settings(workers=16, target_concurrency=50, connection_budget=500) == {
+            "maxPoolSize": 29, "minPoolSize": 5,
+        }
+
+    def test_reserved_connections_come_out_of_the_share(self, monkeypatch):
+        monkeypatch.delenv("MONGO_MAX_POOL_SIZE", raising=False)
+        # The analytics client's pool (4) and its monitoring connections (2)
+        assert pool_settings(workers=16, target_concurrency=50, connection_budget=500, reserved=6)["maxPoolSize"] == 23
+
+    def test_explicit_size_wins(self, monkeypatch):
+        monkeypatch.setenv("MONGO_MAX_POOL_SIZE", "8")
+        assert pool_settings(workers=1, target_concurrency=50)["maxPoolSize"] == 8
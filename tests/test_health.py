@@ -0,0 +1,113 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+
+import logging_config
+from backend.server import app
+from cache_warmup import CacheWarmup
+from health import CachedProbe
+
+client = TestClient(app)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def counting_check(fail=False, delay=0.0):
+    calls = []
+
+    async def check():
+        calls.append(1)
+        await asyncio.sleep(delay)
+        if fail:
+            raise ConnectionError("no primary")
+
+    return check, calls
+
+
+class TestCachedProbe:
+    def test_result_is_reused_within_ttl(self):
+        clock = FakeClock()
+        check, calls = counting_check()
+        probe = CachedProbe("Database", check, ttl=5, clock=clock)
+
+        async def scenario():
+            first = await probe.result()
+            clock.now += 4
+            await probe.result()
+            clock.now += 2
+            await probe.result()
+            return first
+
+        first = asyncio.run(scenario())
+        assert first["healthy"] is True
+        assert len(calls) == 2
+
+    def test_concurrent_probes_share_one_check(self):
+        check, calls = counting_check(delay=0.05)
+        probe = CachedProbe("Database", check, ttl=5)
+
+        async def scenario():
+            return await asyncio.gather(*(probe.result() for _ in range(20)))
+
+        results = asyncio.run(scenario())
+        assert len(calls) == 1
+        assert all(result["healthy"] for result in results)
+
+    def test_failures_and_timeouts_are_unhealthy(self):
+        check, _ = counting_check(fail=True)
+        assert asyncio.run(CachedProbe("Database", check).result())["error"] == "no primary"
+
+        slow, _ = counting_check(delay=1)
+        result = asyncio.run(CachedProbe("Database", slow, timeout=0.01).result())
+        assert result["healthy"] is False
+        assert "timed out" in result["error"]
+
+
+class TestProbeEndpoints:
+    def use_probe(self, monkeypatch, fail=False):
+        check, calls = counting_check(fail=fail)
+        monkeypatch.setattr("backend.server.db_probe", CachedProbe("Database", check, ttl=60))
+        return calls
+
+    def use_warmup(self, monkeypatch, state):
+        warmup = CacheWarmup()
+        warmup.state = state
+        monkeypatch.setattr("backend.server.warmup", warmup)
+
+    def test_livez_does_no_io(self, monkeypatch):
+        calls = self.use_probe(monkeypatch, fail=True)
+        response = client.get("/livez")
+        assert response.status_code == 200
+        assert calls == []
+
+    def test_readyz_covers_warmup_and_database(self, monkeypatch):
+        self.use_probe(monkeypatch)
+        self.use_warmup(monkeypatch, "running")
+        assert client.get("/readyz").json()["status"] == "warming_up"
+
+        self.use_warmup(monkeypatch, "done")
+        calls = self.use_probe(monkeypatch)
+        for _ in range(5):
+            assert client.get("/readyz").status_code == 200
+        assert len(calls) == 1
+
+        self.use_probe(monkeypatch, fail=True)
+        response = client.get("/readyz")
+        assert response.status_code == 503
+        assert response.json()["status"] == "database_unavailable"
+
+    def test_health_serves_the_background_system_snapshot(self, monkeypatch):
+        self.use_probe(monkeypatch)
+        monkeypatch.setitem(logging_config._system_snapshot, "cpu_percent", 12.5)
+
+        body = client.get("/api/health").json()
+
+        assert body["status"] == "healthy"
+        assert body["system"]["cpu_percent"] == 12.5
+        assert set(body["system"]) == {"cpu_percent", "memory_percent", "disk_usage", "updated_at"}
@@ -0,0 +1,133 @@
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from prometheus_client import REGISTRY, generate_latest
+
+from logging_config import REQUEST_COUNT, UNMATCHED_ENDPOINT, InstrumentationMiddleware
+
+
+def _count(method, endpoint, status_code):
+    return REQUEST_COUNT.labels(method=method, endpoint=endpoint, status_code=status_code)._value.get()
+
+
+def make_app(access_log):
+    app = FastAPI()
+    chunks = []
+
+    @app.get("/instrumented/ping")
+    async def ping():
+        return {"ok": True}
+
+    @app.get("/instrumented/stream")
+    async def stream():
+        async def body():
+            for i in range(3):
+                chunks.append(i)
+                yield f"chunk{i}\n".encode()
+
+        return StreamingResponse(body(), media_type="text/plain")
+
+    @app.get("/instrumented/boom")
+    async def boom():
+        raise RuntimeError("boom")
+
+    app.add_middleware(InstrumentationMiddleware, access_log=access_log)
+    return app, chunks
+
+
+class TestInstrumentationMiddleware:
+    def test_adds_headers_and_counts_request(self, access_log):
+        app, _ = make_app(access_log)
+        before = _count("GET", "/instrumented/ping", 200)
+
+        response = TestClient(app).get("/instrumented/ping", headers={"X-Request-ID": "abc"})
+
+        assert response.json() == {"ok": True}
+        assert response.headers["x-request-id"] == "abc"
+        assert float(response.headers["x-process-time"]) >= 0
+        assert _count("GET", "/instrumented/ping", 200) == before + 1
+
+    def test_streaming_body_passes_through(self, access_log):
+        app, chunks = make_app(access_log)
+
+        with TestClient(app).stream("GET", "/instrumented/stream") as response:
+            lines = list(response.iter_lines())
+
+        assert lines == ["chunk0", "chunk1", "chunk2"]
+        assert chunks == [0, 1, 2]
+        assert "x-process-time" in response.headers
+
+    def test_unhandled_error_is_counted_as_500(self, access_log):
+        app, _ = make_app(access_log)
+        before = _count("GET", "/instrumented/boom", 500)
+
+        with pytest.raises(RuntimeError):
+            TestClient(app).get("/instrumented/boom")
+
+        assert _count("GET", "/instrumented/boom", 500) == before + 1
+
+    def test_non_http_scopes_are_passed_through(self, access_log):
+        calls = []
+
+        async def app(scope, receive, send):
+            calls.append(scope["type"])
+
+        asyncio.run(InstrumentationMiddleware(app, access_log)({"type": "lifespan"}, None, None))
+        assert calls == ["lifespan"]
+
+
+def _request_metric_lines():
+    return [
+        line for line in generate_latest(REGISTRY).decode().splitlines()
+        if line.startswith("http_request")
+    ]
+
+
+class TestRouteTemplateLabels:
+    def make_app(self, access_log):
+        app = FastAPI()
+
+        @app.get("/labels/typhoons/{typhoon_id}")
+        async def get_typhoon(typhoon_id: str):
+            return {"id": typhoon_id}
+
+        app.add_middleware(InstrumentationMiddleware, access_log=access_log)
+        return TestClient(app)
+
+    def test_requests_are_labelled_by_route_template(self, access_log):
+        client = self.make_app(access_log)
+        before = _count("GET", "/labels/typhoons/{typhoon_id}", 200)
+
+        client.get("/labels/typhoons/a")
+        client.get("/labels/typhoons/b")
+
+        assert _count("GET", "/labels/typhoons/{typhoon_id}", 200) == before + 2
+        assert not any("/labels/typhoons/a" in line for line in _request_metric_lines())
+
+    def test_unmatched_paths_and_methods_share_fallback_labels(self, access_log):
+        client = self.make_app(access_log)
+        before = _count("GET", UNMATCHED_ENDPOINT, 404)
+        other_before = _count("OTHER", UNMATCHED_ENDPOINT, 404)
+
+        client.get("/no/such/path")
+        client.get("/wp-login.php")
+        client.request("PROPFIND", "/no/such/path")
+
+        assert _count("GET", UNMATCHED_ENDPOINT, 404) == before + 2
+        assert _count("OTHER", UNMATCHED_ENDPOINT, 404) == other_before + 1
+
+    def test_scrape_size_is_constant_across_distinct_ids(self, access_log):
+        client = self.make_app(access_log)
+        client.get("/labels/typhoons/warmup")
+        client.get("/unmatched/warmup")
+        baseline = len(_request_metric_lines())
+
+        for i in range(1000):
+            client.get(f"/labels/typhoons/{i}")
+            client.get(f"/unmatched/{i}")
+
+        assert len(_request_metric_lines()) == baseline
@@ -0,0 +1,85 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from auth import require_admin
+from diagnostics_routes import include_diagnostics_routes
+from loop_monitor import LoopMonitor, _request_scopes
+
+
+def blocking_geocode_call():
+    time.sleep(0.3)
+
+
+class TestLoopMonitor:
+    def test_lag_sampler_sees_blocking_work(self):
+        monitor = LoopMonitor(interval=0.01)
+
+        async def scenario():
+            monitor.start()
+            await asyncio.sleep(0.03)
+            time.sleep(0.15)
+            await asyncio.sleep(0.03)
+            await monitor.stop()
+
+        asyncio.run(scenario())
+        assert monitor.max_lag >= 0.1
+        assert not monitor.slow_callbacks
+
+    def test_detector_captures_stack_and_route_of_blocking_call(self):
+        monitor = LoopMonitor(interval=0.5, slow_callback_threshold=0.05)
+
+        async def handler():
+            _request_scopes[asyncio.current_task()] = {"route": SimpleNamespace(path="/api/geo/{place}")}
+            await asyncio.sleep(0.05)
+            blocking_geocode_call()
+
+        async def scenario():
+            monitor.start()
+            await asyncio.create_task(handler())
+            await asyncio.sleep(0.1)
+            await monitor.stop()
+
+        asyncio.run(scenario())
+        [stall] = monitor.status["slow_callbacks"]
+        assert stall["route"] == "/api/geo/{place}"
+        assert stall["blocked_ms"] >= 250
+        assert any("blocking_geocode_call" in frame for frame in stall["stack"])
+
+    def test_detector_is_quiet_when_loop_is_healthy(self):
+        monitor = LoopMonitor(interval=0.5, slow_callback_threshold=0.1)
+
+        async def scenario():
+            monitor.start()
+            for _ in range(20):
+                await asyncio.sleep(0.01)
+            await monitor.stop()
+
+        asyncio.run(scenario())
+        assert monitor.status["slow_callbacks"] == []
+
+
+class TestLoopDiagnosticsEndpoint:
+    def make_app(self):
+        app = FastAPI()
+        include_diagnostics_routes(app)
+        return app
+
+    def test_requires_admin(self):
+        response = TestClient(self.make_app()).get("/api/admin/diagnostics/loop")
+        assert response.status_code == 403
+
+    def test_reports_monitor_status(self, monkeypatch):
+        app = self.make_app()
+        app.dependency_overrides[require_admin] = lambda: {"role": "admin"}
+        monitor = LoopMonitor(slow_callback_threshold=0.2)
+        monitor.slow_callbacks.append({"route": "/api/ai/chat", "blocked_ms": 850.0, "stack": []})
+        monkeypatch.setattr("diagnostics_routes.loop_monitor", monitor)
+
+        body = TestClient(app).get("/api/admin/diagnostics/loop").json()
+
+        assert body["slow_callback_threshold_ms"] == 200
+        assert body["slow_callbacks"][0]["route"] == "/api/ai/chat"
@@ -0,0 +1,158 @@
+import asyncio
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from pagination import InvalidCursor, after_cursor, decode_cursor, encode_cursor, keyset_page
+
+T0 = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def _bson_key(value):
+    # Descending sort order of the types involved: dates > strings > missing
+    if isinstance(value, datetime):
+        return (2, value)
+    if isinstance(value, str):
+        return (1, value)
+    return (0, 0)
+
+
+def _matches(doc, query):
+    for key, condition in query.items():
+        if key == "$or":
+            if not any(_matches(doc, branch) for branch in condition):
+                return False
+        elif isinstance(condition, dict) and "$lt" in condition:
+            value, bound = doc.get(key), condition["$lt"]
+            if type(value) is not type(bound) or not value < bound:
+                return False
+        elif isinstance(condition, dict) and "$type" in condition:
+            if not isinstance(doc.get(key), str):
+                return False
+        elif doc.get(key) != condition:
+            return False
+    return True
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, keys):
+        for field, direction in reversed(keys):
+            self.docs.sort(key=lambda doc: _bson_key(doc.get(field)), reverse=direction < 0)
+        return self
+
+    def limit(self, n):
+        self.docs = self.docs[:n]
+        return self
+
+    async def to_list(self, length):
+        return self.docs[:length]
+
+
+class FakeCollection:
+    def __init__(self, docs):
+        self.docs = docs
+        self.queries = []
+
+    def find(self, query, projection=None):
+        self.queries.append(query)
+        return FakeCursor([doc for doc in self.docs if _matches(doc, query)])
+
+
+def walk(collection, query, limit):
+    async def scenario():
+        pages, cursor = [], ""
+        while cursor is not None:
+            docs, cursor = await keyset_page(collection, query, limit, cursor)
+            pages.append([doc["id"] for doc in docs])
+        return pages
+
+    return asyncio.run(scenario())
+
+
+class TestCursor:
+    def test_round_trips_dates_and_legacy_strings(self):
+        assert decode_cursor(encode_cursor({"created_at": T0, "id": "a"})) == (T0, "a")
+        assert decode_cursor(encode_cursor({"created_at": T0.isoformat(), "id": "b"})) == (T0.isoformat(), "b")
+
+    @pytest.mark.parametrize("cursor", ["nope", "eyJpZCI6IDF9", encode_cursor({"created_at": T0, "id": "a"})[:-3]])
+    def test_malformed_cursor_is_rejected(self, cursor):
+        with pytest.raises(InvalidCursor):
+            decode_cursor(cursor)
+
+    def test_date_cursor_also_admits_unmigrated_strings(self, monkeypatch):
+        cursor = encode_cursor({"created_at": T0, "id": "a"})
+        assert after_cursor(cursor)["$or"][-1] == {"created_at": {"$type": "string"}}
+        monkeypatch.setattr("timestamps.LEGACY_STRINGS", False)
+        assert len(after_cursor(cursor)["$or"]) == 2
+
+
+class TestKeysetPage:
+    def test_pages_cover_every_document_once_with_ties_and_mixed_formats(self):
+        docs = [{"id": f"d{i:02}", "created_at": T0 + timedelta(minutes=i // 3)} for i in range(20)]
+        docs += [{"id": f"s{i:02}", "created_at": (T0 - timedelta(days=1, minutes=i // 2)).isoformat()}
+                 for i in range(7)]
+
+        pages = walk(FakeCollection(docs), {}, limit=4)
+
+        seen = [doc_id for page in pages for doc_id in page]
+        assert sorted(seen) == sorted(doc["id"] for doc in docs)
+        assert len(seen) == len(set(seen))
+        assert seen[:3] == ["d19", "d18", "d17"]
+        assert seen[-1] == "s06"
+
+    def test_filters_stay_top_level_alongside_the_cursor(self):
+        docs = [{"id": f"r{i:02}", "status": "submitted" if i % 2 else "resolved",
+                 "created_at": T0 + timedelta(minutes=i)} for i in range(10)]
+        collection = FakeCollection(docs)
+
+        pages = walk(collection, {"status": "submitted"}, limit=2)
+
+        assert pages == [["r09", "r07"], ["r05", "r03"], ["r01"]]
+        assert collection.queries[1]["status"] == "submitted"
+        assert "$or" in collection.queries[1]
+
+    def test_last_full_page_has_no_next_cursor(self):
+        docs = [{"id": str(i), "created_at": T0 + timedelta(minutes=i)} for i in range(4)]
+        assert walk(FakeCollection(docs), {}, limit=2) == [["3", "2"], ["1", "0"]]
+
+
+class TestCursorRoutes:
+    def test_bad_cursor_is_a_400(self):
+        from fastapi.testclient import TestClient
+        from backend.server import app
+
+        response = TestClient(app).get("/api/typhoons/", params={"cursor": "nope"})
+        assert response.status_code == 400
+
+
+@pytest.mark.skipif(not os.environ.get("MONGO_TEST_URL"), reason="set MONGO_TEST_URL to a disposable MongoDB")
+def test_keyset_pages_against_mongodb():
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    async def scenario():
+        client = AsyncIOMotorClient(os.environ["MONGO_TEST_URL"], tz_aware=True, tzinfo=timezone.utc)
+        db = client[f"pagination_test_{uuid.uuid4().hex[:8]}"]
+        try:
+            await db.items.insert_many(
+                [{"id": f"d{i:03}", "created_at": T0 + timedelta(minutes=i // 4)} for i in range(100)]
+                + [{"id": f"s{i:03}", "created_at": (T0 - timedelta(days=1, minutes=i)).isoformat()}
+                   for i in range(10)]
+            )
+            await db.items.create_index([("created_at", -1), ("id", -1)])
+            seen, cursor = [], ""
+            while cursor is not None:
+                docs, cursor = await keyset_page(db.items, {}, 7, cursor)
+                seen.extend(doc["id"] for doc in docs)
+            return seen
+        finally:
+            await client.drop_database(db.name)
+            client.close()
+
+    seen = asyncio.run(scenario())
+    assert len(seen) == len(set(seen)) == 110
+    assert seen[0] == "d099" and seen[-1] == "s009"
@@ -0,0 +1,124 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from auth import require_admin
+from diagnostics_routes import include_diagnostics_routes
+from profiler import Profiler, ProfilerBusy
+
+_retained = []
+
+
+def spin_hot_loop(until):
+    while time.monotonic() < until:
+        sum(range(1000))
+
+
+def blocking_handler(seconds):
+    spin_hot_loop(time.monotonic() + seconds)
+
+
+class TestCpuProfile:
+    def test_samples_of_the_loop_thread_show_the_hot_function(self):
+        profiler = Profiler(max_duration=5)
+
+        async def scenario():
+            profile = asyncio.create_task(profiler.cpu(0.3, interval=0.005))
+            await asyncio.sleep(0.05)
+            blocking_handler(0.2)
+            return await profile
+
+        sampler = asyncio.run(scenario())
+        hot = [line for line in sampler.collapsed().splitlines() if "spin_hot_loop" in line]
+        assert hot
+        stack, count = hot[0].rsplit(" ", 1)
+        assert stack.index("blocking_handler") < stack.index("spin_hot_loop")
+        assert int(count) > 0
+        assert profiler.active is None
+
+    def test_all_threads_mode_labels_stacks_by_thread(self):
+        profiler = Profiler(max_duration=5)
+        worker = threading.Thread(
+            target=spin_hot_loop, args=(time.monotonic() + 0.3,), name="geocoder"
+        )
+        worker.start()
+        sampler = asyncio.run(profiler.cpu(0.2, interval=0.005, all_threads=True))
+        worker.join()
+        assert any(
+            line.startswith("thread:geocoder;") and "spin_hot_loop" in line
+            for line in sampler.collapsed().splitlines()
+        )
+
+
+class TestMemoryProfile:
+    def test_reports_growth_at_the_allocation_site(self):
+        profiler = Profiler(max_duration=5)
+
+        async def scenario():
+            profile = asyncio.create_task(profiler.memory(0.2, top=5))
+            await asyncio.sleep(0.05)
+            _retained.extend(bytearray(1024) for _ in range(500))
+            return await profile
+
+        try:
+            report = asyncio.run(scenario())
+        finally:
+            _retained.clear()
+        assert report["growth_kb"] >= 400
+        assert any("test_profiler.py" in frame for frame in report["top"][0]["traceback"])
+
+
+class TestSessionLimits:
+    def test_only_one_session_at_a_time(self):
+        profiler = Profiler(max_duration=5)
+
+        async def scenario():
+            first = asyncio.create_task(profiler.cpu(0.1))
+            await asyncio.sleep(0.01)
+            with pytest.raises(ProfilerBusy):
+                await profiler.memory(0.1)
+            await first
+
+        asyncio.run(scenario())
+        assert profiler.active is None
+
+    def test_duration_is_bounded(self):
+        with pytest.raises(ValueError):
+            asyncio.run(Profiler(max_duration=5).cpu(30))
+
+
+class TestProfileEndpoints:
+    def make_client(self, monkeypatch, profiler):
+        monkeypatch.setattr("diagnostics_routes.profiler", profiler)
+        app = FastAPI()
+        include_diagnostics_routes(app)
+        app.dependency_overrides[require_admin] = lambda: {"role": "admin"}
+        return TestClient(app)
+
+    def test_cpu_profile_is_returned_as_collapsed_stacks(self, monkeypatch):
+        client = self.make_client(monkeypatch, Profiler(max_duration=5))
+
+        response = client.post("/api/admin/diagnostics/profile/cpu", params={"seconds": 0.05, "all_threads": True})
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        assert int(response.headers["x-profile-samples"]) > 0
+        assert all(line.rsplit(" ", 1)[1].isdigit() for line in response.text.splitlines())
+
+    def test_busy_and_too_long_sessions_are_rejected(self, monkeypatch):
+        profiler = Profiler(max_duration=5)
+        profiler.active = {"kind": "memory"}
+        client = self.make_client(monkeypatch, profiler)
+
+        assert client.post("/api/admin/diagnostics/profile/memory", params={"seconds": 1}).status_code == 409
+        profiler.active = None
+        assert client.post("/api/admin/diagnostics/profile/cpu", params={"seconds": 60}).status_code == 400
+
+    def test_requires_admin(self):
+        app = FastAPI()
+        include_diagnostics_routes(app)
+        assert TestClient(app).post("/api/admin/diagnostics/profile/cpu").status_code == 403
@@ -0,0 +1,148 @@
+import gzip
+from datetime import datetime, timezone
+from typing import List
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+from pydantic import BaseModel, TypeAdapter
+from starlette.middleware.gzip import GZipMiddleware
+
+from cache import APICache, cached
+from response_cache import EncodedResponse, _accepted_encodings, _etag_matches, brotli, encode_response
+
+
+class Item(BaseModel):
+    id: str
+    name: str
+    created_at: datetime
+
+
+ITEMS_ADAPTER = TypeAdapter(List[Item])
+ITEMS = [
+    {"id": str(i), "name": f"typhoon {i}", "created_at": datetime(2024, 1, 1, tzinfo=timezone.utc)}
+    for i in range(50)
+]
+
+
+def make_app():
+    cache = APICache(maxsize=10, ttl=60)
+    loads = []
+    app = FastAPI()
+
+    @cached(cache=cache, prefix="items")
+    async def load_items():
+        loads.append(1)
+        return encode_response(ITEMS, ITEMS_ADAPTER)
+
+    @app.get("/encoded", response_model=List[Item])
+    async def encoded(request: Request):
+        return (await load_items()).to_response(request)
+
+    @app.get("/plain", response_model=List[Item])
+    async def plain():
+        return ITEMS
+
+    app.add_middleware(GZipMiddleware, minimum_size=500)
+    return app, loads
+
+
+class TestEncodedResponses:
+    def test_body_matches_response_model_serialization(self):
+        app, _ = make_app()
+        client = TestClient(app)
+        identity = {"Accept-Encoding": "identity"}
+
+        encoded = client.get("/encoded", headers=identity)
+        plain = client.get("/plain", headers=identity)
+
+        assert encoded.json() == plain.json()
+        assert encoded.headers["content-type"] == "application/json"
+
+    def test_hit_serves_precompressed_gzip_and_skips_loader(self):
+        app, loads = make_app()
+        client = TestClient(app)
+
+        first = client.get("/encoded", headers={"Accept-Encoding": "gzip"})
+        second = client.get("/encoded", headers={"Accept-Encoding": "gzip"})
+
+        assert loads == [1]
+        assert second.headers["content-encoding"] == "gzip"
+        # Not compressed a second time by GZipMiddleware
+        assert second.json() == first.json()
+        assert second.headers["etag"] == first.headers["etag"]
+
+    @pytest.mark.skipif(brotli is None, reason="brotli not installed")
+    def test_brotli_preferred_when_accepted(self):
+        app, _ = make_app()
+        client = TestClient(app)
+        response = client.get("/encoded", headers={"Accept-Encoding": "gzip, br"})
+        assert response.headers["content-encoding"] == "br"
+
+    def test_if_none_match_returns_304(self):
+        app, loads = make_app()
+        client = TestClient(app)
+        etag = client.get("/encoded").headers["etag"]
+
+        not_modified = client.get("/encoded", headers={"If-None-Match": etag})
+        weak = client.get("/encoded", headers={"If-None-Match": f'"other", W/{etag}'})
+        changed = client.get("/encoded", headers={"If-None-Match": '"stale"'})
+
+        assert not_modified.status_code == 304
+        assert not_modified.content == b""
+        assert not_modified.headers["etag"] == etag
+        assert weak.status_code == 304
+        assert changed.status_code == 200
+        assert loads == [1]
+
+    def test_each_encoding_has_its_own_strong_etag(self):
+        app, _ = make_app()
+        client = TestClient(app)
+
+        identity = client.get("/encoded", headers={"Accept-Encoding": "identity"}).headers["etag"]
+        gzipped = client.get("/encoded", headers={"Accept-Encoding": "gzip"}).headers["etag"]
+
+        assert gzipped == identity[:-1] + '-gzip"'
+        assert not gzipped.startswith("W/")
+
+    def test_gzip_etag_revalidates_an_identity_request(self):
+        app, loads = make_app()
+        client = TestClient(app)
+        gzip_etag = client.get("/encoded", headers={"Accept-Encoding": "gzip"}).headers["etag"]
+
+        response = client.get("/encoded", headers={"Accept-Encoding": "identity", "If-None-Match": gzip_etag})
+
+        assert response.status_code == 304
+        assert response.headers["etag"] != gzip_etag
+        assert not response.headers["etag"].endswith('-gzip"')
+        assert loads == [1]
+
+
+class TestEncodingHelpers:
+    def test_small_bodies_are_not_compressed(self):
+        response = EncodedResponse(b'{"ok":true}')
+        assert response.gzip is None
+        assert response.br is None
+        assert response.size == len(b'{"ok":true}')
+
+    def test_gzip_variant_round_trips(self):
+        response = encode_response(ITEMS, ITEMS_ADAPTER)
+        assert gzip.decompress(response.gzip) == response.body
+
+    def test_etag_is_strong_and_content_addressed(self):
+        a = EncodedResponse(b"[1,2,3]")
+        b = EncodedResponse(b"[1,2,3]")
+        c = EncodedResponse(b"[1,2,4]")
+        assert a.etag == b.etag != c.etag
+        assert not a.etag.startswith("W/")
+
+    def test_accept_encoding_parsing(self):
+        assert _accepted_encodings("gzip;q=0, br") == {"br"}
+        assert _accepted_encodings("GZIP , deflate;q=0.5") == {"gzip", "deflate"}
+        assert _accepted_encodings("") == frozenset()
+
+    def test_etag_matching(self):
+        assert _etag_matches("*", ['"x"'])
+        assert _etag_matches('"a", "x"', ['"x"'])
+        assert _etag_matches('W/"x-gzip"', ['"x"', '"x-gzip"'])
+        assert not _etag_matches('"a"', ['"x"', '"x-gzip"'])
@@ -0,0 +1,138 @@
+import pytest
+import sentry_sdk
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+from sentry_sdk.integrations.fastapi import FastApiIntegration
+from sentry_sdk.integrations.starlette import StarletteIntegration
+from sentry_sdk.transport import Transport
+
+from logging_config import InstrumentationMiddleware
+from sentry_sampling import AdaptiveTracesSampler
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class CapturingTransport(Transport):
+    """Keeps envelopes in memory instead of sending them."""
+
+    def __init__(self, options=None):
+        super().__init__(options)
+        self.transactions = []
+
+    def capture_envelope(self, envelope):
+        for item in envelope.items:
+            if item.type == "transaction":
+                self.transactions.append(item.payload.json["transaction"])
+
+
+def make_app():
+    app = FastAPI()
+
+    @app.get("/api/typhoons/active")
+    async def active_typhoons():
+        return []
+
+    @app.get("/api/typhoons/{typhoon_id}")
+    async def get_typhoon(typhoon_id: str):
+        if typhoon_id == "broken":
+            raise HTTPException(status_code=503)
+        return {"id": typhoon_id}
+
+    return app
+
+
+def http_context(path, method="GET"):
+    scope = {"type": "http", "method": method, "path": path, "root_path": ""}
+    return {"asgi_scope": scope, "parent_sampled": None}
+
+
+class TestAdaptiveTracesSampler:
+    def test_upstream_decision_is_kept(self):
+        sampler = AdaptiveTracesSampler(initial_rate=0.0)
+        assert sampler({"parent_sampled": True}) == 1.0
+        assert AdaptiveTracesSampler(initial_rate=1.0)({"parent_sampled": False}) == 0.0
+
+    def test_failing_and_slow_routes_are_always_sampled_for_a_while(self):
+        clock = FakeClock()
+        sampler = AdaptiveTracesSampler(initial_rate=0.0, slow_threshold=1.0, boost_seconds=60, clock=clock)
+        sampler.bind(make_app())
+        context = http_context("/api/typhoons/t-1")
+        assert sampler(context) == 0.0
+
+        sampler.observe("GET", "/api/typhoons/{typhoon_id}", 503, 0.01)
+        assert sampler(context) == 1.0
+        assert sampler(http_context("/api/typhoons/other")) == 1.0
+        assert sampler(http_context("/api/typhoons/active")) == 0.0
+
+        clock.now += 61
+        assert sampler(context) == 0.0
+        sampler.observe("GET", "/api/typhoons/{typhoon_id}", 200, 2.5)
+        assert sampler.status["boosted_routes"] == ["GET /api/typhoons/{typhoon_id}"]
+
+    def test_high_volume_route_is_capped_per_minute(self):
+        clock = FakeClock()
+        sampler = AdaptiveTracesSampler(initial_rate=1.0, route_traces_per_minute=5, clock=clock)
+        sampler.bind(make_app())
+        context = http_context("/api/typhoons/active")
+
+        assert sum(sampler(context) for _ in range(100)) == 5
+        clock.now += 12  # one token refilled
+        assert sum(sampler(context) for _ in range(100)) == 1
+
+    def test_base_rate_tracks_the_traces_per_second_budget(self):
+        clock = FakeClock()
+        sampler = AdaptiveTracesSampler(traces_per_second=2, window=10, clock=clock)
+
+        for _ in range(2000):  # 200 req/s over the window
+            sampler.observe("GET", "/api/typhoons/active", 200, 0.01)
+        clock.now += 10
+        sampler.observe("GET", "/api/typhoons/active", 200, 0.01)
+        assert sampler.rate == pytest.approx(2 / 200.1, rel=0.01)
+
+        for _ in range(9):  # traffic drops to 1 req/s
+            sampler.observe("GET", "/api/typhoons/active", 200, 0.01)
+        clock.now += 10
+        sampler.observe("GET", "/api/typhoons/active", 200, 0.01)
+        assert sampler.rate == 1.0
+
+
+class TestWithSentrySdk:
+    @pytest.fixture
+    def sentry(self, monkeypatch):
+        sampler = self.sampler = AdaptiveTracesSampler(initial_rate=1.0, route_traces_per_minute=3, clock=FakeClock())
+        monkeypatch.setattr("logging_config.traces_sampler", sampler)
+        transport = CapturingTransport()
+        sentry_sdk.init(
+            dsn="http://public@localhost/1",
+            transport=transport,
+            integrations=[StarletteIntegration(), FastApiIntegration()],
+            default_integrations=False,
+            traces_sampler=sampler,
+        )
+        yield transport
+        sentry_sdk.get_client().close()
+        sentry_sdk.init()  # back to a disabled client
+
+    def test_sdk_sends_only_what_the_sampler_selects(self, sentry, access_log):
+        app = make_app()
+        app.add_middleware(InstrumentationMiddleware, access_log=access_log)
+        self.sampler.bind(app)
+        client = TestClient(app)
+
+        for _ in range(20):
+            client.get("/api/typhoons/active")
+        for i in range(5):
+            client.get(f"/api/typhoons/t-{i}")
+        client.get("/api/typhoons/broken")  # over the route cap, but boosts the route
+        for i in range(5):
+            client.get(f"/api/typhoons/t-{i}")
+        sentry_sdk.flush()
+
+        assert sentry.transactions.count("/api/typhoons/active") == 3
+        assert sentry.transactions.count("/api/typhoons/{typhoon_id}") == 3 + 5
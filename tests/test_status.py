@@ -29,8 +29,8 @@ class TestStatusEndpoints:
         mock_db.status_checks.insert_one.assert_called_once()
         call_args = mock_db.status_checks.insert_one.call_args[0][0]
 
-        # Check that timestamp was converted to ISO string
-        assert isinstance(call_args["timestamp"], str)
+        # Timestamp is stored as a native BSON date
+        assert isinstance(call_args["timestamp"], datetime)
         assert call_args["client_name"] == "Test Client"
 
     @patch('backend.server.db')
@@ -0,0 +1,164 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from migrate_dates import migrate_collection
+from timestamps import as_datetime, time_range
+
+JAN_1 = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+class TestAsDatetime:
+    def test_accepts_both_stored_formats(self):
+        assert as_datetime(JAN_1) == JAN_1
+        assert as_datetime("2024-01-01T00:00:00+00:00") == JAN_1
+        assert as_datetime("2024-01-01T08:00:00+08:00") == JAN_1
+
+    def test_naive_values_are_utc(self):
+        assert as_datetime(datetime(2024, 1, 1)) == JAN_1
+        assert as_datetime("2024-01-01T00:00:00") == JAN_1
+
+    @pytest.mark.parametrize("value", [None, "", "yesterday", 1704067200])
+    def test_missing_or_unparseable_is_none(self, value):
+        assert as_datetime(value) is None
+
+
+class TestTimeRange:
+    def test_matches_dates_and_legacy_strings(self):
+        end = JAN_1 + timedelta(days=7)
+        assert time_range("created_at", JAN_1, end) == {"$or": [
+            {"created_at": {"$gte": JAN_1, "$lte": end}},
+            {"created_at": {"$gte": JAN_1.isoformat(), "$lte": end.isoformat()}},
+        ]}
+
+    def test_dates_only_once_migrated(self, monkeypatch):
+        monkeypatch.setattr("timestamps.LEGACY_STRINGS", False)
+        assert time_range("timestamp", JAN_1) == {"timestamp": {"$gte": JAN_1}}
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, field, direction):
+        self.docs.sort(key=lambda doc: doc[field], reverse=direction < 0)
+        return self
+
+    def limit(self, n):
+        self.docs = self.docs[:n]
+        return self
+
+    async def to_list(self, length):
+        return self.docs[:length]
+
+
+def _matches(doc, query):
+    for key, condition in query.items():
+        if key == "$and":
+            if not all(_matches(doc, part) for part in condition):
+                return False
+        elif key == "$or":
+            if not any(_matches(doc, part) for part in condition):
+                return False
+        elif isinstance(condition, dict) and "$type" in condition:
+            if not isinstance(doc.get(key), str):
+                return False
+        elif isinstance(condition, dict) and "$gt" in condition:
+            if not doc.get(key) > condition["$gt"]:
+                return False
+        elif doc.get(key) != condition:
+            return False
+    return True
+
+
+class FakeCollection:
+    def __init__(self, docs=()):
+        self.docs = [dict(doc) for doc in docs]
+        self.batches = 0
+
+    def find(self, query, projection=None):
+        return FakeCursor([dict(doc) for doc in self.docs if _matches(doc, query)])
+
+    async def find_one(self, query):
+        return next((dict(doc) for doc in self.docs if _matches(doc, query)), None)
+
+    async def bulk_write(self, updates, ordered=True):
+        self.batches += 1
+        modified = 0
+        for update in updates:
+            for doc in self.docs:
+                if _matches(doc, update._filter):
+                    doc.update(update._doc["$set"])
+                    modified += 1
+        return type("BulkWriteResult", (), {"modified_count": modified})()
+
+    async def update_one(self, query, update, upsert=False):
+        doc = next((doc for doc in self.docs if _matches(doc, query)), None)
+        if doc is None:
+            doc = dict(query)
+            self.docs.append(doc)
+        doc.update(update.get("$set", {}))
+        for field, amount in update.get("$inc", {}).items():
+            doc[field] = doc.get(field, 0) + amount
+
+
+class FakeDatabase(dict):
+    def __getitem__(self, name):
+        return self.setdefault(name, FakeCollection())
+
+
+def legacy_typhoons(n):
+    return [
+        {"_id": i, "created_at": (JAN_1 + timedelta(hours=i)).isoformat(), "updated_at": None}
+        for i in range(n)
+    ]
+
+
+class TestMigration:
+    def test_converts_strings_in_batches_and_checkpoints(self):
+        docs = legacy_typhoons(5) + [{"_id": 5, "created_at": "not a date"}, {"_id": 6, "created_at": JAN_1}]
+        db = FakeDatabase(typhoons=FakeCollection(docs))
+
+        stats = asyncio.run(migrate_collection(db, "typhoons", ("created_at", "updated_at"), batch_size=2))
+
+        assert (stats["scanned"], stats["converted"], stats["unparseable"]) == (6, 5, 1)
+        assert db["typhoons"].batches == 3
+        assert db["typhoons"].docs[4]["created_at"] == JAN_1 + timedelta(hours=4)
+        assert db["typhoons"].docs[5]["created_at"] == "not a date"
+        checkpoint = db["migrations"].docs[0]
+        assert checkpoint["_id"] == "bson_dates:typhoons"
+        assert (checkpoint["last_id"], checkpoint["converted"], checkpoint["done"]) == (5, 5, True)
+
+    def test_resumes_after_the_checkpoint(self):
+        db = FakeDatabase(
+            typhoons=FakeCollection(legacy_typhoons(4)),
+            migrations=FakeCollection([{"_id": "bson_dates:typhoons", "last_id": 1, "converted": 2}]),
+        )
+
+        stats = asyncio.run(migrate_collection(db, "typhoons", ("created_at",)))
+
+        assert stats["converted"] == 2
+        assert [isinstance(doc["created_at"], str) for doc in db["typhoons"].docs] == [True, True, False, False]
+        assert db["migrations"].docs[0]["converted"] == 4
+
+    def test_rerun_after_done_converts_strings_written_since(self):
+        db = FakeDatabase(typhoons=FakeCollection(legacy_typhoons(4)))
+        asyncio.run(migrate_collection(db, "typhoons", ("created_at", "updated_at")))
+        # An old worker mid-deploy rewrites an early document with a string
+        db["typhoons"].docs[0]["updated_at"] = JAN_1.isoformat()
+
+        stats = asyncio.run(migrate_collection(db, "typhoons", ("created_at", "updated_at")))
+
+        assert stats["converted"] == 1
+        assert db["typhoons"].docs[0]["updated_at"] == JAN_1
+        assert db["migrations"].docs[0]["done"] is True
+
+    def test_dry_run_writes_nothing(self):
+        db = FakeDatabase(typhoons=FakeCollection(legacy_typhoons(3)))
+
+        stats = asyncio.run(migrate_collection(db, "typhoons", ("created_at",), dry_run=True))
+
+        assert stats["converted"] == 3
+        assert all(isinstance(doc["created_at"], str) for doc in db["typhoons"].docs)
+        assert db["migrations"].docs == []
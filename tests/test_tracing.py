@@ -0,0 +1,107 @@
+import json
+from types import SimpleNamespace
+from typing import List
+
+from fastapi import Depends, FastAPI, Request
+from fastapi.testclient import TestClient
+from pydantic import TypeAdapter
+
+from auth import require_admin
+from diagnostics_routes import include_diagnostics_routes
+from logging_config import InstrumentationMiddleware
+from response_cache import encode_response
+from tracing import Tracer, TracingCommandListener, span, traced
+
+
+def make_app(monkeypatch, tracer, access_log):
+    monkeypatch.setattr("logging_config.tracer", tracer)
+    monkeypatch.setattr("diagnostics_routes.tracer", tracer)
+    app = FastAPI()
+    adapter = TypeAdapter(List[int])
+
+    @traced("deps.current_user")
+    async def current_user():
+        with span("deps.jwt_decode"):
+            return {"role": "admin"}
+
+    @app.get("/items/{item_id}")
+    async def get_item(item_id: str, request: Request, user: dict = Depends(current_user)):
+        return encode_response([1, 2, 3], adapter).to_response(request)
+
+    include_diagnostics_routes(app)
+    app.dependency_overrides[require_admin] = lambda: {"role": "admin"}
+    app.add_middleware(InstrumentationMiddleware, access_log=access_log)
+    return TestClient(app)
+
+
+class TestTracing:
+    def test_sampled_request_records_nested_spans_under_request_id(self, monkeypatch, access_log):
+        tracer = Tracer(sample_rate=1.0)
+        client = make_app(monkeypatch, tracer, access_log)
+
+        response = client.get("/items/42", headers={"X-Request-ID": "trace-1"})
+
+        assert response.headers["x-request-id"] == "trace-1"
+        trace = tracer.get("trace-1")
+        spans = {s["name"]: s for s in trace["spans"]}
+        assert trace["name"] == "GET /items/{item_id}"
+        root = spans["GET /items/{item_id}"]
+        assert root["parent_id"] is None
+        assert root["attributes"]["status_code"] == 200
+        assert spans["deps.current_user"]["parent_id"] == root["span_id"]
+        assert spans["deps.jwt_decode"]["parent_id"] == spans["deps.current_user"]["span_id"]
+        assert spans["response.serialize"]["parent_id"] == root["span_id"]
+        assert "response.validate" in spans
+
+    def test_unsampled_requests_record_nothing_but_get_a_request_id(self, monkeypatch, access_log):
+        tracer = Tracer(sample_rate=0.0)
+        client = make_app(monkeypatch, tracer, access_log)
+
+        response = client.get("/items/42")
+
+        assert len(response.headers["x-request-id"]) == 32
+        assert len(tracer.traces) == 0
+        with span("outside") as current:
+            assert current is None
+
+    def test_admin_endpoints_list_and_fetch_traces(self, monkeypatch, access_log):
+        tracer = Tracer(sample_rate=1.0)
+        client = make_app(monkeypatch, tracer, access_log)
+        client.get("/items/1", headers={"X-Request-ID": "t-a"})
+
+        listing = client.get("/api/admin/diagnostics/traces").json()
+        assert any(t["trace_id"] == "t-a" for t in listing["traces"])
+        assert client.get("/api/admin/diagnostics/traces/t-a").json()["trace_id"] == "t-a"
+        assert client.get("/api/admin/diagnostics/traces/missing").status_code == 404
+
+    def test_mongo_commands_become_child_spans(self):
+        tracer = Tracer(sample_rate=1.0)
+        listener = TracingCommandListener()
+        started = SimpleNamespace(
+            request_id=7, connection_id=("db", 27017), command_name="find",
+            command={"find": "users", "filter": {"username": "admin"}},
+        )
+        finished = SimpleNamespace(request_id=7, connection_id=("db", 27017), command_name="find", duration_micros=4000)
+
+        root = tracer.start_trace("GET /api/auth/me", "t-mongo")
+        listener.started(started)
+        listener.succeeded(finished)
+        tracer.end_trace(root)
+
+        [_, command] = tracer.get("t-mongo")["spans"]
+        assert command["name"] == "mongodb.find"
+        assert command["attributes"] == {"collection": "users"}
+        assert command["duration_ms"] == 4.0
+        assert command["parent_id"] == root.span_id
+
+    def test_file_exporter_writes_json_lines(self, tmp_path):
+        path = tmp_path / "traces.jsonl"
+        tracer = Tracer(sample_rate=1.0, export_path=str(path))
+
+        root = tracer.start_trace("GET /x", "t-file")
+        tracer.end_trace(root, status_code=200)
+        tracer.close()
+
+        [record] = [json.loads(line) for line in path.read_text().splitlines()]
+        assert record["trace_id"] == "t-file"
+        assert record["spans"][0]["attributes"] == {"status_code": 200}